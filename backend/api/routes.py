@@ -1,10 +1,43 @@
-from flask import Blueprint, request, jsonify, Response, current_app
-from services.github_service import get_user_data, get_contribution_years
-from services.svg_generator import generate_stats_svg, generate_language_svg, generate_streak_svg, generate_trophies_svg
-from services.github_service import get_user_data, get_contribution_years
+from flask import Blueprint, request, jsonify, Response, current_app, send_file
+from services.github_service import get_user_data, get_user_bundles, user_data_from_bundle, calculate_streak_stats, payload_cache, inflight, refresh_stats, query_costs
+from services.contribution_history import get_contribution_years, get_contribution_history
+from services.cards import card_response, render_cache, card_specs_from_query, card_specs_from_json, render_cards, combined_card_response, user_batch
+from services.cards import not_modified
+from services import admission, contribution_history, language_stats, negative_cache, static_store, token_pool
 
 api_bp = Blueprint('api', __name__)
 
+def svg_card_response(card, username):
+    """
+    Serves a published card from the static store, or from the render cache,
+    rendering it on a miss. Error cards are never cached.
+    """
+    theme = request.args.get('theme', 'default')
+    include_private = request.args.get('include_private', 'false').lower() == 'true'
+    mode = request.args.get('mode', '').lower()
+    if static_store.enabled():
+        stored = static_store.lookup(card, username, theme, include_private, mode)
+        if stored is not None:
+            return static_card_response(*stored)
+    body, status, headers = card_response(card, username, theme=theme, include_private=include_private, mode=mode,
+                                          if_none_match=request.headers.get('If-None-Match'),
+                                          if_modified_since=request.headers.get('If-Modified-Since'),
+                                          accept_encoding=request.headers.get('Accept-Encoding'))
+    return Response(body, mimetype='image/svg+xml', headers=headers), status
+
+def static_card_response(path, digest, mtime):
+    """
+    Sends a published card file as is; with USE_X_SENDFILE the front-end server sends it.
+    """
+    path, encoding = static_store.variant(path, request.headers.get('Accept-Encoding'))
+    headers = static_store.response_headers(digest, mtime, encoding)
+    if not_modified(f'"{digest}"', mtime, request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+        headers.pop('Content-Encoding', None)
+        return Response(status=304, headers=headers)
+    response = send_file(path, mimetype='image/svg+xml', conditional=False, etag=False, last_modified=None, max_age=None)
+    response.headers.update(headers)
+    return response
+
 @api_bp.route('/stats/<username>', methods=['GET'])
 def get_stats(username):
     """
@@ -21,60 +54,97 @@ def get_stats_svg(username):
     """
     Returns an SVG image of the stats card.
     """
-    theme = request.args.get('theme', 'default')
-    include_private = request.args.get('include_private', 'false').lower() == 'true'
-    data = get_user_data(username, include_private=include_private)
-    
-    if not data or 'error' in data:
-        err_msg = data['error'] if data and 'error' in data else 'User not found'
-        return Response(f'<svg xmlns="http://www.w3.org/2000/svg" width="400" height="100"><rect width="100%" height="100%" fill="#0d1117"/><text x="10" y="20" fill="red" font-family="monospace">Error: {err_msg}</text></svg>', mimetype='image/svg+xml', headers={'Cache-Control': 'no-cache'}), 200
-        
-    svg_content = generate_stats_svg(data['stats'], theme=theme)
-    
-    return Response(svg_content, mimetype='image/svg+xml', headers={'Cache-Control': 'public, max-age=14400'})
+    return svg_card_response("stats", username)
 
 @api_bp.route('/languages/<username>/svg', methods=['GET'])
 def get_languages_svg(username):
-    theme = request.args.get('theme', 'default')
-    data = get_user_data(username)
-    if not data or 'error' in data:
-        err_msg = data['error'] if data and 'error' in data else 'User not found'
-        return Response(f'<svg xmlns="http://www.w3.org/2000/svg" width="400" height="100"><rect width="100%" height="100%" fill="#0d1117"/><text x="10" y="20" fill="red" font-family="monospace">Error: {err_msg}</text></svg>', mimetype='image/svg+xml', headers={'Cache-Control': 'no-cache'}), 200
-    
-    svg_content = generate_language_svg(data['languages'], theme=theme)
-    return Response(svg_content, mimetype='image/svg+xml', headers={'Cache-Control': 'public, max-age=14400'})  
-    
+    return svg_card_response("languages", username)
+
 @api_bp.route('/contributions/<username>', methods=['GET'])
 def get_contributions(username):
     # improved implementation pending for full graph, just returning basic data for now
-    data = get_contribution_years(username)
+    data = get_contribution_years(username, mode=request.args.get('mode', 'daily').lower())
     if not data:
          return jsonify({"error": "User not found"}), 404
     return jsonify(data)
 
 @api_bp.route('/streak/<username>/svg', methods=['GET'])
 def get_streak_svg(username):
-    theme = request.args.get('theme', 'default')
     # Streak data comes from contributions
-    data = get_contribution_years(username)
-    if not data:
-        return Response('<svg><text>User not found</text></svg>', mimetype='image/svg+xml', headers={'Cache-Control': 'no-cache'}), 404
-    
-    svg_content = generate_streak_svg(data, theme=theme)
-    return Response(svg_content, mimetype='image/svg+xml', headers={'Cache-Control': 'public, max-age=14400'})
+    return svg_card_response("streak", username)
 
 @api_bp.route('/trophies/<username>/svg', methods=['GET'])
 def get_trophies_svg(username):
     """
     Returns an SVG image of the trophies.
     """
-    theme = request.args.get('theme', 'default')
+    return svg_card_response("trophies", username)
+
+@api_bp.route('/batch', methods=['GET'])
+def get_batch():
+    """
+    JSON stats, languages and streak for several users (?users=a,b,c),
+    fetched with one aliased GraphQL query per batch of uncached users.
+    """
     include_private = request.args.get('include_private', 'false').lower() == 'true'
-    data = get_user_data(username, include_private=include_private)
-    
-    if not data or 'error' in data:
-         err_msg = data['error'] if data and 'error' in data else 'User not found'
-         return Response(f"<svg xmlns='http://www.w3.org/2000/svg' width='400' height='100'><rect width='100%' height='100%' fill='#0d1117'/><text x='10' y='20' fill='red' font-family='monospace'>Error: {err_msg}</text></svg>", mimetype='image/svg+xml', headers={'Cache-Control': 'no-cache'}), 200
-         
-    svg_content = generate_trophies_svg(data['stats'], theme=theme)
-    return Response(svg_content, mimetype='image/svg+xml', headers={'Cache-Control': 'public, max-age=14400'})
+    usernames = [u.strip() for u in request.args.get('users', '').split(',') if u.strip()]
+    try:
+        return jsonify(user_batch(usernames, include_private))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@api_bp.route('/cards', methods=['GET', 'POST'])
+def get_cards():
+    """
+    Several cards in one request, for one or many users.
+    GET ?cards=stats:octocat,streak:torvalds:dark (card:username[:theme]) or
+    POST {"cards": [{"card", "username", "theme", "include_private", "mode", "id"}]}.
+    format=json (default) returns {"cards": {id: {...svg}}}, format=svg one stacked SVG.
+    """
+    body = request.get_json(silent=True) if request.method == 'POST' else None
+    if not isinstance(body, dict):
+        body = {}
+    output = request.args.get('format', body.get('format', 'json')).lower()
+    try:
+        if request.method == 'POST':
+            specs = card_specs_from_json(body.get('cards'))
+        else:
+            specs = card_specs_from_query(
+                request.args.get('cards', ''),
+                theme=request.args.get('theme', 'default'),
+                include_private=request.args.get('include_private', 'false').lower() == 'true',
+                mode=request.args.get('mode', '').lower()
+            )
+        if not specs:
+            raise ValueError("No cards given")
+        results = render_cards(specs)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if output == 'svg':
+        svg, status, headers = combined_card_response(results)
+        return Response(svg, mimetype='image/svg+xml', headers=headers), status
+
+    cards = {}
+    for spec, svg, status, headers in results:
+        cards[spec['id']] = dict(spec, status=status, cache=headers.get('X-Cache', 'MISS'), svg=svg)
+    return jsonify({"cards": cards})
+
+@api_bp.route('/status', methods=['GET'])
+def get_status():
+    """
+    Cache and request-coalescing counters for monitoring.
+    """
+    return jsonify({
+        "render_cache": render_cache.stats(),
+        "payload_cache": payload_cache.stats(),
+        "inflight": inflight.stats(),
+        "refresh": refresh_stats,
+        "languages": language_stats.stats,
+        "history": contribution_history.stats,
+        "tokens": token_pool.stats(),
+        "query_costs": query_costs,
+        "static_store": static_store.stats,
+        "admission": admission.stats(),
+        "negative_cache": negative_cache.stats()
+    })
@@ -1,21 +1,56 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from api.routes import api_bp
 
-# Load environment variables
+# Load environment variables before the services read their cache/config settings
 load_dotenv()
 
+from api.routes import api_bp
+from services import admission, metrics, static_store
+from services.svg_generator import warm_templates
+
 app = Flask(__name__)
 CORS(app)
+# Let nginx/Apache send static store files (X-Sendfile / X-Accel-Redirect setups)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
 
 app.register_blueprint(api_bp, url_prefix='/api')
 
+# Compile every theme's card templates up front instead of on first request
+if os.environ.get('PRECOMPILE_TEMPLATES', 'true').lower() == 'true':
+    warm_templates()
+
+# Re-renders published static cards in the background (one worker at a time)
+static_store.start_refresher()
+
+@app.before_request
+def start_request_timer():
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    theme = request.args.get('theme', 'default') if route.endswith('/svg') else ""
+    g.request_timer = metrics.RequestTimer(route, theme)
+    # GitHub fetches for uncached users are rate limited per client
+    g.admission_client = admission.set_client(admission.client_address(request.remote_addr, request.headers))
+
+@app.teardown_request
+def stop_request_timer(exc=None):
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        timer.finish()
+    client = g.pop('admission_client', None)
+    if client is not None:
+        admission.reset_client(client)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "message": "GitHub README Stats Generator API is running"}), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,284 @@
+"""
+Optional ASGI entry point. Serves the same card routes as the Flask app, but
+GitHub requests are awaited instead of holding a worker for the whole round-trip:
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import json
+import os
+import re
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.cards import (
+    CARD_TYPES, CARD_SECTIONS, NOT_FETCHED, bundle_history, cached_card_response, card_response, not_modified, render_cache, card_specs_from_query,
+    card_specs_from_json, render_cards, combined_card_response, user_batch
+)
+from services.github_async import (
+    get_user_bundle_async, get_user_data_async, get_contribution_years_async, close_client, inflight
+)
+from services.github_service import payload_cache, refresh_stats, query_costs
+from services import admission, contribution_history, language_stats, metrics, negative_cache, static_store, token_pool
+from services.language_stats import get_language_bytes
+from services.svg_generator import warm_templates
+
+CARD_ROUTE = re.compile(r"^/api/(stats|languages|streak|trophies)/([^/]+)/svg/?$")
+STATS_ROUTE = re.compile(r"^/api/stats/([^/]+)/?$")
+CONTRIBUTIONS_ROUTE = re.compile(r"^/api/contributions/([^/]+)/?$")
+
+# Same policy as flask_cors' default in app.py: any origin, and preflights
+# answered with the methods we serve and whatever headers were asked for
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*"}
+CORS_METHODS = "GET, HEAD, POST, OPTIONS"
+
+
+async def send_response(send, body, status=200, content_type="application/json", headers=None):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    raw_headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    for name, value in dict(CORS_HEADERS, **(headers or {})).items():
+        raw_headers.append((name.lower().encode(), str(value).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def headers_only(send):
+    """
+    Wraps send for a HEAD request: the same status and headers, no body.
+    """
+    async def send_head(message):
+        if message["type"] == "http.response.body":
+            message = dict(message, body=b"")
+        await send(message)
+    return send_head
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def preflight(send, request_headers):
+    headers = {"Access-Control-Allow-Methods": CORS_METHODS}
+    requested = request_headers.get("access-control-request-headers")
+    if requested:
+        headers["Access-Control-Allow-Headers"] = requested
+    await send_response(send, b"", content_type="text/html; charset=utf-8", headers=headers)
+
+
+async def send_json(send, data, status=200):
+    await send_response(send, json.dumps(data), status=status)
+
+
+async def svg_card(send, card, username, args, request_headers):
+    theme = args.get("theme", "default")
+    include_private = args.get("include_private", "false").lower() == "true"
+    mode = args.get("mode", "").lower()
+
+    if static_store.enabled():
+        stored = static_store.lookup(card, username, theme, include_private, mode)
+        if stored is not None:
+            return await static_card(send, *stored, request_headers)
+
+    conditional = dict(if_none_match=request_headers.get("if-none-match"),
+                       if_modified_since=request_headers.get("if-modified-since"),
+                       accept_encoding=request_headers.get("accept-encoding"))
+    # Only the render cache is read here; a miss never falls back to card_response's blocking fetch
+    response = cached_card_response(card, username, theme, include_private, mode, **conditional)
+    if response is not None:
+        metrics.card_cache.inc(card=card, result="hit")
+    else:
+        language_stats = NOT_FETCHED
+        history = None
+        bundle = await get_user_bundle_async(username, CARD_SECTIONS[card])
+        if bundle and 'error' not in bundle:
+            # Paginated or per-year fetches with cache reads; run them off the event loop
+            # (to_thread carries the request's admission client along)
+            if card == "languages" and mode == "bytes":
+                language_stats = await asyncio.to_thread(get_language_bytes, username)
+            elif card == "streak":
+                history = await asyncio.to_thread(bundle_history, username, bundle)
+        # A None bundle means no token; render the usual error card instead of fetching again
+        response = card_response(card, username, theme=theme, include_private=include_private, mode=mode,
+                                 bundle=bundle or {}, language_stats=language_stats, history=history, **conditional)
+    body, status, headers = response
+    await send_response(send, body, status=status, content_type="image/svg+xml", headers=headers)
+
+
+async def static_card(send, path, digest, mtime, request_headers):
+    path, encoding = static_store.variant(path, request_headers.get("accept-encoding"))
+    headers = static_store.response_headers(digest, mtime, encoding)
+    if not_modified(f'"{digest}"', mtime, request_headers.get("if-none-match"), request_headers.get("if-modified-since")):
+        headers.pop("Content-Encoding", None)
+        return await send_response(send, b"", status=304, content_type="image/svg+xml", headers=headers)
+    # Published cards are a few KB and usually in the page cache
+    with open(path, "rb") as f:
+        body = f.read()
+    await send_response(send, body, content_type="image/svg+xml", headers=headers)
+
+
+async def cards_batch(send, args, body=None):
+    """
+    /api/cards, same as the Flask route: GET ?cards=... or a POSTed JSON body (passed as body).
+    """
+    if body is not None:
+        try:
+            body = json.loads(body or b"null")
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            body = {}
+    try:
+        if body is not None:
+            specs = card_specs_from_json(body.get("cards"))
+        else:
+            specs = card_specs_from_query(args.get("cards", ""), theme=args.get("theme", "default"),
+                                          include_private=args.get("include_private", "false").lower() == "true",
+                                          mode=args.get("mode", "").lower())
+        if not specs:
+            raise ValueError("No cards given")
+        # Batched user fetches and per-card extras are blocking; run them off the event loop.
+        # to_thread, unlike run_in_executor, keeps the admission client of this request
+        results = await asyncio.to_thread(render_cards, specs)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, status=400)
+
+    output = args.get("format", (body or {}).get("format", "json"))
+    if output.lower() == "svg":
+        body, status, headers = combined_card_response(results)
+        return await send_response(send, body, status=status, content_type="image/svg+xml", headers=headers)
+    cards = {}
+    for spec, svg, status, headers in results:
+        cards[spec["id"]] = dict(spec, status=status, cache=headers.get("X-Cache", "MISS"), svg=svg)
+    await send_json(send, {"cards": cards})
+
+
+async def users_batch(send, args):
+    """
+    GET /api/batch?users=a,b,c, same as the Flask route.
+    """
+    include_private = args.get("include_private", "false").lower() == "true"
+    usernames = [u.strip() for u in args.get("users", "").split(",") if u.strip()]
+    try:
+        results = await asyncio.to_thread(user_batch, usernames, include_private)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, status=400)
+    await send_json(send, results)
+
+
+def route_label(path):
+    """
+    The route pattern a path matches, as Flask would report its url_rule.
+    """
+    match = CARD_ROUTE.match(path)
+    if match:
+        return f"/api/{match.group(1)}/<username>/svg"
+    if STATS_ROUTE.match(path):
+        return "/api/stats/<username>"
+    if CONTRIBUTIONS_ROUTE.match(path):
+        return "/api/contributions/<username>"
+    if path.rstrip("/") in ("/health", "/metrics", "/api/cards", "/api/batch", "/api/status"):
+        return path.rstrip("/")
+    return "unmatched"
+
+
+async def handle_http(scope, receive, send):
+    path = scope["path"]
+    args = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+
+    method = scope["method"]
+    if method == "HEAD":
+        send = headers_only(send)
+    if method == "OPTIONS":
+        return await preflight(send, {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])})
+    # POST is only accepted by /api/cards
+    if method not in ("GET", "HEAD") and not (method == "POST" and path.rstrip("/") == "/api/cards"):
+        return await send_json(send, {"error": "Method not allowed"}, status=405)
+
+    if path == "/health":
+        return await send_json(send, {"status": "healthy", "message": "GitHub README Stats Generator API is running"})
+
+    if path == "/metrics":
+        if not metrics.METRICS_ENABLED:
+            return await send_json(send, {"error": "Metrics are disabled"}, status=404)
+        return await send_response(send, metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+    match = CARD_ROUTE.match(path)
+    if match and match.group(1) in CARD_TYPES:
+        request_headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        return await svg_card(send, match.group(1), match.group(2), args, request_headers)
+
+    if path.rstrip("/") == "/api/cards":
+        return await cards_batch(send, args, await read_body(receive) if method == "POST" else None)
+
+    if path.rstrip("/") == "/api/batch":
+        return await users_batch(send, args)
+
+    match = STATS_ROUTE.match(path)
+    if match:
+        include_private = args.get("include_private", "false").lower() == "true"
+        data = await get_user_data_async(match.group(1), include_private=include_private)
+        if not data:
+            return await send_json(send, {"error": "User not found or API limits reached"}, status=404)
+        return await send_json(send, data)
+
+    match = CONTRIBUTIONS_ROUTE.match(path)
+    if match:
+        data = await get_contribution_years_async(match.group(1), mode=args.get("mode", "daily").lower())
+        if not data:
+            return await send_json(send, {"error": "User not found"}, status=404)
+        return await send_json(send, data)
+
+    if path == "/api/status":
+        return await send_json(send, {
+            "render_cache": render_cache.stats(),
+            "payload_cache": payload_cache.stats(),
+            "inflight": inflight.stats(),
+            "refresh": refresh_stats,
+            "languages": language_stats.stats,
+            "history": contribution_history.stats,
+            "tokens": token_pool.stats(),
+            "query_costs": query_costs,
+            "static_store": static_store.stats,
+            "admission": admission.stats(),
+            "negative_cache": negative_cache.stats()
+        })
+
+    await send_json(send, {"error": "Not found"}, status=404)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if os.environ.get("PRECOMPILE_TEMPLATES", "true").lower() == "true":
+                    warm_templates()
+                static_store.start_refresher()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_client()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] == "http":
+        route = route_label(scope["path"])
+        theme = ""
+        if route.endswith("/svg"):
+            theme = parse_qs(scope.get("query_string", b"").decode()).get("theme", ["default"])[-1]
+        timer = metrics.RequestTimer(route, theme)
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        remote_addr = scope["client"][0] if scope.get("client") else None
+        client = admission.set_client(admission.client_address(remote_addr, headers))
+        try:
+            await handle_http(scope, receive, send)
+        finally:
+            admission.reset_client(client)
+            timer.finish()
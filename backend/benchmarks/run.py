@@ -0,0 +1,252 @@
+"""
+Micro-benchmarks and a small load test for the fetch, normalize and render paths.
+
+    cd backend
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json
+
+Results are written as JSON so runs from different commits can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The stub server stands in for GitHub; the services only need *a* token to try
+os.environ.setdefault("GITHUB_TOKEN", "benchmark-token")
+os.environ.setdefault("PRECOMPILE_TEMPLATES", "false")
+# Cold load runs start from empty in-process caches
+os.environ["CACHE_BACKEND"] = "memory"
+
+from benchmarks.stub_github import start_stub_server, synthetic_calendar, synthetic_user
+from services import admission, github_service
+from services.contribution_calendar import ContributionCalendar
+from services.github_service import calculate_streak_stats, normalize_user
+from services.svg_generator import (
+    THEMES, generate_stats_svg, generate_language_svg, generate_streak_svg, generate_trophies_svg
+)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    Latency summary in microseconds.
+    """
+    us = [s * 1e6 for s in samples]
+    return {
+        "n": len(us),
+        "mean_us": round(sum(us) / len(us), 2) if us else 0.0,
+        "p50_us": round(percentile(us, 50), 2),
+        "p90_us": round(percentile(us, 90), 2),
+        "p99_us": round(percentile(us, 99), 2),
+        "max_us": round(max(us), 2) if us else 0.0
+    }
+
+
+def time_calls(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_render(iterations):
+    bundle = normalize_user(synthetic_user("octocat"))
+    stats = bundle["stats"]
+    languages = bundle["languages"]
+    streak = calculate_streak_stats(bundle["calendar"])
+    cards = {
+        "stats": lambda theme: generate_stats_svg(stats, theme=theme),
+        "languages": lambda theme: generate_language_svg(languages, theme=theme),
+        "streak": lambda theme: generate_streak_svg(streak, theme=theme),
+        "trophies": lambda theme: generate_trophies_svg(stats, theme=theme)
+    }
+
+    results = {}
+    for card, render in cards.items():
+        per_theme = {}
+        all_samples = []
+        for theme in THEMES:
+            # First render compiles the theme's template; report it separately
+            start = time.perf_counter()
+            render(theme)
+            first = time.perf_counter() - start
+            samples = time_calls(lambda: render(theme), iterations)
+            all_samples.extend(samples)
+            per_theme[theme] = dict(summarize(samples), first_render_us=round(first * 1e6, 2))
+        results[card] = {"all_themes": summarize(all_samples), "themes": per_theme}
+    return results
+
+
+def bench_streak(iterations):
+    results = {}
+    for days in (365, 365 * 5, 365 * 20):
+        weeks = synthetic_calendar(days=days, seed=days)
+        calendar = ContributionCalendar.from_days(day for week in weeks for day in week["contributionDays"])
+        results[f"{days}_days"] = summarize(time_calls(lambda: calculate_streak_stats(calendar), iterations))
+        results[f"{days}_days_weekly"] = summarize(time_calls(lambda: calculate_streak_stats(calendar, mode="weekly"), iterations))
+    return results
+
+
+def bench_normalize(iterations):
+    user = synthetic_user("octocat")
+    return summarize(time_calls(lambda: normalize_user(user), iterations))
+
+
+def bench_load(requests_total, concurrency, users, warm):
+    """
+    Drives the Flask app through its test client against the stub server.
+    Cold runs clear every cache first, so each request pays fetch + normalize + render.
+    """
+    from app import app
+    from services import negative_cache
+    from services.cards import render_cache
+    from services.user_record import record_cache
+
+    client_local = threading.local()
+
+    def client():
+        if getattr(client_local, "client", None) is None:
+            client_local.client = app.test_client()
+        return client_local.client
+
+    cards = ["stats", "languages", "streak", "trophies"]
+    themes = list(THEMES)
+    paths = [
+        f"/api/{cards[i % len(cards)]}/user{i % users}/svg?theme={themes[i % len(themes)]}"
+        for i in range(requests_total)
+    ]
+
+    if warm:
+        for path in set(paths):
+            client().get(path)
+    else:
+        render_cache.clear()
+        # Bundles, contribution years and language sizes
+        github_service.payload_cache._cache.clear()
+        negative_cache.entries.clear()
+        record_cache.clear()
+
+    statuses = {}
+    lock = threading.Lock()
+
+    def hit(path):
+        start = time.perf_counter()
+        response = client().get(path)
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return elapsed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(hit, paths))
+    wall = time.perf_counter() - started
+
+    return dict(
+        summarize(samples),
+        concurrency=concurrency,
+        throughput_rps=round(len(samples) / wall, 2),
+        statuses={str(k): v for k, v in statuses.items()}
+    )
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """
+    Prints p50 changes for every metric present in both runs.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def walk(new, old, path):
+        if isinstance(new, dict) and isinstance(old, dict):
+            if "p50_us" in new and "p50_us" in old:
+                delta = (new["p50_us"] - old["p50_us"]) / old["p50_us"] * 100 if old["p50_us"] else 0.0
+                flag = "  REGRESSION" if delta > 10 else ""
+                print(f"{path:<60} {old['p50_us']:>12.1f} -> {new['p50_us']:>12.1f} us  ({delta:+.1f}%){flag}")
+                return
+            for key in new:
+                if key in old:
+                    walk(new[key], old[key], f"{path}.{key}" if path else key)
+
+    walk(current["results"], baseline.get("results", {}), "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fetch, normalize and render paths.")
+    parser.add_argument("--iterations", type=int, default=200, help="iterations per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=400, help="requests per load-test run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20, help="distinct users in the load test")
+    parser.add_argument("--skip-load", action="store_true", help="only run the micro-benchmarks")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    args = parser.parse_args(argv)
+
+    server = start_stub_server()
+    github_service.GITHUB_GRAPHQL_URL = f"http://127.0.0.1:{server.server_address[1]}/graphql"
+    # Every request of the load test is a miss from one client; measure the paths, not the shedding
+    admission.ADMISSION_ENABLED = False
+
+    results = {
+        "render": bench_render(args.iterations),
+        "streak": bench_streak(args.iterations),
+        "normalize": bench_normalize(args.iterations)
+    }
+    if not args.skip_load:
+        results["load"] = {
+            "cold": bench_load(args.requests, args.concurrency, args.users, warm=False),
+            "warm": bench_load(args.requests, args.concurrency, args.users, warm=True)
+        }
+        results["load"]["github_requests"] = server.requests
+    server.shutdown()
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "iterations": args.iterations,
+        "results": results
+    }
+
+    for card, data in results["render"].items():
+        summary = data["all_themes"]
+        print(f"render {card:<10} p50 {summary['p50_us']:>10.1f} us  p99 {summary['p99_us']:>10.1f} us")
+    for size, summary in results["streak"].items():
+        print(f"streak {size:<10} p50 {summary['p50_us']:>10.1f} us  p99 {summary['p99_us']:>10.1f} us")
+    if "load" in results:
+        for mode in ("cold", "warm"):
+            summary = results["load"][mode]
+            print(f"load   {mode:<10} {summary['throughput_rps']:>8.1f} req/s  p50 {summary['p50_us'] / 1000:.2f} ms  p99 {summary['p99_us'] / 1000:.2f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Local stand-in for api.github.com/graphql. Answers the aliased user queries
+built by github_service with deterministic synthetic users, so benchmarks
+never touch the real API or the rate limit.
+"""
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LANGUAGES = ["Python", "JavaScript", "TypeScript", "Go", "Rust", "C++", "Java", "Ruby", "Shell", "HTML"]
+
+
+def synthetic_calendar(days=365, seed=0, end=None):
+    rng = random.Random(seed)
+    end = end or datetime.date.today()
+    start = end - datetime.timedelta(days=days - 1)
+    contribution_days = [
+        {"date": (start + datetime.timedelta(days=i)).isoformat(),
+         "contributionCount": rng.choice([0, 0, 1, 2, 3, 5, 8])}
+        for i in range(days)
+    ]
+    return [{"contributionDays": contribution_days[i:i + 7]} for i in range(0, days, 7)]
+
+
+def synthetic_repo(login, i):
+    rng = random.Random(f"{login}/{i}")
+    return {
+        "name": f"repo-{i}",
+        "stargazers": {"totalCount": rng.randint(0, 2000)},
+        "forks": {"totalCount": rng.randint(0, 300)},
+        "primaryLanguage": {"name": rng.choice(LANGUAGES)} if rng.random() > 0.1 else None,
+        "pushedAt": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z"
+    }
+
+
+def synthetic_repo_languages(owner, name, limit=10):
+    rng = random.Random(f"{owner}/{name}/languages")
+    picked = rng.sample(LANGUAGES, rng.randint(1, 4))[:limit]
+    edges = [{"size": rng.randint(100, 500000), "node": {"name": lang, "color": "#%06x" % rng.randint(0, 0xffffff)}} for lang in picked]
+    return {"languages": {"edges": sorted(edges, key=lambda e: e["size"], reverse=True)}}
+
+
+def repo_count_for(login):
+    # Logins starting with "many" own enough repositories to need several pages
+    if login.startswith("many"):
+        return 450
+    return random.Random(login).randint(5, 90)
+
+
+def repository_page(login, offset, page_size):
+    total = repo_count_for(login)
+    end = min(total, offset + page_size)
+    return {
+        "totalCount": total,
+        "pageInfo": {"hasNextPage": end < total, "endCursor": str(end)},
+        "nodes": [synthetic_repo(login, i) for i in range(offset, end)]
+    }
+
+
+def synthetic_user(login, repo_page_size=100):
+    rng = random.Random(login)
+    return {
+        "name": login.title(),
+        "login": login,
+        "followers": {"totalCount": rng.randint(0, 5000)},
+        "following": {"totalCount": rng.randint(0, 500)},
+        "repositories": repository_page(login, 0, repo_page_size),
+        "contributionsCollection": {
+            "totalCommitContributions": rng.randint(0, 20000),
+            "restrictedContributionsCount": rng.randint(0, 500),
+            "contributionCalendar": {"totalContributions": 0, "weeks": synthetic_calendar(seed=login)}
+        },
+        "issues": {"totalCount": rng.randint(0, 1000)},
+        "pullRequests": {"totalCount": rng.randint(0, 1000)},
+        "createdAt": f"{rng.randint(2008, 2023)}-01-01T00:00:00Z",
+        "organizations": {"totalCount": rng.randint(0, 20)}
+    }
+
+
+class StubGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests += 1
+        # Per-token rate limit, reported the way GitHub does
+        token = self.headers.get("Authorization", "")
+        with self.server.lock:
+            used = self.server.points_used.get(token, 0) + 1
+            self.server.points_used[token] = used
+        remaining = max(0, self.server.rate_limit - used)
+        rate_headers = {
+            "X-RateLimit-Limit": str(self.server.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(int(self.server.reset_at))
+        }
+        if used > self.server.rate_limit:
+            payload = json.dumps({"message": "API rate limit exceeded"}).encode()
+            self.send_response(403)
+            for name, value in rate_headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        variables = dict(body.get("variables") or {})
+        failure = self.server.fail(variables) if self.server.fail else None
+        if failure:
+            status, headers = failure if isinstance(failure, tuple) else (failure, {})
+            payload = json.dumps({"message": "Stub failure"}).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        if "owner" in variables:
+            # Aliased repository(owner:, name:) language lookups
+            owner, limit = variables.pop("owner"), variables.pop("n", 10)
+            data = {alias: synthetic_repo_languages(owner, name, limit) for alias, name in variables.items()}
+        elif "from" in variables:
+            # One year of contributionsCollection(from:, to:)
+            year = int(variables["from"][:4])
+            end = datetime.date(year, 12, 31)
+            weeks = synthetic_calendar(days=(end - datetime.date(year, 1, 1)).days + 1, seed=f"{variables['login']}/{year}", end=end)
+            data = {"user": {"contributionsCollection": {"contributionCalendar": {"weeks": weeks}}}}
+        elif "cursor" in variables:
+            # Follow-up repositories page
+            page = repository_page(variables["login"], int(variables["cursor"] or 0), variables["pageSize"])
+            data = {"user": {"repositories": page}}
+        else:
+            page_size = variables.pop("repoPageSize", 100)
+            data = {alias: synthetic_user(login, page_size) for alias, login in variables.items()}
+        if "rateLimit" in body.get("query", ""):
+            data["rateLimit"] = {"cost": 1, "remaining": remaining}
+        payload = json.dumps({"data": data}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        for name, value in rate_headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_stub_server(rate_limit=1000000):
+    """
+    Starts the stub on a free port in a daemon thread. Returns the server;
+    its GraphQL URL is http://127.0.0.1:<port>/graphql. Each token gets
+    rate_limit requests per hour, like GitHub's points budget. Setting
+    server.fail to a function of the request variables returning a status
+    (or (status, headers)) makes those requests fail.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHubHandler)
+    server.daemon_threads = True
+    server.requests = 0
+    server.rate_limit = rate_limit
+    server.reset_at = time.time() + 3600
+    server.points_used = {}
+    server.fail = None
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,230 @@
+"""
+Warms the caches for a roster of users ahead of traffic, and can write every
+card as a static file:
+
+    cd backend
+    python prewarm.py users.txt --themes all --output-dir static-cards
+
+users.txt holds one username per line (# starts a comment). Users are fetched
+BATCH_SIZE at a time with aliased GraphQL queries on a bounded worker pool.
+Requests go through the token pool, which waits for a reset instead of
+shedding them (see --max-wait). With CACHE_BACKEND=sqlite or redis the
+fetched bundles, contribution years and language sizes are shared with the
+running app. The render cache lives in each server process, so rendered
+cards reach the app through --store (the static store the routes serve
+from, see services/static_store.py) or as plain files with --output-dir.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services import admission, github_service, static_store, token_pool
+from services.cards import (
+    CARD_TYPES, CARD_MODES, CARD_SECTIONS, CACHE_HEADERS, bundle_history, cache_key, card_response, render_cache
+)
+from services.compression import compress_for_storage
+from services.github_service import SECTIONS, BATCH_SIZE, get_user_bundles
+from services.language_stats import get_language_bytes
+from services.themes import list_themes
+
+
+def read_usernames(path):
+    """
+    Usernames from a file ("-" for stdin), without blanks, comments or duplicates.
+    """
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        names = [line.split("#", 1)[0].strip() for line in f]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    # GitHub logins are case-insensitive; keep the first spelling
+    unique = {}
+    for name in names:
+        if name:
+            unique.setdefault(name.lower(), name)
+    return list(unique.values())
+
+
+def card_variants(cards, themes, all_modes=False):
+    """
+    (card, theme, mode) for every card x theme, plus the non-default modes with all_modes.
+    """
+    variants = []
+    for card in cards:
+        modes = CARD_MODES.get(card, (None,))
+        for theme in themes:
+            for mode in (modes if all_modes else modes[:1]):
+                variants.append((card, theme, mode))
+    return variants
+
+
+def output_path(output_dir, card, username, theme, mode=None):
+    """
+    <output_dir>/<card>/<username>/<theme>[-<mode>].svg
+    """
+    name = theme if not mode or mode == CARD_MODES[card][0] else f"{theme}-{mode}"
+    return os.path.join(output_dir, card, username.lower(), f"{name}.svg")
+
+
+def write_card(path, svg, encoded=None):
+    """
+    Writes the SVG plus .gz/.br siblings for servers that serve pre-compressed
+    files. encoded is the render cache's {encoding: bytes} when available.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = svg.encode("utf-8")
+    files = {path: data}
+    for encoding, body in compress_for_storage(data, encoded).items():
+        files[f"{path}.{'gz' if encoding == 'gzip' else encoding}"] = body
+    for name, body in files.items():
+        tmp = f"{name}.tmp"
+        with open(tmp, "wb") as out:
+            out.write(body)
+        # Readers never see a half-written card
+        os.replace(tmp, name)
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.users = 0
+        self.failed = []
+        self.cards = 0
+        self.card_errors = 0
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def user_done(self, username, error=None, cards=0, card_errors=0):
+        with self.lock:
+            self.users += 1
+            self.cards += cards
+            self.card_errors += card_errors
+            if error:
+                self.failed.append((username, error))
+            if self.users % 100 == 0 or self.users == self.total:
+                elapsed = time.time() - self.started
+                print(f"{self.users}/{self.total} users, {self.cards} cards, {len(self.failed)} failed, {elapsed:.1f}s")
+
+
+def warm_user(username, bundle, variants, include_private, output_dir, progress, store_dir=None):
+    """
+    Renders every variant for one fetched user, fetching history and
+    language sizes only when a variant needs them.
+    """
+    if not bundle or 'error' in bundle:
+        progress.user_done(username, error=bundle['error'] if bundle else "No GitHub token configured")
+        return
+    cards_needed = {card for card, _, _ in variants}
+    history = bundle_history(username, bundle) if "streak" in cards_needed else None
+    language_stats = None
+    if any(card == "languages" and mode == "bytes" for card, _, mode in variants):
+        language_stats = get_language_bytes(username)
+
+    written = errors = 0
+    for card, theme, mode in variants:
+        body, status, headers = card_response(card, username, theme=theme, include_private=include_private, mode=mode,
+                                              bundle=bundle, language_stats=language_stats if mode == "bytes" else None,
+                                              history=history)
+        if status != 200 or headers.get('Cache-Control') != CACHE_HEADERS['Cache-Control']:
+            errors += 1
+            continue
+        # Reuse the compressed forms card_response just cached
+        cached = render_cache.get(cache_key(card, username, theme, include_private, mode))
+        encoded = cached[3] if cached else None
+        if output_dir:
+            write_card(output_path(output_dir, card, username, theme, mode), body, encoded)
+        if store_dir:
+            static_store.publish(card, username, theme, body, include_private, mode, encoded=encoded, root=store_dir)
+        written += 1
+    progress.user_done(username, cards=written, card_errors=errors)
+
+
+def prewarm(usernames, cards=CARD_TYPES, themes=("default",), all_modes=False, include_private=False,
+            output_dir=None, workers=4, batch_size=BATCH_SIZE, store_dir=None):
+    """
+    Fetches and renders every card variant for the given users.
+    Returns the Progress with the totals.
+    """
+    variants = card_variants(cards, themes, all_modes)
+    needed = {section for card in cards for section in CARD_SECTIONS[card]}
+    sections = tuple(section for section in SECTIONS if section in needed)
+    progress = Progress(len(usernames))
+    batches = [usernames[i:i + batch_size] for i in range(0, len(usernames), batch_size)]
+
+    def run(batch):
+        try:
+            bundles = get_user_bundles(batch, sections)
+        except Exception as e:
+            for username in batch:
+                progress.user_done(username, error=str(e))
+            return
+        for username in batch:
+            try:
+                warm_user(username, bundles.get(username.lower()), variants, include_private, output_dir, progress, store_dir)
+            except Exception as e:
+                progress.user_done(username, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(run, batches))
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch and render cards for a list of users ahead of traffic.")
+    parser.add_argument("users", help="file with one username per line, or - for stdin")
+    parser.add_argument("--cards", default=",".join(CARD_TYPES), help="comma-separated card types")
+    parser.add_argument("--themes", default="default", help="comma-separated themes, or 'all'")
+    parser.add_argument("--all-modes", action="store_true", help="also render ?mode=bytes languages and ?mode=weekly streaks")
+    parser.add_argument("--include-private", action="store_true", help="render stats and trophies with private contributions")
+    parser.add_argument("--output-dir", help="write <card>/<username>/<theme>.svg (plus .gz/.br) under this directory")
+    parser.add_argument("--store", nargs="?", const=static_store.STATIC_STORE_DIR or None, metavar="DIR",
+                        help="publish the cards into the static store the server reads (default: STATIC_STORE_DIR)")
+    parser.add_argument("--workers", type=int, default=4, help="user batches fetched at the same time")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="users per GraphQL query")
+    parser.add_argument("--max-wait", type=float, default=3600,
+                        help="seconds to wait for a rate limit reset when every token is spent")
+    args = parser.parse_args(argv)
+
+    cards = [card.strip() for card in args.cards.split(",") if card.strip()]
+    unknown = [card for card in cards if card not in CARD_TYPES]
+    if unknown:
+        parser.error(f"unknown card type(s): {', '.join(unknown)}")
+    themes = list_themes() if args.themes == "all" else [theme.strip() for theme in args.themes.split(",") if theme.strip()]
+    usernames = read_usernames(args.users)
+    if not token_pool.configured_tokens():
+        parser.error("set GITHUB_TOKEN or GITHUB_TOKENS")
+
+    if "--store" in (argv if argv is not None else sys.argv) and not args.store:
+        parser.error("--store needs a directory or STATIC_STORE_DIR")
+
+    # A batch job should wait out the rate limit rather than drop users
+    token_pool.MAX_WAIT = args.max_wait
+    # and is bounded by --workers, not by the server's admission control
+    admission.ADMISSION_ENABLED = False
+
+    print(f"Prewarming {len(usernames)} users x {len(cards)} cards x {len(themes)} themes with {args.workers} workers")
+    progress = prewarm(usernames, cards=cards, themes=themes, all_modes=args.all_modes,
+                       include_private=args.include_private, output_dir=args.output_dir,
+                       workers=args.workers, batch_size=args.batch_size, store_dir=args.store)
+
+    for username, error in progress.failed[:20]:
+        print(f"  {username}: {error}")
+    if len(progress.failed) > 20:
+        print(f"  ... and {len(progress.failed) - 20} more")
+    elapsed = time.time() - progress.started
+    print(f"Done in {elapsed:.1f}s: {progress.cards} cards, {progress.card_errors} card errors, "
+          f"{len(progress.failed)} of {progress.total} users failed")
+    print(f"GraphQL points spent: {sum(entry['cost'] for entry in github_service.query_costs.values())}")
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
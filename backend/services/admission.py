@@ -0,0 +1,251 @@
+import contextvars
+import math
+import os
+import threading
+import time
+
+from services import metrics
+from services.cache import TTLCache
+
+# Admission control for GitHub fetches. Users we have nothing cached for are
+# the expensive requests (a crawler walking random usernames costs a query
+# each), so they pay from a shared token bucket, plus one per client when
+# ADMISSION_CLIENT_HEADER says where the client address is, and need a free
+# fetch slot without waiting for one. The priority lane,
+# users with a cached bundle (refreshes, missing sections) or on the roster,
+# skips the buckets and can use the slots held back for it. A shed fetch
+# returns an error bundle and the card routes answer with a placeholder card
+# right away. Cache hits and stale bundles never pass through here, so
+# README views of known users don't queue behind a flood of misses.
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+# Uncached users a single client may request: ADMISSION_CLIENT_RATE per second, bursts of ADMISSION_CLIENT_BURST
+CLIENT_RATE = float(os.environ.get("ADMISSION_CLIENT_RATE", 0.5))
+CLIENT_BURST = float(os.environ.get("ADMISSION_CLIENT_BURST", 20))
+# The same, shared by every client
+MISS_RATE = float(os.environ.get("ADMISSION_MISS_RATE", 5))
+MISS_BURST = float(os.environ.get("ADMISSION_MISS_BURST", 100))
+# GitHub fetches in flight per process, and how many of those only the priority lane may use
+MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", 16))
+PRIORITY_RESERVE = int(os.environ.get("ADMISSION_PRIORITY_RESERVE", 4))
+# Seconds the priority lane waits for a slot; the normal lane never waits
+PRIORITY_WAIT = float(os.environ.get("ADMISSION_PRIORITY_WAIT", 2))
+# Request header holding the client address behind a proxy (e.g. X-Forwarded-For).
+# Unset, there is no per-client budget: behind gunicorn, a router or camo every peer address is the proxy's.
+CLIENT_HEADER = os.environ.get("ADMISSION_CLIENT_HEADER", "")
+# Proxies of ours that append to CLIENT_HEADER. The client can write anything
+# before their entries, so the address used is the one the outermost of them appended.
+TRUSTED_HOPS = max(1, int(os.environ.get("ADMISSION_TRUSTED_HOPS", 1)))
+# Usernames always admitted on the priority lane, one per line (the prewarm CLI's format)
+ROSTER_FILE = os.environ.get("ADMISSION_ROSTER", "")
+
+counts = {"admitted": 0, "admitted_priority": 0, "shed_client": 0, "shed_rate": 0, "shed_busy": 0}
+
+# Client address of the request being served
+_client = contextvars.ContextVar("admission_client", default=None)
+
+
+class Shed(Exception):
+    """
+    A fetch turned away; reason is "client", "rate" or "busy".
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Fetch shed ({reason}), retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "lock")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount=1):
+        """
+        Takes amount tokens if they are there. Returns 0 on success, or the seconds until they would be.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A batch larger than the burst can never fit; let it through on a full bucket
+            amount = min(amount, self.burst)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) / self.rate if self.rate > 0 else 3600
+
+
+class FetchSlots:
+    """
+    Counts GitHub fetches in flight. The last `reserve` slots are only handed to the priority lane.
+    """
+
+    def __init__(self, size, reserve):
+        self.size = size
+        self.reserve = min(reserve, size)
+        self.in_flight = 0
+        self.peak = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, priority=False, wait=0):
+        limit = self.size if priority else self.size - self.reserve
+        deadline = time.monotonic() + wait
+        with self.cond:
+            while self.in_flight >= limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+
+class _Slot:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        slots.release()
+        return False
+
+
+class _NoSlot:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+SLOT = _Slot()
+NO_SLOT = _NoSlot()
+
+slots = FetchSlots(MAX_INFLIGHT, PRIORITY_RESERVE)
+miss_bucket = TokenBucket(MISS_RATE, MISS_BURST)
+# One bucket per client address; an idle client's bucket is long full again by the time it expires
+client_buckets = TTLCache(ttl=3600, max_entries=int(os.environ.get("ADMISSION_MAX_CLIENTS", 100000)))
+_client_lock = threading.Lock()
+
+
+def load_roster(path):
+    if not path:
+        return frozenset()
+    try:
+        with open(path) as f:
+            return frozenset(line.split("#", 1)[0].strip().lower() for line in f if line.split("#", 1)[0].strip())
+    except OSError as e:
+        print(f"Could not read ADMISSION_ROSTER {path}: {e}")
+        return frozenset()
+
+
+roster = load_roster(ROSTER_FILE)
+
+
+def client_address(remote_addr, headers):
+    """
+    The address a client's budget is kept under: the TRUSTED_HOPS-th entry
+    of CLIENT_HEADER from the right, or the peer address for requests that
+    didn't come through that many proxies.
+    None, so no per-client budget, when CLIENT_HEADER isn't set.
+    """
+    if not CLIENT_HEADER:
+        return None
+    # ASGI header names are lowercase
+    forwarded = headers.get(CLIENT_HEADER) or headers.get(CLIENT_HEADER.lower()) or ""
+    entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+    if len(entries) >= TRUSTED_HOPS:
+        return entries[-TRUSTED_HOPS]
+    return remote_addr
+
+
+def set_client(client):
+    """
+    Sets the client of the request being served; pass the result to reset_client() when it is done.
+    """
+    return _client.set(client)
+
+
+def reset_client(token):
+    _client.reset(token)
+
+
+def client_bucket(client):
+    with _client_lock:
+        bucket = client_buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(CLIENT_RATE, CLIENT_BURST)
+            client_buckets.set(client, bucket)
+    return bucket
+
+
+def admit(usernames, priority=False, wait=None):
+    """
+    Admits one GitHub fetch for usernames. Returns a context manager that
+    holds a fetch slot until the fetch is done, or raises Shed.
+    priority is for users with something cached already; roster users always get it.
+    wait caps how long the priority lane waits for a slot (PRIORITY_WAIT by default).
+    """
+    if not ADMISSION_ENABLED:
+        return NO_SLOT
+    priority = priority or all(username.lower() in roster for username in usernames)
+    if not priority:
+        client = _client.get()
+        if client:
+            retry_after = client_bucket(client).take(len(usernames))
+            if retry_after:
+                counts['shed_client'] += 1
+                raise Shed("client", retry_after)
+        retry_after = miss_bucket.take(len(usernames))
+        if retry_after:
+            counts['shed_rate'] += 1
+            raise Shed("rate", retry_after)
+    if not slots.acquire(priority, (PRIORITY_WAIT if wait is None else wait) if priority else 0):
+        counts['shed_busy'] += 1
+        raise Shed("busy", 1)
+    counts['admitted_priority' if priority else 'admitted'] += 1
+    return SLOT
+
+
+def shed_bundle(shed):
+    """
+    The error bundle a shed fetch leaves for each of its users.
+    """
+    return {"error": "Too many requests, try again shortly", "shed": shed.reason, "retry_after": max(1, math.ceil(shed.retry_after))}
+
+
+def stats():
+    return dict(counts, in_flight=slots.in_flight, peak_in_flight=slots.peak, max_in_flight=slots.size,
+                clients=len(client_buckets), roster=len(roster))
+
+
+def collect_metrics():
+    return [
+        ("admission_total", "counter", "GitHub fetches admitted or shed", [
+            ({"lane": "normal", "result": "admitted"}, counts['admitted']),
+            ({"lane": "priority", "result": "admitted"}, counts['admitted_priority']),
+            ({"lane": "normal", "result": "shed_client"}, counts['shed_client']),
+            ({"lane": "normal", "result": "shed_rate"}, counts['shed_rate']),
+            ({"lane": "any", "result": "shed_busy"}, counts['shed_busy'])
+        ]),
+        ("github_fetches_in_flight", "gauge", "GitHub fetches holding an admission slot", [({}, slots.in_flight)])
+    ]
+
+
+metrics.register_collector(collect_metrics)
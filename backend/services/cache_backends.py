@@ -0,0 +1,298 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from services.cache import TTLCache
+
+
+class CacheBackend:
+    """
+    Key/value store for JSON-serializable payloads.
+    Backends never raise on get/set; a broken cache should only cost us a GitHub call.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": type(self).__name__}
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Per-process dict cache. Each gunicorn worker gets its own copy.
+    """
+
+    def __init__(self, ttl=14400, max_bytes=64 * 1024 * 1024):
+        self._cache = TTLCache(ttl=ttl, max_bytes=max_bytes)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl=None):
+        # ttl=0 means "never expires" for the shared backends; mirror that here
+        self._cache.set(key, value, ttl=(10 * 365 * 86400 if ttl == 0 else ttl))
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def stats(self):
+        return dict(self._cache.stats(), backend="memory")
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    File-backed cache shared by every worker process on the same node.
+    Uses WAL mode so readers don't block the writer. Expired rows are
+    deleted every purge_every writes, so the file doesn't only grow.
+    """
+
+    def __init__(self, path, ttl=14400, purge_every=1000):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.purged = 0
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"SQLite cache read failed: {e}")
+            return None
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            self.misses += 1
+            return None
+        try:
+            value = json.loads(row[0])
+        except ValueError as e:
+            print(f"SQLite cache entry {key} is corrupt: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+        except sqlite3.Error as e:
+            print(f"SQLite cache write failed: {e}")
+            return
+        # Every worker counts its own writes; any of them purging is enough
+        self._writes += 1
+        if self.purge_every and self._writes % self.purge_every == 0:
+            self.purge_expired()
+
+    def delete(self, key):
+        try:
+            self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"SQLite cache delete failed: {e}")
+
+    def purge_expired(self):
+        """
+        Deletes expired rows. Returns how many were deleted.
+        """
+        try:
+            deleted = self._conn().execute(
+                "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+        except sqlite3.Error as e:
+            print(f"SQLite cache purge failed: {e}")
+            return 0
+        self.purged += deleted
+        return deleted
+
+    def stats(self):
+        return {"backend": "sqlite", "path": self.path, "hits": self.hits, "misses": self.misses, "purged": self.purged}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend(CacheBackend):
+    """
+    Minimal RESP2 client (GET/SET/DEL) so any Redis-protocol server works
+    without pulling in redis-py. One connection per thread.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", ttl=14400, timeout=2):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._command("AUTH", self.password)
+        if self.db:
+            self._command("SELECT", str(self.db))
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _command(self, *args):
+        if getattr(self._local, 'sock', None) is None:
+            self._connect()
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            payload.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._local.sock.sendall(b"".join(payload))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count == -1:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _safe(self, *args):
+        try:
+            return self._command(*args)
+        except (OSError, ConnectionError) as e:
+            # Drop the broken connection; the next call reconnects
+            self._close()
+            print(f"Redis cache unavailable: {e}")
+        except RedisError as e:
+            print(f"Redis error: {e}")
+        return None
+
+    def get(self, key):
+        raw = self._safe("GET", key)
+        if raw is None:
+            self.misses += 1
+            return None
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            print(f"Redis cache entry {key} is corrupt: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl:
+            self._safe("SET", key, json.dumps(value), "EX", str(int(ttl)))
+        else:
+            self._safe("SET", key, json.dumps(value))
+
+    def delete(self, key):
+        self._safe("DEL", key)
+
+    def ping(self):
+        return self._safe("PING") == "PONG"
+
+    def stats(self):
+        return {"backend": "redis", "host": self.host, "port": self.port, "hits": self.hits, "misses": self.misses}
+
+
+class PrefixedBackend(CacheBackend):
+    """
+    Namespaces keys so several deployments can share one Redis/SQLite store.
+    """
+
+    def __init__(self, backend, prefix):
+        self.backend = backend
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.backend.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(self.prefix + key, value, ttl=ttl)
+
+    def delete(self, key):
+        self.backend.delete(self.prefix + key)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def get_cache_backend():
+    """
+    Builds the payload cache from the environment:
+    CACHE_BACKEND=memory|sqlite|redis, CACHE_SQLITE_PATH, REDIS_URL, PAYLOAD_CACHE_TTL.
+    """
+    kind = os.environ.get("CACHE_BACKEND", "memory").lower()
+    ttl = int(os.environ.get("PAYLOAD_CACHE_TTL", 14400))
+    prefix = os.environ.get("CACHE_PREFIX", "readme-stats:")
+
+    if kind == "sqlite":
+        backend = SQLiteBackend(os.environ.get("CACHE_SQLITE_PATH", "/tmp/readme-stats-cache.sqlite3"), ttl=ttl,
+                                purge_every=int(os.environ.get("CACHE_SQLITE_PURGE_EVERY", 1000)))
+    elif kind == "redis":
+        backend = RedisBackend(os.environ.get("REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+    else:
+        if kind != "memory":
+            print(f"Warning: unknown CACHE_BACKEND '{kind}', using memory.")
+        return MemoryBackend(ttl=ttl)
+
+    return PrefixedBackend(backend, prefix)
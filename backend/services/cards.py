@@ -0,0 +1,434 @@
+import contextvars
+import datetime
+import email.utils
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from services import metrics, negative_cache
+from services.cache import TTLCache
+from services.compression import available_encodings, compress_all, negotiate
+from services.github_service import (
+    get_user_bundle, get_user_bundles, bundle_digest, SECTIONS, user_data_from_bundle, calculate_streak_stats
+)
+from services.contribution_calendar import STREAK_MODES
+from services.contribution_history import get_contribution_history
+from services.language_stats import get_language_bytes
+from services.themes import get_theme_config
+from services.user_record import user_record
+from services.svg_generator import generate_stats_svg, generate_language_svg, generate_streak_svg, generate_trophies_svg, stack_svgs
+
+CARD_TYPES = ("stats", "languages", "streak", "trophies")
+
+# Bundle sections (see github_service.SECTIONS) each card is drawn from, so a
+# card's GraphQL query only asks for the fields it displays
+CARD_SECTIONS = {
+    "stats": ("repo_stats", "commits"),
+    "languages": ("repo_languages",),
+    "streak": ("calendar",),
+    "trophies": ("repo_stats", "commits", "activity")
+}
+
+# Cards whose output depends on include_private
+PRIVATE_AWARE_CARDS = ("stats", "trophies")
+
+# ?mode= values per card, default first: repo count per primary language or
+# bytes of code for languages, consecutive days or weeks for streaks
+CARD_MODES = {
+    "languages": ("count", "bytes"),
+    "streak": STREAK_MODES
+}
+
+# The streak route has always answered errors with a 404, the others with a 200 error card
+ERROR_STATUS = {"streak": 404}
+
+# Batch card requests (/api/cards)
+BATCH_MAX_CARDS = int(os.environ.get('BATCH_MAX_CARDS', 50))
+BATCH_RENDER_WORKERS = int(os.environ.get('BATCH_RENDER_WORKERS', 8))
+
+# Default for card_response's language_stats: None means the caller tried and got nothing
+NOT_FETCHED = object()
+
+CACHE_HEADERS = {'Cache-Control': 'public, max-age=14400'}
+NO_CACHE_HEADERS = {'Cache-Control': 'no-cache'}
+NO_STORE_HEADERS = {'Cache-Control': 'no-store'}
+
+# (svg, etag, last_modified, {encoding: compressed svg}) of rendered cards, keyed by (card, username, theme, include_private[, mode])
+render_cache = TTLCache(
+    ttl=int(os.environ.get('SVG_CACHE_TTL', 14400)),
+    max_bytes=int(os.environ.get('SVG_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+)
+
+
+def error_svg(message):
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="400" height="100"><rect width="100%" height="100%" fill="#0d1117"/><text x="10" y="20" fill="red" font-family="monospace">Error: {message}</text></svg>'
+
+
+def placeholder_svg(theme="default"):
+    """
+    Stand-in card for a user whose fetch was shed; it is never cached, so a reload shows the real card.
+    """
+    colors = get_theme_config(theme)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="400" height="100"><rect x="0.5" y="0.5" width="399" height="99" rx="4.5" '
+            f'fill="{colors["bg_gradient"][0]}" stroke="{colors["border"]}"/><text x="20" y="55" fill="{colors["text"]}" '
+            f'font-family="sans-serif" font-size="14">Busy fetching stats, this card will be ready shortly</text></svg>')
+
+
+def card_mode(card, mode):
+    """
+    The card's mode, or its default for modes it doesn't support.
+    """
+    modes = CARD_MODES.get(card)
+    if not modes:
+        return None
+    return mode if mode in modes else modes[0]
+
+
+def cache_key(card, username, theme, include_private, mode=None):
+    """
+    Key for a rendered card. GitHub logins are case-insensitive and
+    include_private only matters for some cards.
+    """
+    if card not in PRIVATE_AWARE_CARDS:
+        include_private = None
+    mode = card_mode(card, mode)
+    if mode and mode != CARD_MODES[card][0]:
+        return (card, username.lower(), theme, include_private, mode)
+    return (card, username.lower(), theme, include_private)
+
+
+def render_bundle(card, bundle, theme="default", include_private=False, language_stats=None, history=None, mode=None):
+    """
+    Renders a card from an already fetched user bundle.
+    language_stats (from get_language_bytes) switches the languages card to byte weights;
+    history (from get_contribution_history) gives the streak card the lifetime calendar
+    and mode="weekly" counts its streaks in weeks.
+    Returns (svg, ok). Error cards (ok == False) should not be cached.
+    """
+    if card not in CARD_TYPES:
+        raise ValueError(f"Unknown card type: {card}")
+
+    if bundle and bundle.get('shed'):
+        return placeholder_svg(theme), False
+    if not bundle or 'error' in bundle:
+        if card == "streak":
+            return '<svg><text>User not found</text></svg>', False
+        err_msg = bundle['error'] if bundle and 'error' in bundle else 'User not found'
+        return error_svg(err_msg), False
+
+    # Stats and streaks are derived once per user record, not once per theme
+    record = user_record(bundle)
+    if card == "streak":
+        return generate_streak_svg(record.streak(card_mode(card, mode), history), theme=theme), True
+
+    if card == "stats":
+        return generate_stats_svg(record.stats(include_private), theme=theme), True
+    if card == "languages":
+        if language_stats:
+            return generate_language_svg(language_stats['languages'], theme=theme, colors=language_stats['colors']), True
+        return generate_language_svg(record.languages, theme=theme), True
+    return generate_trophies_svg(record.stats(include_private), theme=theme), True
+
+
+def bundle_history(username, bundle):
+    """
+    Lifetime contribution calendar for the streak card, loaded once per user record.
+    """
+    return user_record(bundle).history(lambda: get_contribution_history(username, bundle))
+
+
+def render_card(card, username, theme="default", include_private=False):
+    """
+    Fetches the data for a card and renders it. Returns (svg, ok).
+    """
+    return render_bundle(card, get_user_bundle(username, CARD_SECTIONS[card]), theme=theme, include_private=include_private)
+
+
+def is_card_cached(card, username, theme, include_private, mode=None):
+    return cache_key(card, username, theme, include_private, mode) in render_cache
+
+
+def card_validators(card, bundle, theme, include_private, mode=None, language_stats=None):
+    """
+    (etag, last_modified) of a card, derived from the data it is rendered
+    from, so a revalidation can be answered without rendering.
+    """
+    if card not in PRIVATE_AWARE_CARDS:
+        include_private = None
+    extra = None
+    last_modified = bundle.get('modified_at')
+    if card == "streak":
+        # The current streak depends on the date as well as the data
+        today = datetime.datetime.utcnow().date()
+        extra = today.isoformat()
+        if last_modified is not None:
+            midnight = datetime.datetime(today.year, today.month, today.day, tzinfo=datetime.timezone.utc).timestamp()
+            last_modified = max(last_modified, midnight)
+    elif card == "languages" and mode == "bytes":
+        extra = json.dumps(language_stats, sort_keys=True)
+        # The byte totals change independently of the bundle; only the ETag follows them
+        last_modified = None
+    parts = json.dumps([
+        card, theme, include_private, mode, extra,
+        bundle.get('digest') or bundle_digest(bundle),
+        get_theme_config(theme)
+    ], sort_keys=True)
+    return '"%s"' % hashlib.sha1(parts.encode()).hexdigest(), last_modified
+
+
+def validator_headers(etag, last_modified=None):
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = email.utils.formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def not_modified(etag, last_modified, if_none_match=None, if_modified_since=None):
+    """
+    Evaluates If-None-Match, or If-Modified-Since when no If-None-Match was sent.
+    """
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison
+        return any(tag.strip().replace('W/', '', 1) == etag for tag in if_none_match.split(","))
+    if if_modified_since and last_modified is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None:
+            return False
+        return int(last_modified) <= since.timestamp()
+    return False
+
+
+def set_encoding_headers(headers, encoding):
+    headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        # The encoded bytes differ from the plain ones; a weak ETag still matches If-None-Match
+        headers['ETag'] = 'W/' + headers['ETag']
+
+
+def not_modified_response(headers):
+    headers.pop('Content-Encoding', None)
+    return "", 304, headers
+
+
+def cached_card_response(card, username, theme="default", include_private=False, mode=None,
+                         if_none_match=None, if_modified_since=None, accept_encoding=None):
+    """
+    card_response for a card in the render cache; None when it isn't, so
+    callers on an event loop can fetch the data without blocking first.
+    Not counted in metrics.card_cache, card_response counts its own lookups.
+    """
+    cached = render_cache.get(cache_key(card, username, theme, include_private, mode))
+    if cached is None:
+        return None
+    svg_content, etag, last_modified, encoded = cached
+    headers = dict(CACHE_HEADERS, **validator_headers(etag, last_modified))
+    headers['X-Cache'] = 'HIT'
+    encoding = negotiate(accept_encoding, encoded)
+    set_encoding_headers(headers, encoding)
+    if not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return not_modified_response(headers)
+    return encoded[encoding] if encoding else svg_content, 200, headers
+
+
+def card_response(card, username, theme="default", include_private=False, mode=None,
+                  bundle=None, language_stats=NOT_FETCHED, history=None, if_none_match=None, if_modified_since=None,
+                  accept_encoding=None):
+    """
+    Serves a card from the render cache, rendering it on a miss.
+    Returns (body, status, headers) so both the Flask and ASGI apps can use it.
+    mode is the card's ?mode= (see CARD_MODES); unsupported values fall back to the default.
+    Pass bundle/language_stats/history to skip the (blocking) fetches when the caller already has the data;
+    language_stats=None is a failed fetch and is not retried.
+    if_none_match/if_modified_since are the request's conditional headers; a match
+    returns an empty 304 before anything is rendered.
+    accept_encoding selects a pre-compressed body (bytes, with Content-Encoding set);
+    cards are compressed once when they are cached.
+    """
+    mode = card_mode(card, mode)
+    key = cache_key(card, username, theme, include_private, mode)
+    response = cached_card_response(card, username, theme, include_private, mode, if_none_match,
+                                    if_modified_since, accept_encoding)
+    metrics.card_cache.inc(card=card, result="hit" if response is not None else "miss")
+    if response is not None:
+        return response
+
+    if bundle is None:
+        bundle = get_user_bundle(username, CARD_SECTIONS[card])
+    fetched = bool(bundle) and 'error' not in bundle
+    if language_stats is NOT_FETCHED:
+        language_stats = get_language_bytes(username) if fetched and card == "languages" and mode == "bytes" else None
+    if fetched:
+        etag, last_modified = card_validators(card, bundle, theme, include_private, mode, language_stats)
+        if not_modified(etag, last_modified, if_none_match, if_modified_since):
+            headers = dict(CACHE_HEADERS, **validator_headers(etag, last_modified))
+            # Same ETag form the 200 would carry
+            set_encoding_headers(headers, negotiate(accept_encoding, available_encodings()))
+            return not_modified_response(headers)
+        if card == "streak" and history is None:
+            history = bundle_history(username, bundle)
+
+    with metrics.stage("render"):
+        svg_content, ok = render_bundle(card, bundle, theme=theme, include_private=include_private,
+                                        language_stats=language_stats, history=history, mode=mode)
+    if not ok:
+        # Error cards are never cached, but can still be revalidated by content
+        headers = dict(NO_CACHE_HEADERS, ETag='"%s"' % hashlib.sha1(svg_content.encode()).hexdigest())
+        if bundle and bundle.get('kind') == "not_found":
+            # Let CDNs and camo keep unknown users for as long as the negative cache does
+            headers['Cache-Control'] = f'public, max-age={negative_cache.NOT_FOUND_TTL}'
+        if bundle and bundle.get('shed'):
+            headers['Retry-After'] = str(bundle['retry_after'])
+            # Shed fetches (see admission.py) get a 200 placeholder whatever the reason:
+            # an <img> through camo shows anything else as a broken image
+            return svg_content, 200, headers
+        if not_modified(headers['ETag'], None, if_none_match):
+            return "", 304, headers
+        return svg_content, ERROR_STATUS.get(card, 200), headers
+
+    if card == "streak" and getattr(history, 'partial', False):
+        # Years of the history failed to load: nothing may keep or revalidate this card
+        headers = dict(NO_STORE_HEADERS)
+        headers['X-Cache'] = 'MISS'
+        return svg_content, 200, headers
+
+    with metrics.stage("compress"):
+        encoded = compress_all(svg_content)
+    # A bytes card that fell back to counts, or drawn from partial totals, shouldn't stick for the whole TTL
+    cacheable = not (card == "languages" and mode == "bytes" and (not language_stats or language_stats.get('partial')))
+    if cacheable:
+        render_cache.set(key, (svg_content, etag, last_modified, encoded))
+    headers = dict(CACHE_HEADERS if cacheable else NO_CACHE_HEADERS, **validator_headers(etag, last_modified))
+    headers['X-Cache'] = 'MISS'
+    encoding = negotiate(accept_encoding, encoded)
+    set_encoding_headers(headers, encoding)
+    return encoded[encoding] if encoding else svg_content, 200, headers
+
+
+def card_spec(card, username, theme="default", include_private=False, mode=None, card_id=None):
+    """
+    Validated description of one card in a batch request. Raises ValueError on bad input.
+    """
+    if card not in CARD_TYPES:
+        raise ValueError(f"Unknown card type: {card}")
+    if not username:
+        raise ValueError("Missing username")
+    theme = theme or "default"
+    mode = card_mode(card, mode)
+    if card_id is None:
+        card_id = f"{card}:{username}:{theme}" + (f":{mode}" if mode and mode != CARD_MODES[card][0] else "")
+    return {"id": card_id, "card": card, "username": username, "theme": theme,
+            "include_private": bool(include_private), "mode": mode}
+
+
+def card_specs_from_query(cards, theme="default", include_private=False, mode=None):
+    """
+    Parses ?cards=stats:octocat,streak:torvalds:dark (card:username[:theme]).
+    theme, include_private and mode apply to every card without its own theme.
+    """
+    specs = []
+    for item in cards.split(","):
+        if not item.strip():
+            continue
+        fields = [field.strip() for field in item.split(":")]
+        if len(fields) not in (2, 3):
+            raise ValueError(f"Expected card:username[:theme], got {item!r}")
+        specs.append(card_spec(fields[0], fields[1], fields[2] if len(fields) == 3 else theme, include_private, mode))
+    return specs
+
+
+def card_specs_from_json(items):
+    """
+    Parses a JSON list of {"card", "username", "theme", "include_private", "mode", "id"} objects.
+    """
+    if not isinstance(items, list):
+        raise ValueError("'cards' must be a list")
+    specs = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each card must be an object")
+        specs.append(card_spec(
+            item.get("card"), item.get("username"), item.get("theme", "default"),
+            item.get("include_private", False), item.get("mode"), item.get("id")
+        ))
+    return specs
+
+
+def render_cards(specs):
+    """
+    Renders a batch of cards. Users with any uncached card are fetched once,
+    together (see get_user_bundles), and the cards are then rendered on a
+    small pool so per-user extras (history, language bytes) overlap.
+    Returns [(spec, body, status, headers)] in request order.
+    """
+    if len(specs) > BATCH_MAX_CARDS:
+        raise ValueError(f"At most {BATCH_MAX_CARDS} cards per request")
+
+    uncached = [spec for spec in specs if not is_card_cached(
+        spec['card'], spec['username'], spec['theme'], spec['include_private'], spec['mode'])]
+    missing = [spec['username'] for spec in uncached]
+    # One query shape per batch: the union of the sections its cards need
+    needed = {section for spec in uncached for section in CARD_SECTIONS[spec['card']]}
+    bundles = get_user_bundles(missing, tuple(section for section in SECTIONS if section in needed)) if missing else {}
+
+    def render(spec):
+        bundle = None
+        if spec['username'] in missing:
+            # A None bundle means no token; render the usual error card instead of fetching again
+            bundle = bundles.get(spec['username'].lower()) or {}
+        body, status, headers = card_response(spec['card'], spec['username'], theme=spec['theme'],
+                                              include_private=spec['include_private'], mode=spec['mode'], bundle=bundle)
+        return spec, body, status, headers
+
+    if len(missing) > 1 and BATCH_RENDER_WORKERS > 1:
+        with ThreadPoolExecutor(max_workers=min(BATCH_RENDER_WORKERS, len(specs))) as pool:
+            # Each card in a copy of this request's context, so its fetches see the admission client
+            futures = [pool.submit(contextvars.copy_context().run, render, spec) for spec in specs]
+            return [future.result() for future in futures]
+    return [render(spec) for spec in specs]
+
+
+def user_batch(usernames, include_private=False):
+    """
+    JSON stats, languages and streak for several users, fetched together
+    (see get_user_bundles). Raises ValueError on bad input.
+    """
+    if not usernames:
+        raise ValueError("No users given")
+    if len(usernames) > 50:
+        raise ValueError("At most 50 users per request")
+    results = {}
+    for username, bundle in get_user_bundles(usernames).items():
+        if not bundle or 'error' in bundle:
+            results[username] = {"error": bundle['error'] if bundle else 'User not found'}
+            continue
+        data = user_data_from_bundle(bundle, include_private)
+        data['streak'] = calculate_streak_stats(get_contribution_history(username, bundle))
+        results[username] = data
+    return results
+
+
+def combined_card_response(results):
+    """
+    One SVG stacking every rendered card; only cacheable when none of them is an error card.
+    """
+    body = stack_svgs([body for _, body, _, _ in results])
+    cacheable = all(headers.get('Cache-Control') == CACHE_HEADERS['Cache-Control'] for _, _, _, headers in results)
+    return body, 200, dict(CACHE_HEADERS if cacheable else NO_CACHE_HEADERS)
+
+
+def collect_metrics():
+    cache = render_cache.stats()
+    return [
+        ("render_cache_entries", "gauge", "Rendered cards in the cache", [({}, cache['entries'])]),
+        ("render_cache_bytes", "gauge", "Size of the rendered card cache", [({}, cache['bytes'])]),
+        ("render_cache_evictions_total", "counter", "Rendered cards evicted to stay under SVG_CACHE_MAX_BYTES", [({}, cache['evictions'])])
+    ]
+
+
+metrics.register_collector(collect_metrics)
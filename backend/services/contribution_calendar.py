@@ -0,0 +1,188 @@
+import base64
+import datetime
+import sys
+from array import array
+
+# Daily contribution counts stored as one unsigned 16-bit array starting at an
+# ordinal date: 2 bytes per day instead of a dict with an ISO string per day.
+# Cached bundles carry it as {"start": "YYYY-MM-DD", "counts": base64}.
+
+MAX_COUNT = 0xFFFF
+STREAK_MODES = ("daily", "weekly")
+
+# bytes.translate table: any non-zero byte becomes 1
+_NONZERO = bytes([0] + [1] * 255)
+
+
+class ContributionCalendar:
+    __slots__ = ("start", "counts", "partial")
+
+    def __init__(self, start, counts=None, partial=False):
+        self.start = start
+        self.counts = counts if counts is not None else array('H')
+        # Set when some of the days it should span could not be fetched
+        self.partial = partial
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def end(self):
+        return self.start + len(self.counts) - 1
+
+    def date(self, index):
+        return datetime.date.fromordinal(self.start + index)
+
+    @classmethod
+    def from_days(cls, days):
+        """
+        Builds a calendar from GraphQL contributionDays dicts, in any order.
+        Days missing from the input count as zero.
+        """
+        pairs = [(datetime.date.fromisoformat(day['date']).toordinal(), day['contributionCount']) for day in days]
+        if not pairs:
+            return cls(datetime.date.today().toordinal())
+        start = min(ordinal for ordinal, _ in pairs)
+        counts = array('H', [0]) * (max(ordinal for ordinal, _ in pairs) - start + 1)
+        for ordinal, count in pairs:
+            counts[ordinal - start] = min(count, MAX_COUNT)
+        return cls(start, counts)
+
+    @classmethod
+    def from_dict(cls, data):
+        counts = array('H')
+        counts.frombytes(base64.b64decode(data['counts']))
+        if sys.byteorder == "big":
+            counts.byteswap()
+        return cls(datetime.date.fromisoformat(data['start']).toordinal(), counts)
+
+    def to_dict(self):
+        counts = self.counts
+        if sys.byteorder == "big":
+            counts = array('H', counts)
+            counts.byteswap()
+        return {
+            "start": self.date(0).isoformat(),
+            "counts": base64.b64encode(counts.tobytes()).decode("ascii")
+        }
+
+    @classmethod
+    def merge(cls, calendars):
+        """
+        One calendar spanning all of the given ones; later calendars win where they overlap.
+        """
+        calendars = [calendar for calendar in calendars if len(calendar)]
+        if not calendars:
+            return cls(datetime.date.today().toordinal())
+        start = min(calendar.start for calendar in calendars)
+        counts = array('H', [0]) * (max(calendar.end for calendar in calendars) - start + 1)
+        for calendar in calendars:
+            offset = calendar.start - start
+            counts[offset:offset + len(calendar)] = calendar.counts
+        return cls(start, counts)
+
+
+def load_calendar(value):
+    """
+    Accepts a ContributionCalendar, its dict form or a list of contributionDays dicts.
+    """
+    if isinstance(value, ContributionCalendar):
+        return value
+    if isinstance(value, dict):
+        return ContributionCalendar.from_dict(value)
+    return ContributionCalendar.from_days(value or [])
+
+
+def _active(units):
+    """
+    One byte per day/week: 1 if anything was contributed. Works on the raw
+    little-endian 16-bit counts so the loop stays in C.
+    """
+    if units.typecode != 'H':
+        return bytes(map(bool, units))
+    raw = units.tobytes()
+    low = int.from_bytes(raw[0::2].translate(_NONZERO), "big")
+    high = int.from_bytes(raw[1::2].translate(_NONZERO), "big")
+    return (low | high).to_bytes(len(units), "big")
+
+
+def _weekly(calendar):
+    """
+    Per-week totals (weeks start on Sunday like GitHub's calendar) and the ordinal of the first week's Sunday.
+    """
+    # date.fromordinal(7) is a Sunday, so ordinal // 7 numbers Sunday-based weeks
+    first_week = calendar.start // 7
+    # Zero-pad to whole weeks, then add up the seven day-of-week columns in C
+    lead = calendar.start % 7
+    trail = 6 - calendar.end % 7
+    days = array('H', bytes(2 * lead)) + calendar.counts + array('H', bytes(2 * trail))
+    totals = array('L', map(sum, zip(*(days[i::7] for i in range(7)))))
+    return totals, first_week * 7
+
+
+def streak_stats(calendar, mode="daily", today=None):
+    """
+    Totals and streaks in one pass over the calendar.
+
+    The current streak may end today (in UTC) or, while today has no contributions
+    yet, yesterday (this week or last week in weekly mode). Streak lengths
+    count days, or weeks with at least one contribution in weekly mode.
+    """
+    if mode not in STREAK_MODES:
+        mode = "daily"
+    # UTC, like the card validators that decide when a streak card is stale
+    today = (today or datetime.datetime.utcnow().date()).toordinal()
+    if not len(calendar):
+        return {
+            "total_contributions": 0,
+            "current_streak": 0,
+            "longest_streak": 0,
+            "start_date": "",
+            "end_date": "",
+            "current_streak_start": "",
+            "current_streak_end": "",
+            "longest_streak_start": "",
+            "longest_streak_end": "",
+            "mode": mode
+        }
+
+    if mode == "weekly":
+        units, origin = _weekly(calendar)
+        unit_days = 7
+    else:
+        units, origin, unit_days = calendar.counts, calendar.start, 1
+    active = _active(units)
+
+    def first_day(index):
+        return datetime.date.fromordinal(max(calendar.start, origin + index * unit_days)).isoformat()
+
+    def last_day(index):
+        return datetime.date.fromordinal(min(calendar.end, origin + index * unit_days + unit_days - 1)).isoformat()
+
+    longest = max(map(len, active.split(b"\x00")))
+    # No run is longer, so the first `longest` ones in a row are the first longest run
+    longest_start = active.find(b"\x01" * longest) if longest else 0
+    longest_end = longest_start + longest - 1
+
+    current = 0
+    current_start = current_end = ""
+    now = (today - origin) // unit_days
+    for end in (now, now - 1):
+        if 0 <= end < len(active) and active[end]:
+            start = active.rfind(b"\x00", 0, end) + 1
+            current = end - start + 1
+            current_start, current_end = first_day(start), last_day(end)
+            break
+
+    return {
+        "total_contributions": sum(calendar.counts),
+        "current_streak": current,
+        "longest_streak": longest,
+        "start_date": calendar.date(0).isoformat(),
+        "end_date": calendar.date(len(calendar) - 1).isoformat(),
+        "current_streak_start": current_start,
+        "current_streak_end": current_end,
+        "longest_streak_start": first_day(longest_start) if longest else "",
+        "longest_streak_end": last_day(longest_end) if longest else "",
+        "mode": mode
+    }
@@ -0,0 +1,170 @@
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from services import admission, http_client, github_service
+from services.contribution_calendar import ContributionCalendar, load_calendar
+from services.github_service import (
+    get_headers, get_user_bundle, bundle_calendar, calculate_streak_stats, payload_cache, inflight, PAYLOAD_FRESH_TTL
+)
+from services.singleflight import SingleFlightTimeout
+from services.token_pool import TokensExhausted
+
+# Lifetime contribution history. contributionsCollection(from:, to:) spans at
+# most one year, so each year since createdAt is its own query. Finished years
+# never change and are cached without expiry; the recent days come from the
+# calendar already in the user's bundle, so a refresh costs no extra queries.
+
+# Years of one user fetched at the same time
+HISTORY_CONCURRENCY = int(os.environ.get("HISTORY_CONCURRENCY", 4))
+
+YEAR_QUERY = """
+query($login: String!, $from: DateTime!, $to: DateTime!) {
+  user(login: $login) {
+    contributionsCollection(from: $from, to: $to) {
+      contributionCalendar {
+        weeks {
+          contributionDays {
+            contributionCount
+            date
+          }
+        }
+      }
+    }
+  }
+  rateLimit { cost remaining }
+}
+"""
+
+stats = {"years_cached": 0, "years_fetched": 0}
+
+
+def get_contribution_years(username, mode="daily"):
+    """
+    Streak stats over the user's whole contribution history.
+    """
+    bundle = get_user_bundle(username, ("calendar",))
+    if not bundle or 'error' in bundle:
+        return None
+    return calculate_streak_stats(get_contribution_history(username, bundle), mode=mode)
+
+
+def get_contribution_history(username, bundle):
+    """
+    ContributionCalendar of every day since the account was created.
+    Cached years are merged with the bundle's trailing-year calendar, which
+    wins where they overlap so late changes to the previous year still show.
+    The calendar is marked partial when some years could not be fetched.
+    """
+    recent = bundle_calendar(bundle)
+    if not len(recent):
+        return recent
+    first_year = int(bundle['stats']['created_at'][:4])
+    # The trailing calendar normally reaches back into last year; only years before it need queries
+    last_year = recent.date(0).year
+    years = list(range(first_year, last_year + 1))
+    if not years:
+        return recent
+
+    key = f"history:{username.lower()}"
+    try:
+        by_year = inflight.do(key, lambda: load_years(username, years), timeout=github_service.INFLIGHT_TIMEOUT)
+    except SingleFlightTimeout:
+        by_year = {}
+
+    history = ContributionCalendar.merge([load_calendar(by_year[year]) for year in years if year in by_year] + [recent])
+    history.partial = len(by_year) < len(years)
+    return history
+
+
+def _year_key(username, year):
+    return f"contributions:{username.lower()}:{year}"
+
+
+def load_years(username, years):
+    """
+    Returns {year: calendar dict}, fetching the uncached years in parallel.
+    Years that fail are left out and retried on the next call.
+    """
+    by_year = {}
+    missing = []
+    for year in years:
+        calendar = payload_cache.get(_year_key(username, year))
+        if calendar is not None:
+            stats['years_cached'] += 1
+            by_year[year] = calendar
+        else:
+            missing.append(year)
+    if not missing:
+        return by_year
+
+    # Only reached for users whose bundle was fetched, so on the priority lane
+    try:
+        with admission.admit([username], priority=True):
+            return _fetch_years(username, missing, by_year)
+    except admission.Shed as e:
+        print(f"Skipping contribution history for {username}: {e}")
+        return by_year
+
+
+def _fetch_years(username, missing, by_year):
+    try:
+        headers = get_headers()
+    except TokensExhausted as e:
+        print(f"Skipping contribution history for {username}: {e}")
+        return by_year
+    if not headers:
+        return by_year
+
+    this_year = datetime.datetime.utcnow().year
+
+    def fetch(year):
+        return year, fetch_contribution_year(username, year, headers)
+
+    if len(missing) > 1 and HISTORY_CONCURRENCY > 1:
+        with ThreadPoolExecutor(max_workers=min(HISTORY_CONCURRENCY, len(missing))) as pool:
+            fetched = list(pool.map(fetch, missing))
+    else:
+        fetched = [fetch(year) for year in missing]
+
+    for year, calendar in fetched:
+        if calendar is None:
+            continue
+        stats['years_fetched'] += 1
+        # A finished year is immutable; the current one is only cached like a bundle
+        payload_cache.set(_year_key(username, year), calendar, ttl=0 if year < this_year else PAYLOAD_FRESH_TTL)
+        by_year[year] = calendar
+    return by_year
+
+
+def fetch_contribution_year(username, year, headers):
+    """
+    ContributionCalendar dict of one calendar year, or None on error.
+    """
+    variables = {
+        'login': username,
+        'from': f"{year}-01-01T00:00:00Z",
+        'to': f"{year}-12-31T23:59:59Z"
+    }
+    try:
+        response = http_client.post(github_service.GITHUB_GRAPHQL_URL, json={'query': YEAR_QUERY, 'variables': variables}, headers=headers)
+        if response.status_code != 200:
+            print(f"Contribution year request failed: {response.status_code}")
+            return None
+        data = response.json()
+        github_service.record_query_cost("contribution_year", data)
+    except Exception as e:
+        print(f"Error fetching {year} contributions for {username}: {e}")
+        return None
+
+    user = (data.get('data') or {}).get('user')
+    if data.get('errors') or not user:
+        print(f"GraphQL errors: {data.get('errors')}")
+        return None
+    prefix = f"{year}-"
+    return ContributionCalendar.from_days(
+        day
+        for week in user['contributionsCollection']['contributionCalendar']['weeks']
+        for day in week['contributionDays']
+        if day['date'].startswith(prefix)
+    ).to_dict()
@@ -0,0 +1,238 @@
+import asyncio
+import email.utils
+import time
+
+from services import admission, github_service, http_client, metrics, negative_cache, token_pool
+from services.github_service import (
+    get_headers, build_bundle_query, parse_bundle_response, parse_repository_page, normalize_user,
+    user_data_from_bundle, RepoTotals, RepositoryPageError, REPO_PAGE_QUERY, REPO_PAGE_SIZE, REPO_MAX_PAGES, SECTIONS, DATA_SECTIONS,
+    calculate_streak_stats, read_cached_bundle, store_bundle, schedule_refresh, missing_sections,
+    sections_to_fetch, sections_label, repo_page_query, record_query_cost, INFLIGHT_TIMEOUT
+)
+from services.contribution_history import get_contribution_history
+from services.singleflight import AsyncSingleFlight
+from services.token_pool import TokensExhausted
+
+try:
+    import httpx
+except ImportError:  # only needed for the ASGI entry point
+    httpx = None
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+inflight = AsyncSingleFlight()
+_client = None
+
+
+def get_client():
+    """
+    Process-wide async client. Shares the pool size, timeout and retry
+    settings of the sync session in http_client.
+    """
+    global _client
+    if httpx is None:
+        raise RuntimeError("The ASGI mode needs httpx: pip install httpx")
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=http_client.DEFAULT_TIMEOUT,
+            limits=httpx.Limits(max_connections=http_client.POOL_SIZE, max_keepalive_connections=http_client.POOL_SIZE)
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(response, attempt):
+    """
+    Seconds to wait before retrying, or None when the response is final.
+    Mirrors GitHubRetry: 5xx/429 always, 403 only with Retry-After.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if response.status_code not in RETRY_STATUSES and not (response.status_code == 403 and retry_after):
+        return None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(retry_after)
+            delay = parsed.timestamp() - time.time() if parsed else 0
+        return max(0.0, min(delay, http_client.MAX_RETRY_AFTER))
+    return http_client.RETRY_BACKOFF * (2 ** attempt)
+
+
+async def post_graphql(payload, headers):
+    client = get_client()
+    attempt = 0
+    # Like GitHubRetry, sleeps between retries add up to MAX_RETRY_SLEEP at most
+    slept = 0.0
+    while True:
+        try:
+            with metrics.stage("github_fetch"):
+                response = await client.post(github_service.GITHUB_GRAPHQL_URL, json=payload, headers=headers)
+            metrics.github_responses.inc(status=response.status_code)
+            token_pool.record(headers, response.status_code, response.headers)
+        except httpx.TransportError:
+            if attempt >= http_client.MAX_RETRIES or slept >= http_client.MAX_RETRY_SLEEP:
+                raise
+            delay = min(http_client.RETRY_BACKOFF * (2 ** attempt), http_client.MAX_RETRY_SLEEP - slept)
+            await asyncio.sleep(delay)
+            slept += delay
+            attempt += 1
+            continue
+        delay = _retry_delay(response, attempt)
+        if delay is None or attempt >= http_client.MAX_RETRIES or slept >= http_client.MAX_RETRY_SLEEP:
+            return response
+        delay = min(delay, http_client.MAX_RETRY_SLEEP - slept)
+        await asyncio.sleep(delay)
+        slept += delay
+        attempt += 1
+
+
+async def fetch_user_bundles_async(usernames, sections=SECTIONS, priority=False):
+    """
+    Async twin of github_service.fetch_user_bundles. Users of a batch are
+    paginated concurrently.
+    """
+    results = negative_cache.lookup(usernames)
+    usernames = [username for username in usernames if username.lower() not in results]
+    if not usernames:
+        return results
+    try:
+        # Like the token wait below, never wait on the event loop for a fetch slot
+        slot = admission.admit(usernames, priority, wait=0)
+    except admission.Shed as e:
+        # Not logged, a flood would drown the log; admission.stats() counts them
+        error = admission.shed_bundle(e)
+        results.update((username.lower(), error) for username in usernames)
+        return results
+    with slot:
+        fetched = await _fetch_user_bundles_async(usernames, sections)
+    negative_cache.remember_all(fetched)
+    results.update(fetched)
+    return results
+
+
+async def _fetch_user_bundles_async(usernames, sections):
+    try:
+        # Never sleep on the event loop waiting for a token
+        headers = get_headers(max_wait=0)
+    except TokensExhausted as e:
+        print(f"Shedding fetch of {', '.join(usernames)}: {e}")
+        error = {"error": "GitHub rate limit reached, try again later"}
+        return {username.lower(): error for username in usernames}
+    if not headers:
+        return {username.lower(): None for username in usernames}
+
+    query, variables, aliases = build_bundle_query(usernames, sections)
+    try:
+        response = await post_graphql({'query': query, 'variables': variables}, headers)
+        with metrics.stage("json_parse"):
+            data = response.json() if response.status_code == 200 else None
+        record_query_cost(sections_label(sections), data)
+        users = parse_bundle_response(response.status_code, data, aliases)
+    except Exception as e:
+        print(f"Error fetching user data: {e}")
+        error = {"error": f"Exception: {str(e)}", "kind": "transient"}
+        return {username.lower(): error for username in usernames}
+
+    page_query = repo_page_query(sections)
+
+    async def complete(username, user):
+        if 'error' in user:
+            return username, user
+        totals = None
+        if 'repositories' in user:
+            totals = RepoTotals()
+            try:
+                async for nodes in aiter_repository_pages(user['login'], user['repositories'], headers, page_query):
+                    totals.add_page(nodes)
+            except RepositoryPageError as e:
+                return username, {"error": str(e), "kind": "transient"}
+        with metrics.stage("normalize"):
+            return username, normalize_user(user, totals, sections)
+
+    return dict(await asyncio.gather(*(complete(username, user) for username, user in users.items())))
+
+
+async def aiter_repository_pages(login, first_page, headers, query=REPO_PAGE_QUERY):
+    """
+    Async twin of github_service.iter_repository_pages.
+    """
+    connection = first_page
+    pages = 0
+    while True:
+        yield connection['nodes']
+        pages += 1
+        page_info = connection.get('pageInfo') or {}
+        if not page_info.get('hasNextPage'):
+            return
+        if pages >= REPO_MAX_PAGES:
+            print(f"Repository pagination for {login} stopped at {pages} pages (REPO_MAX_PAGES)")
+            return
+        try:
+            response = await post_graphql(
+                {'query': query, 'variables': {'login': login, 'cursor': page_info['endCursor'], 'pageSize': REPO_PAGE_SIZE}},
+                headers
+            )
+            data = response.json() if response.status_code == 200 else None
+            record_query_cost("repo_page", data)
+            connection = parse_repository_page(response.status_code, data)
+        except Exception as e:
+            print(f"Error fetching repositories page for {login}: {e}")
+            raise RepositoryPageError(f"Repositories page {pages + 1} failed") from e
+        if connection is None:
+            raise RepositoryPageError(f"Repositories page {pages + 1} failed")
+
+
+async def _run_blocking(fn, *args):
+    # sqlite/redis cache backends block, keep them off the event loop
+    return await asyncio.to_thread(fn, *args)
+
+
+async def get_user_bundle_async(username, sections=SECTIONS):
+    """
+    Async twin of github_service.get_user_bundle; uses the same payload cache.
+    Stale bundles are refreshed on the shared background pool.
+    """
+    for _ in range(3):
+        bundle, fresh = await _run_blocking(read_cached_bundle, username)
+        if bundle is not None and not missing_sections(bundle, sections):
+            if not fresh:
+                schedule_refresh(username)
+            return bundle
+        wanted = sections_to_fetch(bundle, fresh, sections)
+        priority = bundle is not None
+
+        async def fetch():
+            bundle = (await fetch_user_bundles_async([username], wanted, priority)).get(username.lower())
+            if bundle and 'error' not in bundle:
+                bundle = await _run_blocking(store_bundle, username, bundle)
+            return bundle
+
+        try:
+            bundle = await inflight.do(f"user:{username.lower()}", fetch, timeout=INFLIGHT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"error": "Timed out waiting for GitHub"}
+        if not bundle or 'error' in bundle or not missing_sections(bundle, sections):
+            return bundle
+    return bundle
+
+
+async def get_user_data_async(username, include_private=True):
+    bundle = await get_user_bundle_async(username, DATA_SECTIONS)
+    if not bundle or 'error' in bundle:
+        return bundle
+    return user_data_from_bundle(bundle, include_private)
+
+
+async def get_contribution_years_async(username, mode="daily"):
+    bundle = await get_user_bundle_async(username, ("calendar",))
+    if not bundle or 'error' in bundle:
+        return None
+    history = await _run_blocking(get_contribution_history, username, bundle)
+    return calculate_streak_stats(history, mode=mode)
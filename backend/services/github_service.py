@@ -1,224 +1,628 @@
-import requests
 import os
-import datetime
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services import admission, http_client, metrics, negative_cache, token_pool
+from services.cache_backends import get_cache_backend
+from services.contribution_calendar import ContributionCalendar, load_calendar, streak_stats
+from services.singleflight import SingleFlight, SingleFlightTimeout
+from services.token_pool import TokensExhausted
 
-GITHUB_API_URL = "https://api.github.com"
-GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+GITHUB_GRAPHQL_URL = os.environ.get("GITHUB_GRAPHQL_URL", "https://api.github.com/graphql")
 
-def get_headers():
-    token = os.environ.get("GITHUB_TOKEN")
-    if not token:
+# Normalized GitHub payloads, shared across workers when a sqlite/redis backend is configured
+payload_cache = get_cache_backend()
+
+# Concurrent card loads for the same user share one GitHub round-trip
+inflight = SingleFlight()
+INFLIGHT_TIMEOUT = float(os.environ.get("INFLIGHT_TIMEOUT", 15))
+
+# Stale-while-revalidate: bundles are fresh for PAYLOAD_CACHE_TTL seconds, then
+# served stale for up to PAYLOAD_STALE_TTL more while a background refresh runs.
+# A failed refresh keeps the old bundle, so cards survive GitHub outages.
+PAYLOAD_FRESH_TTL = int(os.environ.get("PAYLOAD_CACHE_TTL", 14400))
+PAYLOAD_STALE_TTL = int(os.environ.get("PAYLOAD_STALE_TTL", 7 * 86400))
+refresh_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("REFRESH_WORKERS", 4)), thread_name_prefix="refresh")
+_refresh_lock = threading.Lock()
+_refreshing = set()
+refresh_stats = {"stale_served": 0, "refreshes": 0, "refresh_failures": 0}
+# Bumped from request threads and the refresh pool at once
+_refresh_stats_lock = threading.Lock()
+# store_bundle merges with the cached entry; striped locks keep two writers of one user from dropping each other's sections
+_store_locks = [threading.Lock() for _ in range(64)]
+
+def get_headers(max_wait=None):
+    """
+    Headers for one GitHub request, authorized with the pooled token that has
+    the most rate limit left. Raises TokensExhausted when every token is spent.
+    """
+    pool = token_pool.get_pool()
+    if pool is None:
         # In production, this should probably error or use public API with strict limits
         print("Warning: GITHUB_TOKEN not found in environment.")
         return {}
     return {
-        "Authorization": f"Bearer {token}",
+        "Authorization": f"Bearer {pool.acquire(max_wait)}",
         "Content-Type": "application/json"
     }
 
+# The bundle is fetched in sections so each card's query only asks for what
+# the card draws (see CARD_SECTIONS in cards.py). The profile (name, login,
+# createdAt, followers) is always included.
+SECTIONS = ("repo_stats", "repo_languages", "commits", "activity", "calendar")
+# Everything the JSON stats routes return
+DATA_SECTIONS = ("repo_stats", "repo_languages", "commits", "activity")
+
+# Repository node fields per section
+REPO_NODE_FIELDS = {
+    "repo_stats": "stargazers { totalCount } forks { totalCount }",
+    "repo_languages": "primaryLanguage { name }"
+}
+
+# Appended to every query so each response reports its point cost
+RATE_LIMIT_FIELDS = "rateLimit { cost remaining }"
+
+# Per-query point spend, keyed by the sections (or kind) of the query
+query_costs = {}
+_costs_lock = threading.Lock()
+
+def repo_node_fields(sections):
+    return " ".join(REPO_NODE_FIELDS[section] for section in SECTIONS if section in sections and section in REPO_NODE_FIELDS)
+
+def user_fields(sections):
+    """
+    The UserFields fragment for a set of sections.
+    """
+    fields = ["name", "login", "createdAt", "followers { totalCount }"]
+    if "activity" in sections:
+        fields += ["following { totalCount }", "issues { totalCount }", "pullRequests { totalCount }", "organizations { totalCount }"]
+    nodes = repo_node_fields(sections)
+    if nodes:
+        fields.append(
+            "repositories(first: $repoPageSize, ownerAffiliations: [OWNER], orderBy: {field: STARGAZERS, direction: DESC}) "
+            f"{{ totalCount pageInfo {{ hasNextPage endCursor }} nodes {{ {nodes} }} }}"
+        )
+    contributions = []
+    if "commits" in sections:
+        contributions += ["totalCommitContributions", "restrictedContributionsCount"]
+    if "calendar" in sections:
+        contributions.append("contributionCalendar { weeks { contributionDays { contributionCount date } } }")
+    if contributions:
+        fields.append(f"contributionsCollection {{ {' '.join(contributions)} }}")
+    return "fragment UserFields on User {\n  " + "\n  ".join(fields) + "\n}\n"
+
+def repo_page_query(sections=SECTIONS):
+    """
+    Follow-up repositories page carrying the same node fields as the bundle query.
+    """
+    return f"""
+query($login: String!, $cursor: String, $pageSize: Int!) {{
+  user(login: $login) {{
+    repositories(first: $pageSize, after: $cursor, ownerAffiliations: [OWNER], orderBy: {{field: STARGAZERS, direction: DESC}}) {{
+      pageInfo {{
+        hasNextPage
+        endCursor
+      }}
+      nodes {{
+        {repo_node_fields(sections)}
+      }}
+    }}
+  }}
+  {RATE_LIMIT_FIELDS}
+}}
+"""
+
+REPO_PAGE_QUERY = repo_page_query()
+
+def sections_label(sections):
+    return "+".join(section for section in SECTIONS if section in sections)
+
+def record_query_cost(label, data):
+    """
+    Adds a response's rateLimit cost to query_costs[label].
+    """
+    rate_limit = ((data or {}).get('data') or {}).get('rateLimit')
+    if not rate_limit:
+        return
+    with _costs_lock:
+        entry = query_costs.setdefault(label, {"requests": 0, "cost": 0, "remaining": None})
+        entry["requests"] += 1
+        entry["cost"] += rate_limit.get('cost') or 0
+        entry["remaining"] = rate_limit.get('remaining')
+
+# Users per aliased multi-user query; keeps a single POST well under GitHub's node limits
+BATCH_SIZE = int(os.environ.get("GITHUB_BATCH_SIZE", 10))
+
+# Repository pagination: GitHub caps pages at 100 nodes. Pages for one user
+# are cursor-chained and so sequential; REPO_PAGE_CONCURRENCY users of a batch
+# are paginated at once.
+REPO_PAGE_SIZE = min(100, int(os.environ.get("REPO_PAGE_SIZE", 100)))
+REPO_MAX_PAGES = int(os.environ.get("REPO_MAX_PAGES", 10))
+REPO_PAGE_CONCURRENCY = int(os.environ.get("REPO_PAGE_CONCURRENCY", 4))
+
 def get_user_data(username, include_private=True):
     """
     Fetches basic user data + repo stats via GraphQL API.
     Includes total commit contributions.
     """
-    headers = get_headers()
-    if not headers:
-        return None
+    bundle = get_user_bundle(username, DATA_SECTIONS)
+    if not bundle or 'error' in bundle:
+        return bundle
+    return user_data_from_bundle(bundle, include_private)
 
-    query = """
-    query($username: String!) {
-      user(login: $username) {
-        name
-        login
-        followers {
-          totalCount
-        }
-        following {
-          totalCount
-        }
-        repositories(first: 50, ownerAffiliations: [OWNER], orderBy: {field: STARGAZERS, direction: DESC}) {
-          totalCount
-          nodes {
-            name
-            stargazers {
-              totalCount
-            }
-            forks {
-              totalCount
-            }
-            primaryLanguage {
-              name
-            }
-          }
-        }
-        contributionsCollection {
-          totalCommitContributions
-          restrictedContributionsCount
-        }
-        issues {
-          totalCount
-        }
-        pullRequests {
-          totalCount
-        }
-        createdAt
-        organizations {
-          totalCount
-        }
-      }
-    }
+def get_user_bundle(username, sections=SECTIONS):
+    """
+    Returns what the cards need for one user, at least the given sections,
+    fetched with a single GraphQL query and cached. A user with nothing
+    cached is fetched whole, so the cards of a README loading at once share
+    one query; a cached bundle missing some sections only has those fetched
+    and merged in. Stale bundles are returned immediately and refreshed in the background.
+    """
+    for _ in range(3):
+        bundle, fresh = read_cached_bundle(username)
+        if bundle is not None and not missing_sections(bundle, sections):
+            if not fresh:
+                schedule_refresh(username)
+            return bundle
+        wanted = sections_to_fetch(bundle, fresh, sections)
+        # Users with a cached bundle are already known, their fetches go on the priority lane
+        priority = bundle is not None
+        try:
+            bundle = inflight.do(f"user:{username.lower()}", lambda: _fetch_and_store(username, wanted, priority), timeout=INFLIGHT_TIMEOUT)
+        except SingleFlightTimeout:
+            return {"error": "Timed out waiting for GitHub"}
+        # Joining another card's fetch of other sections merges them in; go again for the rest
+        if not bundle or 'error' in bundle or not missing_sections(bundle, sections):
+            return bundle
+    return bundle
+
+def get_user_bundles(usernames, sections=SECTIONS):
+    """
+    Bundles for several users. Cached users are served from the payload cache,
+    the rest are fetched BATCH_SIZE at a time with aliased user(login:) blocks.
+    Returns {lowercased username: bundle or error dict}.
+    """
+    results = {}
+    missing = []
+    known = set()
+    for username in dict.fromkeys(u.lower() for u in usernames):
+        bundle, fresh = read_cached_bundle(username)
+        if bundle is not None and not missing_sections(bundle, sections):
+            if not fresh:
+                schedule_refresh(username)
+            results[username] = bundle
+        else:
+            missing.append(username)
+            if bundle is not None:
+                known.add(username)
+
+    for i in range(0, len(missing), BATCH_SIZE):
+        batch = missing[i:i + BATCH_SIZE]
+        fetched = fetch_user_bundles(batch, sections, priority=known.issuperset(batch))
+        for username, bundle in fetched.items():
+            if bundle and 'error' not in bundle:
+                bundle = store_bundle(username, bundle)
+            results[username] = bundle
+    return results
+
+def bundle_sections(bundle):
+    # Bundles cached before sections existed were always fetched whole
+    return bundle.get('sections', SECTIONS)
+
+def missing_sections(bundle, sections):
+    present = bundle_sections(bundle)
+    return tuple(section for section in SECTIONS if section in sections and section not in present)
+
+def sections_to_fetch(bundle, fresh, sections):
+    """
+    What a miss for sections fetches: everything when nothing is cached, the
+    missing sections of a fresh bundle, and for a stale one (which the fetch
+    replaces) the sections it had plus the requested ones.
+    """
+    if bundle is None:
+        return SECTIONS
+    if fresh:
+        return missing_sections(bundle, sections)
+    present = bundle_sections(bundle)
+    return tuple(section for section in SECTIONS if section in sections or section in present)
+
+def count_refresh(name):
+    with _refresh_stats_lock:
+        refresh_stats[name] += 1
+
+def read_cached_bundle(username):
+    """
+    Returns (bundle, is_fresh); (None, False) when nothing usable is cached.
+    """
+    entry = payload_cache.get(f"user:{username.lower()}")
+    if entry is None:
+        metrics.bundle_cache.inc(result="miss")
+        return None, False
+    fresh = time.time() - entry['fetched_at'] < PAYLOAD_FRESH_TTL
+    if not fresh:
+        count_refresh('stale_served')
+    metrics.bundle_cache.inc(result="fresh" if fresh else "stale")
+    return entry['bundle'], fresh
+
+def store_bundle(username, bundle):
+    """
+    Caches a bundle stamped with a content digest and the time that content
+    last changed, which the card routes use as ETag and Last-Modified.
+    Sections of a still fresh cached bundle that this one lacks are kept.
+    Returns the bundle as cached.
+    """
+    key = f"user:{username.lower()}"
+    with _store_locks[hash(key) % len(_store_locks)]:
+        for _ in range(3):
+            bundle = _store_bundle(key, bundle)
+            # Another worker sharing the cache may have written between our read and write
+            current = payload_cache.get(key)
+            if current is None or current['bundle'].get('digest') == bundle['digest']:
+                break
+            if not missing_sections(current['bundle'], bundle_sections(bundle)):
+                return current['bundle']
+        return bundle
+
+def _store_bundle(key, bundle):
+    now = time.time()
+    fetched_at = now
+    previous = payload_cache.get(key)
+    if previous is not None:
+        old = previous['bundle']
+        kept = [section for section in bundle_sections(old) if section not in bundle_sections(bundle)]
+        if kept and now - previous['fetched_at'] < PAYLOAD_FRESH_TTL:
+            bundle = merge_bundles(old, bundle)
+            # The kept sections are only as fresh as the entry they came from
+            fetched_at = previous['fetched_at']
+    bundle['digest'] = bundle_digest(bundle)
+    bundle['modified_at'] = now
+    if previous is not None and previous['bundle'].get('digest') == bundle['digest']:
+        # A refresh that changed nothing keeps the old Last-Modified
+        bundle['modified_at'] = previous['bundle'].get('modified_at', now)
+    payload_cache.set(key, {"fetched_at": fetched_at, "bundle": bundle}, ttl=PAYLOAD_FRESH_TTL + PAYLOAD_STALE_TTL)
+    return bundle
+
+def merge_bundles(old, new):
+    merged = {k: v for k, v in old.items() if k not in ('digest', 'modified_at')}
+    merged.update(new)
+    merged['stats'] = dict(old['stats'], **new['stats'])
+    present = set(bundle_sections(old)) | set(bundle_sections(new))
+    merged['sections'] = [section for section in SECTIONS if section in present]
+    return merged
+
+def bundle_digest(bundle):
+    data = {k: v for k, v in bundle.items() if k not in ('digest', 'modified_at')}
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+def _fetch_and_store(username, sections=SECTIONS, priority=False):
+    bundle = fetch_user_bundles([username], sections, priority).get(username.lower())
+    if bundle and 'error' not in bundle:
+        bundle = store_bundle(username, bundle)
+    return bundle
+
+def schedule_refresh(username):
     """
-    
+    Queues a background refresh unless one is already pending for this user.
+    """
+    key = username.lower()
+    with _refresh_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    refresh_pool.submit(_refresh, key)
+
+def _refresh(username):
     try:
-        response = requests.post(
-            GITHUB_GRAPHQL_URL, 
-            json={'query': query, 'variables': {'username': username}}, 
-            headers=headers,
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            print(f"GraphQL request failed: {response.status_code}")
-            return {"error": f"GitHub API Status: {response.status_code}"}
-            
-        data = response.json()
-        if 'errors' in data:
-            print(f"GraphQL errors: {data['errors']}")
-            return {"error": f"GraphQL Error: {data['errors'][0]['message']}"}
-            
-        user = data.get('data', {}).get('user')
-        if not user:
-            return {"error": "User not found in data"}
+        count_refresh('refreshes')
+        # Refetch the sections the stale bundle had, so every card it served stays covered
+        cached, _ = read_cached_bundle(username)
+        sections = bundle_sections(cached) if cached is not None else SECTIONS
+        # Shares the in-flight fetch with any foreground miss for the same user
+        bundle = inflight.do(f"user:{username}", lambda: _fetch_and_store(username, sections, priority=True), timeout=INFLIGHT_TIMEOUT)
+        if not bundle or 'error' in bundle:
+            # Keep serving the stale bundle (serve-stale-on-error)
+            count_refresh('refresh_failures')
+            print(f"Background refresh failed for {username}: {bundle['error'] if bundle else 'no data'}")
+    except Exception as e:
+        count_refresh('refresh_failures')
+        print(f"Background refresh failed for {username}: {e}")
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(username)
 
-        # Process repos for stats
-        repos = user['repositories']['nodes']
-        total_stars = sum(repo['stargazers']['totalCount'] for repo in repos)
-        total_forks = sum(repo['forks']['totalCount'] for repo in repos)
-        
-        languages = {}
-        for repo in repos:
-            if repo['primaryLanguage']:
-                lang = repo['primaryLanguage']['name']
-                languages[lang] = languages.get(lang, 0) + 1
-                
-        sorted_languages = dict(sorted(languages.items(), key=lambda item: item[1], reverse=True))
-
-        total_commits = user['contributionsCollection']['totalCommitContributions']
-        if not include_private:
-             # If private commits should be hidden, subtract restricted (private) contributions
-             # Note: totalCommitContributions INCLUDES restricted/private commits if the token has access.
-             restricted = user['contributionsCollection']['restrictedContributionsCount']
-             total_commits = max(0, total_commits - restricted)
-
-        stats = {
-            "username": user['login'],
-            "name": user['name'],
-            "followers": user['followers']['totalCount'],
-            "following": user['following']['totalCount'],
-            "public_repos": user['repositories']['totalCount'], 
-            "total_stars": total_stars,
-            "total_forks": total_forks,
-            "total_commits": total_commits,
-            "total_issues": user['issues']['totalCount'],
-            "total_prs": user['pullRequests']['totalCount'],
-            "created_at": user['createdAt'],
-            "total_orgs": user['organizations']['totalCount']
-        }
-        
-        return {
-            "stats": stats,
-            "languages": sorted_languages
-        }
+def fetch_user_bundles(usernames, sections=SECTIONS, priority=False):
+    """
+    Fetches several users in one POST by aliasing user(login:) blocks, then
+    pages through the repositories of anyone with more than one page.
+    Only the fields of the given sections are queried.
+    Users that recently failed are answered from the negative cache; the
+    rest pass admission control first (see admission.admit), where priority
+    is for users already cached.
+    Returns {lowercased username: bundle or error dict}; None for every user when no token is configured.
+    """
+    results = negative_cache.lookup(usernames)
+    usernames = [username for username in usernames if username.lower() not in results]
+    if not usernames:
+        return results
+    try:
+        slot = admission.admit(usernames, priority)
+    except admission.Shed as e:
+        # Not logged, a flood would drown the log; admission.stats() counts them
+        error = admission.shed_bundle(e)
+        results.update((username.lower(), error) for username in usernames)
+        return results
+    with slot:
+        fetched = _fetch_user_bundles(usernames, sections)
+    negative_cache.remember_all(fetched)
+    results.update(fetched)
+    return results
+
+def _fetch_user_bundles(usernames, sections):
+    try:
+        headers = get_headers()
+    except TokensExhausted as e:
+        print(f"Shedding fetch of {', '.join(usernames)}: {e}")
+        error = {"error": "GitHub rate limit reached, try again later"}
+        return {username.lower(): error for username in usernames}
+    if not headers:
+        return {username.lower(): None for username in usernames}
+
+    query, variables, aliases = build_bundle_query(usernames, sections)
+    try:
+        response = http_client.post(
+            GITHUB_GRAPHQL_URL,
+            json={'query': query, 'variables': variables},
+            headers=headers
+        )
+        with metrics.stage("json_parse"):
+            data = response.json() if response.status_code == 200 else None
+        record_query_cost(sections_label(sections), data)
+        users = parse_bundle_response(response.status_code, data, aliases)
     except Exception as e:
         print(f"Error fetching user data: {e}")
-        return {"error": f"Exception: {str(e)}"}
-
-def get_contribution_years(username):
-    """
-    Fetches contribution years using GraphQL (cheaper than iterating events).
-    """
-    query = """
-    query($username: String!) {
-      user(login: $username) {
-        contributionsCollection {
-          contributionCalendar {
-            totalContributions
-            weeks {
-              contributionDays {
-                contributionCount
-                date
-              }
-            }
-          }
-        }
-      }
+        error = {"error": f"Exception: {str(e)}", "kind": "transient"}
+        return {username.lower(): error for username in usernames}
+
+    page_query = repo_page_query(sections)
+
+    def complete(item):
+        username, user = item
+        if 'error' in user:
+            return username, user
+        totals = None
+        if 'repositories' in user:
+            totals = RepoTotals()
+            try:
+                for nodes in iter_repository_pages(user['login'], user['repositories'], headers, query=page_query):
+                    totals.add_page(nodes)
+            except RepositoryPageError as e:
+                # Totals over some of the pages would be cached as the full bundle
+                return username, {"error": str(e), "kind": "transient"}
+        with metrics.stage("normalize"):
+            return username, normalize_user(user, totals, sections)
+
+    paginating = sum(1 for user in users.values() if has_more_repositories(user))
+    if paginating > 1 and REPO_PAGE_CONCURRENCY > 1:
+        with ThreadPoolExecutor(max_workers=min(REPO_PAGE_CONCURRENCY, paginating)) as pool:
+            return dict(pool.map(complete, users.items()))
+    return dict(complete(item) for item in users.items())
+
+def has_more_repositories(user):
+    if 'error' in user or 'repositories' not in user:
+        return False
+    return bool((user['repositories'].get('pageInfo') or {}).get('hasNextPage'))
+
+class RepositoryPageError(Exception):
+    """
+    A page of repositories could not be fetched, so the pages before it are
+    not the whole list.
+    """
+
+def iter_repository_pages(login, first_page, headers, query=REPO_PAGE_QUERY, label="repo_page"):
+    """
+    Yields each page of repository nodes, starting with the one embedded in
+    the bundle query (or, with first_page=None, from the start using query).
+    Pages are fetched lazily so callers can fold them as they arrive; stops
+    after REPO_MAX_PAGES and raises RepositoryPageError on a failed page.
+    Fetched pages are counted in query_costs under label.
+    """
+    connection = first_page
+    cursor = None
+    pages = 0
+    while True:
+        if connection is None:
+            try:
+                response = http_client.post(
+                    GITHUB_GRAPHQL_URL,
+                    json={'query': query, 'variables': {'login': login, 'cursor': cursor, 'pageSize': REPO_PAGE_SIZE}},
+                    headers=headers
+                )
+                data = response.json() if response.status_code == 200 else None
+                record_query_cost(label, data)
+                connection = parse_repository_page(response.status_code, data)
+            except Exception as e:
+                print(f"Error fetching repositories page for {login}: {e}")
+                raise RepositoryPageError(f"Repositories page {pages + 1} failed") from e
+            if connection is None:
+                raise RepositoryPageError(f"Repositories page {pages + 1} failed")
+
+        yield connection['nodes']
+        pages += 1
+        page_info = connection.get('pageInfo') or {}
+        if not page_info.get('hasNextPage'):
+            return
+        if pages >= REPO_MAX_PAGES:
+            print(f"Repository pagination for {login} stopped at {pages} pages (REPO_MAX_PAGES)")
+            return
+        cursor = page_info['endCursor']
+        connection = None
+
+def parse_repository_page(status_code, data):
+    """
+    Returns the repositories connection of a repository page response, or None on error.
+    """
+    if status_code != 200:
+        print(f"Repositories page request failed: {status_code}")
+        return None
+    if data.get('errors'):
+        print(f"GraphQL errors: {data['errors']}")
+        return None
+    user = (data.get('data') or {}).get('user')
+    return user['repositories'] if user else None
+
+class RepoTotals:
+    """
+    Running star/fork/language totals, folded one page at a time so memory
+    doesn't grow with the number of repositories.
+    """
+    __slots__ = ("stars", "forks", "languages", "pages")
+
+    def __init__(self):
+        self.stars = 0
+        self.forks = 0
+        self.languages = {}
+        self.pages = 0
+
+    def add_page(self, nodes):
+        for repo in nodes:
+            # Trimmed queries leave out the fields of sections they don't need
+            if 'stargazers' in repo:
+                self.stars += repo['stargazers']['totalCount']
+                self.forks += repo['forks']['totalCount']
+            if repo.get('primaryLanguage'):
+                lang = repo['primaryLanguage']['name']
+                self.languages[lang] = self.languages.get(lang, 0) + 1
+        self.pages += 1
+
+    def sorted_languages(self):
+        return dict(sorted(self.languages.items(), key=lambda item: item[1], reverse=True))
+
+def build_bundle_query(usernames, sections=SECTIONS):
+    """
+    Returns (query, variables, aliases) with one aliased user(login:) block per
+    username, asking only for the fields of the given sections.
+    """
+    aliases = {f"u{i}": username for i, username in enumerate(usernames)}
+    variables = dict(aliases)
+    params = [f"${alias}: String!" for alias in aliases]
+    if repo_node_fields(sections):
+        # GraphQL rejects declared but unused variables
+        params.append("$repoPageSize: Int!")
+        variables['repoPageSize'] = REPO_PAGE_SIZE
+    blocks = "\n".join(f"  {alias}: user(login: ${alias}) {{ ...UserFields }}" for alias in aliases)
+    query = f"query({', '.join(params)}) {{\n{blocks}\n  {RATE_LIMIT_FIELDS}\n}}\n{user_fields(sections)}"
+    return query, variables, aliases
+
+def parse_bundle_response(status_code, data, aliases):
+    """
+    Maps a (possibly partial) GraphQL response back to per-user nodes.
+    Returns {lowercased username: raw user node or error dict}.
+    Error dicts carry a "kind" when the negative cache may keep them:
+    "not_found" for unknown logins, "transient" for GitHub-side failures.
+    Shared by the sync and async clients.
+    """
+    if status_code != 200:
+        print(f"GraphQL request failed: {status_code}")
+        error = {"error": f"GitHub API Status: {status_code}"}
+        if status_code >= 500:
+            error['kind'] = "transient"
+        return {username.lower(): error for username in aliases.values()}
+
+    # Errors are reported per alias (e.g. one unknown login); the other users still resolve
+    alias_errors = {}
+    for err in data.get('errors') or []:
+        path = err.get('path') or [None]
+        alias_errors.setdefault(path[0], err)
+    if alias_errors:
+        print(f"GraphQL errors: {data['errors']}")
+
+    results = {}
+    for alias, username in aliases.items():
+        user = (data.get('data') or {}).get(alias)
+        err = alias_errors.get(alias) or alias_errors.get(None)
+        if err and not user:
+            kind = "not_found" if err.get('type') == "NOT_FOUND" else "transient"
+            results[username.lower()] = {"error": f"GraphQL Error: {err['message']}", "kind": kind}
+        elif not user:
+            results[username.lower()] = {"error": "User not found in data", "kind": "not_found"}
+        else:
+            results[username.lower()] = user
+    return results
+
+def normalize_user(user, totals=None, sections=SECTIONS):
+    """
+    Reduces a GraphQL user node to the cached bundle. Commit totals are kept
+    raw so both include_private variants can be derived from one fetch.
+    totals carries the folded repository pages; without it only the embedded first page counts.
+    Only the parts for the given sections are filled in; bundle['sections'] records which.
+    """
+    stats = {
+        "username": user['login'],
+        "name": user['name'],
+        "followers": user['followers']['totalCount'],
+        "created_at": user['createdAt']
+    }
+    bundle = {"stats": stats, "sections": [section for section in SECTIONS if section in sections]}
+
+    if 'repositories' in user:
+        # Process repos for stats
+        if totals is None:
+            totals = RepoTotals()
+            totals.add_page(user['repositories']['nodes'])
+        stats['public_repos'] = user['repositories']['totalCount']
+        if "repo_stats" in sections:
+            stats['total_stars'] = totals.stars
+            stats['total_forks'] = totals.forks
+        if "repo_languages" in sections:
+            bundle['languages'] = totals.sorted_languages()
+
+    contributions = user.get('contributionsCollection') or {}
+    if "commits" in sections:
+        stats['total_commits'] = contributions['totalCommitContributions']
+        bundle['restricted_contributions'] = contributions['restrictedContributionsCount']
+    if "calendar" in sections:
+        bundle['calendar'] = ContributionCalendar.from_days(
+            day for week in contributions['contributionCalendar']['weeks'] for day in week['contributionDays']
+        ).to_dict()
+
+    if "activity" in sections:
+        stats['following'] = user['following']['totalCount']
+        stats['total_issues'] = user['issues']['totalCount']
+        stats['total_prs'] = user['pullRequests']['totalCount']
+        stats['total_orgs'] = user['organizations']['totalCount']
+
+    return bundle
+
+def user_data_from_bundle(bundle, include_private):
+    """
+    Builds the get_user_data payload from a cached bundle.
+    """
+    stats = dict(bundle['stats'])
+    if not include_private and 'total_commits' in stats:
+        # If private commits should be hidden, subtract restricted (private) contributions
+        # Note: totalCommitContributions INCLUDES restricted/private commits if the token has access.
+        stats['total_commits'] = max(0, stats['total_commits'] - bundle['restricted_contributions'])
+    return {
+        "stats": stats,
+        "languages": bundle.get('languages', {})
     }
+
+def bundle_calendar(bundle):
     """
-    headers = get_headers()
-    response = requests.post(
-        GITHUB_GRAPHQL_URL, 
-        json={'query': query, 'variables': {'username': username}}, 
-        headers=headers
-    )
-    
-    
-    if response.status_code == 200:
-        data = response.json()
-        return calculate_streak_stats(data)
-    return None
+    The bundle's ContributionCalendar; bundles cached before the compact
+    format still carry a contribution_days list.
+    """
+    return load_calendar(bundle['calendar'] if 'calendar' in bundle else bundle.get('contribution_days'))
 
-def calculate_streak_stats(data):
+def calculate_streak_stats(days, mode="daily"):
     """
-    Parses GraphQL response to calculate streak stats.
+    Calculates streak stats from a ContributionCalendar (or anything load_calendar accepts).
     """
     try:
-        weeks = data['data']['user']['contributionsCollection']['contributionCalendar']['weeks']
-        days = []
-        for week in weeks:
-            days.extend(week['contributionDays'])
-            
-        # Sort by date just in case
-        days.sort(key=lambda x: x['date'])
-        
-        total_contributions = sum(d['contributionCount'] for d in days)
-        
-        current_streak = 0
-        longest_streak = 0
-        temp_streak = 0
-        
-        # Simple streak mech: iterate and count consecutive days > 0
-        # This is a simplification; authentic streak calc needs to check "yesterday" relative to today.
-        # For this demo, we'll scan the whole year or just rely on the data present.
-        
-        today = datetime.date.today().isoformat()
-        
-        for day in days:
-            if day['contributionCount'] > 0:
-                temp_streak += 1
-            else:
-                if temp_streak > longest_streak:
-                    longest_streak = temp_streak
-                temp_streak = 0
-        
-        # Check if last day (today/yesterday) has contrib for current streak
-        # This is a rough approx
-        if temp_streak > longest_streak:
-            longest_streak = temp_streak
-            
-        current_streak = temp_streak if days and days[-1]['contributionCount'] > 0 else 0
-
-        # Start/End dates (mocked for visual layout matching the image)
-        start_date = days[0]['date'] if days else "Jan 1"
-        end_date = days[-1]['date'] if days else "Dec 31"
-
-        return {
-            "total_contributions": total_contributions,
-            "current_streak": current_streak,
-            "longest_streak": longest_streak,
-            "start_date": start_date,
-            "end_date": end_date,
-            "mode": "daily" # vs weekly
-        }
+        return streak_stats(load_calendar(days), mode=mode)
     except Exception as e:
         print(f"Error calculating streak: {e}")
         return {
@@ -228,3 +632,34 @@ def calculate_streak_stats(data):
             "start_date": "",
             "end_date": ""
         }
+
+def collect_metrics():
+    """
+    Payload cache, refresh and GraphQL point spend for /metrics.
+    """
+    cache = payload_cache.stats()
+    flights = inflight.stats()
+    with _costs_lock:
+        costs = {label: dict(entry) for label, entry in query_costs.items()}
+    return [
+        ("payload_cache_hits_total", "counter", "Payload cache hits", [({}, cache.get('hits'))]),
+        ("payload_cache_misses_total", "counter", "Payload cache misses", [({}, cache.get('misses'))]),
+        ("payload_cache_entries", "gauge", "Entries in the payload cache", [({}, cache.get('entries'))]),
+        ("payload_cache_bytes", "gauge", "Approximate size of the payload cache", [({}, cache.get('bytes'))]),
+        ("bundle_refreshes_total", "counter", "Background bundle refreshes", [
+            ({"result": "ok"}, refresh_stats['refreshes'] - refresh_stats['refresh_failures']),
+            ({"result": "failed"}, refresh_stats['refresh_failures'])
+        ]),
+        ("inflight_calls_total", "counter", "Fetches that led or joined a shared in-flight call", [
+            ({"role": "leader"}, flights['leaders']),
+            ({"role": "shared"}, flights['shared'])
+        ]),
+        ("github_queries_total", "counter", "GraphQL queries by kind", [
+            ({"query": label}, entry['requests']) for label, entry in costs.items()
+        ]),
+        ("github_query_cost_points_total", "counter", "GraphQL rate limit points spent by query kind", [
+            ({"query": label}, entry['cost']) for label, entry in costs.items()
+        ])
+    ]
+
+metrics.register_collector(collect_metrics)
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services import metrics, token_pool
+
+DEFAULT_TIMEOUT = float(os.environ.get("GITHUB_TIMEOUT", 10))
+POOL_SIZE = int(os.environ.get("GITHUB_POOL_SIZE", 20))
+MAX_RETRIES = int(os.environ.get("GITHUB_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.environ.get("GITHUB_RETRY_BACKOFF", 0.5))
+# Don't sleep a worker for minutes because GitHub asked us to
+MAX_RETRY_AFTER = float(os.environ.get("GITHUB_MAX_RETRY_AFTER", 10))
+# Total seconds one call may sleep between its retries. Keep it well under
+# INFLIGHT_TIMEOUT, or the requests coalesced onto the call give up first.
+MAX_RETRY_SLEEP = float(os.environ.get("GITHUB_MAX_RETRY_SLEEP", 5))
+
+
+class GitHubRetry(Retry):
+    """
+    Retries 5xx and 429 with exponential backoff, plus 403s that carry a
+    Retry-After header (GitHub's secondary rate limit). Plain 403s such as
+    bad scopes are returned immediately. Sleeps add up to MAX_RETRY_SLEEP at
+    most; once it is spent the last response is returned.
+    """
+
+    # Retry's default check retries these only when Retry-After is present
+    RETRY_AFTER_STATUS_CODES = frozenset([403, 413, 429, 503])
+    # Seconds slept so far, carried from each Retry to the next by new()
+    slept = 0.0
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.slept = self.slept
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if self.slept >= MAX_RETRY_SLEEP:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+    def sleep(self, response=None):
+        delay = None
+        if self.respect_retry_after_header and response:
+            delay = self.get_retry_after(response)
+        if delay is None:
+            delay = self.get_backoff_time()
+        delay = min(delay, MAX_RETRY_SLEEP - self.slept)
+        if delay > 0:
+            self.slept += delay
+            time.sleep(delay)
+
+
+def _build_adapter():
+    retry = GitHubRetry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=[429, 500, 502, 503, 504],
+        # GraphQL reads go over POST and are safe to repeat
+        allowed_methods=None,
+        raise_on_status=False,
+        respect_retry_after_header=True
+    )
+    # pool_block caps open connections per host at POOL_SIZE instead of
+    # opening throwaway connections under bursts
+    return HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry, pool_block=True)
+
+
+class TimeoutSession(requests.Session):
+    """
+    Session that always applies a timeout unless the caller passes one.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+# One adapter (and so one keep-alive pool) for the whole process; sessions are
+# per thread because requests.Session itself isn't guaranteed thread-safe.
+_adapter = _build_adapter()
+_local = threading.local()
+
+
+def get_session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = TimeoutSession()
+        session.mount("https://", _adapter)
+        session.mount("http://", _adapter)
+        # Keeps the token pool's view of each token's rate limit current
+        session.hooks["response"].append(token_pool.record_response)
+        _local.session = session
+    return session
+
+
+def post(url, **kwargs):
+    with metrics.stage("github_fetch"):
+        response = get_session().post(url, **kwargs)
+    metrics.github_responses.inc(status=response.status_code)
+    return response
+
+
+def get(url, **kwargs):
+    with metrics.stage("github_fetch"):
+        response = get_session().get(url, **kwargs)
+    metrics.github_responses.inc(status=response.status_code)
+    return response
@@ -0,0 +1,191 @@
+import os
+import time
+
+from services import admission, http_client, github_service
+from services.github_service import get_headers, iter_repository_pages, RepositoryPageError, payload_cache, inflight, PAYLOAD_FRESH_TTL
+from services.singleflight import SingleFlightTimeout
+from services.token_pool import TokensExhausted
+
+# Byte-weighted language stats. Each repository's language sizes are cached
+# against its pushedAt, so a refresh only re-fetches repositories that changed.
+# Totals missing repositories whose languages (or page of the repository list)
+# could not be fetched are marked partial and only kept for LANGUAGE_PARTIAL_TTL seconds.
+
+LANGUAGES_PER_REPO = int(os.environ.get("LANGUAGES_PER_REPO", 10))
+# Repositories per aliased repository(owner:, name:) query
+LANGUAGE_BATCH_SIZE = int(os.environ.get("LANGUAGE_BATCH_SIZE", 50))
+# Per-repository entries are keyed on pushedAt; the TTL only clears out deleted and renamed repositories
+REPO_LANGUAGES_TTL = int(os.environ.get("REPO_LANGUAGES_TTL", 30 * 86400))
+LANGUAGE_PARTIAL_TTL = int(os.environ.get("LANGUAGE_PARTIAL_TTL", 300))
+
+REPO_LIST_QUERY = """
+query($login: String!, $cursor: String, $pageSize: Int!) {
+  user(login: $login) {
+    repositories(first: $pageSize, after: $cursor, ownerAffiliations: [OWNER], orderBy: {field: STARGAZERS, direction: DESC}) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {
+        name
+        pushedAt
+      }
+    }
+  }
+  rateLimit { cost remaining }
+}
+"""
+
+stats = {"repos_cached": 0, "repos_fetched": 0}
+
+
+def get_language_bytes(username):
+    """
+    Returns {"languages": {name: bytes} sorted by size, "colors": {name: color}}
+    aggregated over every repository the user owns, or None if nothing could be fetched.
+    "partial": True is set when some repositories' languages could not be fetched.
+    """
+    key = f"language_bytes:{username.lower()}"
+    cached = payload_cache.get(key)
+    if cached is not None and time.time() - cached['fetched_at'] < PAYLOAD_FRESH_TTL:
+        return cached['result']
+
+    def fetch():
+        result = fetch_language_bytes(username)
+        if result is not None:
+            payload_cache.set(key, {"fetched_at": time.time(), "result": result},
+                              ttl=LANGUAGE_PARTIAL_TTL if result.get('partial') else None)
+        return result
+
+    try:
+        result = inflight.do(key, fetch, timeout=github_service.INFLIGHT_TIMEOUT)
+    except SingleFlightTimeout:
+        result = None
+    # Fall back to the previous totals if the refresh failed
+    if result is None and cached is not None:
+        return cached['result']
+    return result
+
+
+def fetch_language_bytes(username):
+    # Only reached for users whose bundle was fetched, so on the priority lane
+    try:
+        with admission.admit([username], priority=True):
+            return _fetch_language_bytes(username)
+    except admission.Shed as e:
+        print(f"Skipping language bytes for {username}: {e}")
+        return None
+
+
+def _fetch_language_bytes(username):
+    try:
+        headers = get_headers()
+    except TokensExhausted as e:
+        print(f"Skipping language bytes for {username}: {e}")
+        return None
+    if not headers:
+        return None
+
+    sizes = {}
+    colors = {}
+    pages = 0
+    missing = 0
+    listed = True
+    try:
+        for nodes in iter_repository_pages(username, None, headers, query=REPO_LIST_QUERY, label="repo_list"):
+            pages += 1
+            results, failed = _page_languages(username, nodes, headers)
+            missing += failed
+            for languages in results:
+                for name, size, color in languages:
+                    sizes[name] = sizes.get(name, 0) + size
+                    if color:
+                        colors[name] = color
+    except RepositoryPageError:
+        listed = False
+    if not pages:
+        return None
+
+    result = {
+        "languages": dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True)),
+        "colors": colors
+    }
+    if missing or not listed:
+        print(f"Language bytes for {username} are missing {missing} repositories" +
+              ("" if listed else f" and every page after page {pages}"))
+        result['partial'] = True
+    return result
+
+
+def _repo_key(username, repo_name):
+    return f"repo_languages:{username.lower()}/{repo_name}"
+
+
+def _page_languages(username, nodes, headers):
+    """
+    Language lists for one page of repositories: cached ones whose pushedAt
+    is unchanged, plus one aliased query for the rest.
+    Returns (language lists, number of repositories that could not be fetched).
+    """
+    results = []
+    stale = []
+    failed = 0
+    for repo in nodes:
+        entry = payload_cache.get(_repo_key(username, repo['name']))
+        if entry is not None and entry['pushed_at'] == repo['pushedAt']:
+            stats['repos_cached'] += 1
+            results.append(entry['languages'])
+        else:
+            stale.append(repo)
+
+    for i in range(0, len(stale), LANGUAGE_BATCH_SIZE):
+        batch = stale[i:i + LANGUAGE_BATCH_SIZE]
+        fetched = fetch_repo_languages(username, [repo['name'] for repo in batch], headers)
+        for repo in batch:
+            languages = fetched.get(repo['name'])
+            if languages is None:
+                failed += 1
+                continue
+            stats['repos_fetched'] += 1
+            payload_cache.set(_repo_key(username, repo['name']), {"pushed_at": repo['pushedAt'], "languages": languages},
+                              ttl=REPO_LANGUAGES_TTL)
+            results.append(languages)
+    return results, failed
+
+
+def fetch_repo_languages(owner, repo_names, headers):
+    """
+    Returns {repo name: [[language, bytes, color], ...]} for the repositories
+    that resolved; failed ones are left out and retried on the next refresh.
+    """
+    aliases = {f"r{i}": name for i, name in enumerate(repo_names)}
+    params = ", ".join(f"${alias}: String!" for alias in aliases)
+    blocks = "\n".join(
+        f"  {alias}: repository(owner: $owner, name: ${alias}) {{ languages(first: $n, orderBy: {{field: SIZE, direction: DESC}}) {{ edges {{ size node {{ name color }} }} }} }}"
+        for alias in aliases
+    )
+    query = f"query($owner: String!, $n: Int!, {params}) {{\n{blocks}\n  rateLimit {{ cost remaining }}\n}}"
+    variables = dict(aliases, owner=owner, n=LANGUAGES_PER_REPO)
+
+    try:
+        response = http_client.post(github_service.GITHUB_GRAPHQL_URL, json={'query': query, 'variables': variables}, headers=headers)
+        if response.status_code != 200:
+            print(f"Repository languages request failed: {response.status_code}")
+            return {}
+        data = response.json()
+        github_service.record_query_cost("repo_language_batch", data)
+    except Exception as e:
+        print(f"Error fetching repository languages for {owner}: {e}")
+        return {}
+
+    if data.get('errors'):
+        print(f"GraphQL errors: {data['errors']}")
+    results = {}
+    for alias, name in aliases.items():
+        repo = (data.get('data') or {}).get(alias)
+        if repo:
+            results[name] = [
+                [edge['node']['name'], edge['size'], edge['node']['color']]
+                for edge in repo['languages']['edges']
+            ]
+    return results
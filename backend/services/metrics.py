@@ -0,0 +1,237 @@
+import contextvars
+import os
+import random
+import threading
+import time
+
+from services.themes import THEMES
+
+# Prometheus text-format metrics, kept in-process without the
+# prometheus_client dependency. Each gunicorn worker exposes its own numbers,
+# like the memory cache. Counters are cheap and always kept; stage timings are
+# sampled with METRICS_SAMPLE_RATE, and at 0 a timer is a shared no-op object.
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", 1.0)) if METRICS_ENABLED else 0.0
+
+PREFIX = "readme_stats_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (route, theme) of the request being served, so stage timings can be broken down by them
+_request_labels = contextvars.ContextVar("metrics_request", default=("", ""))
+
+_metrics = []
+_collectors = []
+
+
+def _label_key(names, labels):
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = PREFIX + name + "_total"
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_TIMER = _NoTimer()
+
+
+def sampled():
+    return SAMPLE_RATE >= 1.0 or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def time(self, **labels):
+        """
+        Context manager observing the block's duration, or a no-op when this one isn't sampled.
+        """
+        if not sampled():
+            return NO_TIMER
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(entry)) for key, entry in self.values.items()]
+        for key, entry in items:
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, entry):
+                yield self.name + "_bucket", labels + [("le", _format_value(float(bound)))], count
+            yield self.name + "_bucket", labels + [("le", "+Inf")], entry[-1]
+            yield self.name + "_sum", labels, round(entry[-2], 6)
+            yield self.name + "_count", labels, entry[-1]
+
+
+def counter(name, help, labelnames=()):
+    metric = Counter(name, help, labelnames)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collect):
+    """
+    Adds a function called on every scrape. It returns (name, type, help,
+    [(labels dict, value)]) tuples for values other modules already keep,
+    such as cache stats. Counter names should end in _total.
+    """
+    _collectors.append(collect)
+
+
+request_seconds = histogram("request_seconds", "Time to serve a request", ("route", "theme"))
+stage_seconds = histogram("stage_seconds", "Time spent per request stage", ("stage", "route", "theme"))
+card_cache = counter("card_cache", "Rendered card cache lookups", ("card", "result"))
+bundle_cache = counter("bundle_cache", "User bundle cache lookups", ("result",))
+github_responses = counter("github_responses", "GitHub API responses by HTTP status", ("status",))
+
+
+class RequestTimer:
+    """
+    Labels the stage timings of the request being served and observes its
+    total time in request_seconds. Call finish() once the response is sent.
+    """
+    __slots__ = ("route", "theme", "token", "start")
+
+    def __init__(self, route, theme=""):
+        self.route = route
+        self.theme = theme_label(theme) if theme else ""
+        self.token = _request_labels.set((self.route, self.theme))
+        self.start = time.perf_counter() if sampled() else None
+
+    def finish(self):
+        if self.start is not None:
+            request_seconds.observe(time.perf_counter() - self.start, route=self.route, theme=self.theme)
+        _request_labels.reset(self.token)
+
+
+def stage(name):
+    """
+    Times one stage (github_fetch, json_parse, normalize, render) of the current request.
+    """
+    if not sampled():
+        return NO_TIMER
+    route, theme = _request_labels.get()
+    return _Timer(stage_seconds, {"stage": name, "route": route, "theme": theme})
+
+
+def theme_label(theme):
+    # Unknown ?theme= values would otherwise create a series each
+    return theme if theme in THEMES else "other"
+
+
+def render():
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for collect in _collectors:
+        try:
+            families = list(collect())
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            name = PREFIX + name
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
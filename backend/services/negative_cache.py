@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+
+from services import metrics
+from services.cache import TTLCache
+
+# Failed user fetches, remembered briefly so repeated requests for a mistyped
+# or deleted username (or a user GitHub is failing on) don't each cost a
+# GraphQL call. Errors are classified when the response is parsed: "not_found"
+# is kept for NEGATIVE_NOT_FOUND_TTL, "transient" (5xx, timeouts, other
+# GraphQL errors) for NEGATIVE_ERROR_TTL. Errors on our side (no token, rate
+# limit, shed by admission control) carry no kind and are never cached.
+#
+# The entries are a bounded LRU. Once it is full, a new name only gets in if a
+# rotating bloom filter has seen it fail before, so a scan of random names
+# only sets bits in a fixed-size filter instead of flushing the names that
+# really are requested over and over. A false positive in the filter just lets
+# a name in on its first failure.
+
+NOT_FOUND_TTL = int(os.environ.get("NEGATIVE_NOT_FOUND_TTL", 900))
+ERROR_TTL = int(os.environ.get("NEGATIVE_ERROR_TTL", 30))
+CACHE_SIZE = int(os.environ.get("NEGATIVE_CACHE_SIZE", 10000))
+# Bits per bloom filter generation (two are kept); 2**20 bits is 128 KB
+BLOOM_BITS = int(os.environ.get("NEGATIVE_BLOOM_BITS", 1 << 20))
+BLOOM_HASHES = 4
+
+TTLS = {"not_found": NOT_FOUND_TTL, "transient": ERROR_TTL}
+
+counts = {"hits": 0, "stored": 0, "filtered": 0}
+
+
+class RotatingBloomFilter:
+    """
+    Set membership with false positives and no deletes, forgotten after one
+    to two windows: new keys go into the current generation, lookups check
+    both, and every window the older one is dropped.
+    """
+
+    def __init__(self, bits, hashes, window):
+        self.bits = bits
+        self.hashes = hashes
+        self.window = window
+        self.current = bytearray(bits // 8 + 1)
+        self.previous = bytearray(bits // 8 + 1)
+        self.rotated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        # Double hashing: k indexes from two 64-bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _rotate(self):
+        if time.monotonic() - self.rotated_at >= self.window:
+            self.previous = self.current
+            self.current = bytearray(len(self.previous))
+            self.rotated_at = time.monotonic()
+
+    def add(self, key):
+        indexes = self._indexes(key)
+        with self.lock:
+            self._rotate()
+            for i in indexes:
+                self.current[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, key):
+        indexes = self._indexes(key)
+        with self.lock:
+            self._rotate()
+            return (all(self.current[i >> 3] & (1 << (i & 7)) for i in indexes) or
+                    all(self.previous[i >> 3] & (1 << (i & 7)) for i in indexes))
+
+
+entries = TTLCache(ttl=NOT_FOUND_TTL, max_entries=CACHE_SIZE)
+doorkeeper = RotatingBloomFilter(BLOOM_BITS, BLOOM_HASHES, NOT_FOUND_TTL)
+
+
+def get(username):
+    """
+    The remembered error dict for a user, or None.
+    """
+    error = entries.get(username.lower())
+    if error is not None:
+        counts['hits'] += 1
+    return error
+
+
+def lookup(usernames):
+    """
+    {lowercased username: error dict} for the users with a remembered error.
+    """
+    found = {}
+    for username in usernames:
+        error = get(username)
+        if error is not None:
+            found[username.lower()] = error
+    return found
+
+
+def remember(username, error):
+    """
+    Keeps a failed fetch's error dict if its kind is cacheable.
+    """
+    ttl = TTLS.get(error.get('kind')) if error else None
+    if not ttl:
+        return
+    key = username.lower()
+    seen = key in doorkeeper
+    doorkeeper.add(key)
+    if not seen and len(entries) >= CACHE_SIZE:
+        # Expired entries count towards len() until a get() finds them; only live
+        # ones should keep a name out. Next to the GitHub fetch before it, the scan is cheap.
+        entries.purge_expired()
+        if len(entries) >= CACHE_SIZE:
+            counts['filtered'] += 1
+            return
+    entries.set(key, error, ttl=ttl)
+    counts['stored'] += 1
+
+
+def remember_all(results):
+    """
+    remember() for every error in a {username: bundle or error dict} map.
+    """
+    for username, bundle in results.items():
+        if bundle and 'error' in bundle:
+            remember(username, bundle)
+
+
+def stats():
+    return dict(counts, entries=len(entries), max_entries=CACHE_SIZE)
+
+
+def collect_metrics():
+    return [
+        ("negative_cache_lookups_total", "counter", "Fetches answered from the negative cache", [({}, counts['hits'])]),
+        ("negative_cache_stores_total", "counter", "Failed fetches remembered, or filtered out while the cache was full", [
+            ({"result": "stored"}, counts['stored']),
+            ({"result": "filtered"}, counts['filtered'])
+        ]),
+        ("negative_cache_entries", "gauge", "Remembered failed fetches", [({}, len(entries))])
+    ]
+
+
+metrics.register_collector(collect_metrics)
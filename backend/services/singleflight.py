@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs fn,
+    everyone else arriving while it is in flight waits for and shares its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+        elif not call.event.wait(timeout):
+            raise SingleFlightTimeout(f"Timed out waiting for in-flight call: {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": self.in_flight()}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio version of SingleFlight. Callers share one task per key; a caller
+    timing out doesn't cancel the fetch for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key, coro_fn, timeout=None):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.leaders += 1
+        else:
+            self.shared += 1
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def stats(self):
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
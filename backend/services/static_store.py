@@ -0,0 +1,282 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+from services import metrics
+from services.cards import (
+    CARD_MODES, CARD_SECTIONS, CACHE_HEADERS, PRIVATE_AWARE_CARDS, card_response, render_cache, cache_key,
+    validator_headers, set_encoding_headers
+)
+from services.compression import available_encodings, compress_for_storage, negotiate
+from services.github_service import get_user_bundle
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows; every process may refresh
+    fcntl = None
+
+# Published cards on disk, served without rendering. Card files are content
+# addressed:
+#
+#     objects/<h[:2]>/<h>.svg (+ .svg.gz / .svg.br), h = sha1 of the SVG
+#     index/<card>/<username>/<theme>[-<mode>][-private].svg -> ../../../objects/...
+#
+# The index is a tree of symlinks, so every worker process sees the same
+# state without loading anything, and republishing a card is one atomic
+# rename of a new link. The object hash doubles as the ETag and its mtime
+# (when that content first appeared) as Last-Modified.
+
+STATIC_STORE_DIR = os.environ.get("STATIC_STORE_DIR", "")
+# Seconds after which a published card is re-rendered by the refresher; 0 disables it
+STATIC_STORE_REFRESH_INTERVAL = int(os.environ.get("STATIC_STORE_REFRESH_INTERVAL", 3600))
+# Unreferenced objects younger than this are kept, they may be about to be linked
+STATIC_STORE_GC_GRACE = int(os.environ.get("STATIC_STORE_GC_GRACE", 3600))
+
+ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+# Themes and usernames end up in paths; anything else is never looked up
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+stats = {"hits": 0, "misses": 0, "published": 0, "unchanged": 0, "refreshed": 0, "refresh_failures": 0, "collected": 0}
+
+
+def enabled():
+    return bool(STATIC_STORE_DIR)
+
+
+def index_name(card, username, theme, include_private=False, mode=None):
+    """
+    Path of a card's index link relative to index/, or None when the names aren't safe for a path.
+    """
+    if not _SAFE_NAME.match(username) or not _SAFE_NAME.match(theme) or username.startswith("."):
+        return None
+    name = theme
+    modes = CARD_MODES.get(card)
+    if modes and mode in modes and mode != modes[0]:
+        name += f"-{mode}"
+    if card in PRIVATE_AWARE_CARDS and include_private:
+        name += "-private"
+    return os.path.join(card, username.lower(), f"{name}.svg")
+
+
+def parse_index_name(name):
+    """
+    Inverse of index_name: (card, username, theme, include_private, mode).
+    """
+    card, username, filename = name.split(os.sep)[-3:]
+    parts = filename[:-len(".svg")].split("-")
+    include_private = card in PRIVATE_AWARE_CARDS and parts[-1] == "private"
+    if include_private:
+        parts.pop()
+    mode = None
+    modes = CARD_MODES.get(card)
+    if modes and len(parts) > 1 and parts[-1] in modes:
+        mode = parts.pop()
+    return card, username, "-".join(parts), include_private, mode
+
+
+def object_path(digest, root=None):
+    return os.path.join(root or STATIC_STORE_DIR, "objects", digest[:2], f"{digest}.svg")
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def publish(card, username, theme, svg, include_private=False, mode=None, encoded=None, root=None):
+    """
+    Stores a rendered card and points its index link at it. encoded is the
+    render cache's {encoding: bytes}; br is recompressed at the static quality.
+    Returns the content hash, or None when the card can't be stored.
+    """
+    root = root or STATIC_STORE_DIR
+    name = index_name(card, username, theme, include_private, mode)
+    if not root or name is None:
+        return None
+    data = svg.encode("utf-8") if isinstance(svg, str) else svg
+    digest = hashlib.sha1(data).hexdigest()
+    path = object_path(digest, root)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        encoded = compress_for_storage(data, encoded)
+        # Compressed forms first, so a visible object always has its siblings
+        for encoding, body in encoded.items():
+            _write_atomic(path + ENCODING_SUFFIXES[encoding], body)
+        _write_atomic(path, data)
+        stats['published'] += 1
+    else:
+        stats['unchanged'] += 1
+
+    link = os.path.join(root, "index", name)
+    os.makedirs(os.path.dirname(link), exist_ok=True)
+    tmp = f"{link}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.symlink(os.path.relpath(path, os.path.dirname(link)), tmp)
+    # Also bumps the link's mtime, which the refresher uses as the publish time
+    os.replace(tmp, link)
+    return digest
+
+
+def lookup(card, username, theme, include_private=False, mode=None):
+    """
+    (object path, content hash, mtime) of a published card, or None.
+    """
+    name = index_name(card, username, theme, include_private, mode)
+    if name is None:
+        stats['misses'] += 1
+        return None
+    try:
+        target = os.readlink(os.path.join(STATIC_STORE_DIR, "index", name))
+        path = os.path.normpath(os.path.join(STATIC_STORE_DIR, "index", os.path.dirname(name), target))
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        stats['misses'] += 1
+        return None
+    stats['hits'] += 1
+    return path, os.path.basename(path)[:-len(".svg")], mtime
+
+
+def variant(path, accept_encoding):
+    """
+    (file to send, Content-Encoding or None) for a published object.
+    """
+    encoding = negotiate(accept_encoding, available_encodings())
+    if encoding and os.path.exists(path + ENCODING_SUFFIXES[encoding]):
+        return path + ENCODING_SUFFIXES[encoding], encoding
+    return path, None
+
+
+def response_headers(digest, mtime, encoding=None):
+    headers = dict(CACHE_HEADERS, **validator_headers(f'"{digest}"', mtime))
+    headers['X-Cache'] = 'STATIC'
+    set_encoding_headers(headers, encoding)
+    return headers
+
+
+def render_and_publish(card, username, theme, include_private=False, mode=None, bundle=None, root=None, rerender=False):
+    """
+    Renders a card through the normal card path and publishes it. Returns the hash or None on error cards.
+    rerender skips the render cache, whose copy may be as old as SVG_CACHE_TTL.
+    """
+    if rerender:
+        render_cache.delete(cache_key(card, username, theme, include_private, mode))
+    body, status, headers = card_response(card, username, theme=theme, include_private=include_private, mode=mode, bundle=bundle)
+    if status != 200 or headers.get('Cache-Control') != CACHE_HEADERS['Cache-Control']:
+        return None
+    cached = render_cache.get(cache_key(card, username, theme, include_private, mode))
+    return publish(card, username, theme, body, include_private, mode, encoded=cached[3] if cached else None, root=root)
+
+
+def iter_index(root=None):
+    index = os.path.join(root or STATIC_STORE_DIR, "index")
+    for dirpath, _, filenames in os.walk(index):
+        for filename in filenames:
+            if filename.endswith(".svg"):
+                yield os.path.relpath(os.path.join(dirpath, filename), index)
+
+
+def refresh_stale(max_age=None, root=None):
+    """
+    Re-renders every published card older than max_age seconds. Bundles
+    come from the payload cache as usual, but never the rendered card: the
+    relink stamps the card as rendered now.
+    """
+    root = root or STATIC_STORE_DIR
+    max_age = STATIC_STORE_REFRESH_INTERVAL if max_age is None else max_age
+    now = time.time()
+    for name in iter_index(root):
+        try:
+            if now - os.lstat(os.path.join(root, "index", name)).st_mtime < max_age:
+                continue
+            card, username, theme, include_private, mode = parse_index_name(name)
+            bundle = get_user_bundle(username, CARD_SECTIONS[card])
+            if not bundle or 'error' in bundle:
+                # Keep serving the last good card
+                stats['refresh_failures'] += 1
+                continue
+            if render_and_publish(card, username, theme, include_private, mode, bundle=bundle, root=root, rerender=True):
+                stats['refreshed'] += 1
+            else:
+                stats['refresh_failures'] += 1
+        except Exception as e:
+            stats['refresh_failures'] += 1
+            print(f"Static store refresh failed for {name}: {e}")
+
+
+def collect_garbage(root=None):
+    """
+    Deletes objects no index link points at any more.
+    """
+    root = root or STATIC_STORE_DIR
+    live = set()
+    for name in iter_index(root):
+        try:
+            live.add(os.path.basename(os.readlink(os.path.join(root, "index", name))))
+        except OSError:
+            continue
+    cutoff = time.time() - STATIC_STORE_GC_GRACE
+    for dirpath, _, filenames in os.walk(os.path.join(root, "objects")):
+        for filename in filenames:
+            base = filename.split(".svg")[0] + ".svg"
+            path = os.path.join(dirpath, filename)
+            try:
+                if base not in live and os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    stats['collected'] += 1
+            except OSError:
+                continue
+
+
+def _refresh_loop(interval):
+    lock_path = os.path.join(STATIC_STORE_DIR, ".refresh.lock")
+    while True:
+        time.sleep(interval)
+        try:
+            os.makedirs(STATIC_STORE_DIR, exist_ok=True)
+            with open(lock_path, "a") as lock:
+                if fcntl is not None:
+                    try:
+                        # One refresher per store, however many workers share it
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue
+                with metrics.stage("static_refresh"):
+                    refresh_stale(interval)
+                    collect_garbage()
+        except Exception as e:
+            print(f"Static store refresh failed: {e}")
+
+
+_refresher = None
+
+
+def start_refresher():
+    """
+    Starts the background refresher thread once per process, when the store and the refresher are enabled.
+    """
+    global _refresher
+    if not enabled() or STATIC_STORE_REFRESH_INTERVAL <= 0 or _refresher is not None:
+        return
+    _refresher = threading.Thread(target=_refresh_loop, args=(STATIC_STORE_REFRESH_INTERVAL,), daemon=True, name="static-refresh")
+    _refresher.start()
+
+
+def collect_metrics():
+    return [
+        ("static_store_lookups_total", "counter", "Static store lookups", [
+            ({"result": "hit"}, stats['hits']),
+            ({"result": "miss"}, stats['misses'])
+        ]),
+        ("static_store_objects_written_total", "counter", "New card files written to the static store", [({}, stats['published'])]),
+        ("static_store_refreshes_total", "counter", "Published cards re-rendered by the refresher", [
+            ({"result": "ok"}, stats['refreshed']),
+            ({"result": "failed"}, stats['refresh_failures'])
+        ])
+    ]
+
+
+metrics.register_collector(collect_metrics)
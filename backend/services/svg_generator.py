@@ -1,130 +1,8 @@
+import re
 import svgwrite
 from svgwrite import shapes, gradients
-
-def get_theme_config(theme):
-    themes = {
-        "default": {
-            "bg_gradient": ["#0d1117", "#161b22"],
-            "text": "#c9d1d9",
-            "accent": "#58a6ff",
-            "border": "#30363d",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "light": {
-            "bg_gradient": ["#ffffff", "#f6f8fa"],
-            "text": "#24292f",
-            "accent": "#0969da",
-            "border": "#d0d7de",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "neon": {
-            "bg_gradient": ["#000000", "#1a1a1a"],
-            "text": "#fff",
-            "accent": "#00ffff",
-            "border": "#00ffff",
-            "font": "Courier, monospace",
-            "style": "neon"
-        },
-        "glass": {
-            "bg_gradient": ["#ffffff", "#ffffff"],
-            "text": "#fff",
-            "accent": "#ffffff",
-            "border": "rgba(255, 255, 255, 0.2)",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "glass"
-        },
-        "cyberpunk": { 
-             "bg_gradient": ["#2b213a", "#2b213a"],
-             "text": "#fcee0a",
-             "accent": "#ff003c",
-             "border": "#05d9e8",
-             "font": "'Orbitron', sans-serif",
-             "style": "tech"
-        },
-        "dracula": {
-            "bg_gradient": ["#282a36", "#282a36"],
-            "text": "#f8f8f2",
-            "accent": "#ff79c6",
-            "border": "#bd93f9",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "monokai": {
-            "bg_gradient": ["#272822", "#272822"],
-            "text": "#f8f8f2",
-            "accent": "#a6e22e",
-            "border": "#75715e",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "nord": {
-            "bg_gradient": ["#2e3440", "#2e3440"],
-            "text": "#d8dee9",
-            "accent": "#88c0d0",
-            "border": "#4c566a",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "solarized_light": {
-            "bg_gradient": ["#fdf6e3", "#fdf6e3"],
-            "text": "#657b83",
-            "accent": "#268bd2",
-            "border": "#93a1a1",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "solarized_dark": {
-            "bg_gradient": ["#002b36", "#002b36"],
-            "text": "#839496",
-            "accent": "#b58900",
-            "border": "#586e75",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "cobalt": {
-            "bg_gradient": ["#002240", "#002240"],
-            "text": "#ffffff",
-            "accent": "#ffc600",
-            "border": "#193549",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "synthwave": {
-            "bg_gradient": ["#2b213a", "#241b2f"],
-            "text": "#b3f7f7",
-            "accent": "#ff71ce",
-            "border": "#362c4c",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "neon"
-        },
-        "high_contrast": {
-            "bg_gradient": ["#000000", "#000000"],
-            "text": "#ffffff",
-            "accent": "#ffffff",
-            "border": "#ffffff",
-            "font": "'Segoe UI', Ubuntu, Sans-Serif",
-            "style": "clean"
-        },
-        "gruvbox": {
-             "bg_gradient": ["#282828", "#282828"],
-             "text": "#ebdbb2",
-             "accent": "#fe8019",
-             "border": "#504945",
-             "font": "'Segoe UI', Ubuntu, Sans-Serif",
-             "style": "clean"
-        },
-        "tokyonight": {
-             "bg_gradient": ["#1a1b26", "#1a1b26"],
-             "text": "#a9b1d6",
-             "accent": "#7aa2f7",
-             "border": "#414868",
-             "font": "'Segoe UI', Ubuntu, Sans-Serif",
-             "style": "clean"
-        }
-    }
-    return themes.get(theme, themes["default"])
+from services.svg_templates import get_template, clear_templates, slot
+from services.themes import THEMES, get_theme_config, on_theme_change
 
 def bg_rect(dwg, width, height, theme_cfg):
     # Definition of Gradient
@@ -140,8 +18,30 @@ def bg_rect(dwg, width, height, theme_cfg):
         
     return rect
 
-def generate_stats_svg(stats, theme="default"):
-    dwg = svgwrite.Drawing(size=("480px", "220px"))
+# Re-registering a theme invalidates its compiled templates
+on_theme_change(clear_templates)
+
+def _template_theme(theme):
+    # Unknown theme names all render the same, so they share one set of templates
+    return theme if theme in THEMES else "__fallback__"
+
+def _drawing(size):
+    # Layouts are validated once when designed, not on every compile; slot
+    # placeholders like "{{width}}px" wouldn't pass svgwrite's validator.
+    return svgwrite.Drawing(size=size, debug=False)
+
+def _markup(elements):
+    return "".join(el.tostring() for el in elements)
+
+def _open_markup(dwg):
+    # Everything up to the closing tag, so rows can be appended after it
+    markup = dwg.tostring()
+    return markup[:-len("</svg>")]
+
+# --- Stats card ---
+
+def _build_stats(theme):
+    dwg = _drawing(("480px", "220px"))
     theme_cfg = get_theme_config(theme)
     
     # Background
@@ -153,7 +53,7 @@ def generate_stats_svg(stats, theme="default"):
         glow.feGaussianBlur(in_="SourceGraphic", stdDeviation=2)
     
     # Title
-    title = dwg.text(f"{stats['name'] or stats['username']}", insert=(25, 40), fill=theme_cfg["text"], font_size="22px", font_weight="bold", font_family=theme_cfg["font"])
+    title = dwg.text(slot("title"), insert=(25, 40), fill=theme_cfg["text"], font_size="22px", font_weight="bold", font_family=theme_cfg["font"])
     if theme_cfg["style"] == "neon":
         title['filter'] = "url(#glow)"
         title['fill'] = theme_cfg["accent"]
@@ -163,10 +63,10 @@ def generate_stats_svg(stats, theme="default"):
 
     # Stats Grid
     items = [
-        ("Stars", stats.get("total_stars", 0), "★"),
-        ("Commits", stats.get("total_commits", "??"), "◉"), 
-        ("Repos", stats.get("public_repos", 0), "📘"),
-        ("Followers", stats.get("followers", 0), "👥")
+        ("Stars", slot("stars"), "★"),
+        ("Commits", slot("commits"), "◉"), 
+        ("Repos", slot("repos"), "📘"),
+        ("Followers", slot("followers"), "👥")
     ]
     
     x_start = 25
@@ -185,7 +85,7 @@ def generate_stats_svg(stats, theme="default"):
         
         # Label & Value
         dwg.add(dwg.text(label, insert=(x+45, y+20), fill=theme_cfg["text"], font_size="11px", font_family=theme_cfg["font"]))
-        val_text = dwg.text(str(value), insert=(x+45, y+38), fill=theme_cfg["text"], font_size="16px", font_weight="bold", font_family=theme_cfg["font"])
+        val_text = dwg.text(value, insert=(x+45, y+38), fill=theme_cfg["text"], font_size="16px", font_weight="bold", font_family=theme_cfg["font"])
         
         if theme_cfg["style"] == "neon":
              val_text['fill'] = theme_cfg["accent"]
@@ -194,8 +94,21 @@ def generate_stats_svg(stats, theme="default"):
 
     return dwg.tostring()
 
-def generate_language_svg(languages, theme="default"):
-    dwg = svgwrite.Drawing(size=("480px", "300px"))
+def generate_stats_svg(stats, theme="default"):
+    theme = _template_theme(theme)
+    template = get_template(("stats", theme), lambda: _build_stats(theme))
+    return template.render({
+        "title": f"{stats['name'] or stats['username']}",
+        "stars": stats.get("total_stars", 0),
+        "commits": stats.get("total_commits", "??"),
+        "repos": stats.get("public_repos", 0),
+        "followers": stats.get("followers", 0)
+    })
+
+# --- Languages card ---
+
+def _build_language_head(theme):
+    dwg = _drawing(("480px", "300px"))
     theme_cfg = get_theme_config(theme)
     
     # Background
@@ -203,32 +116,55 @@ def generate_language_svg(languages, theme="default"):
     
     # Title
     dwg.add(dwg.text("Top Languages", insert=(25, 40), fill=theme_cfg["text"], font_size="18px", font_weight="bold", font_family=theme_cfg["font"]))
+    return _open_markup(dwg)
+
+def _build_language_row(theme, i, colored=False):
+    dwg = _drawing(("480px", "300px"))
+    theme_cfg = get_theme_config(theme)
+    y = 75 + i * 40
+    elements = []
+
+    # Text
+    elements.append(dwg.text(slot("lang"), insert=(25, y), fill=theme_cfg["text"], font_size="13px", font_family=theme_cfg["font"]))
+    elements.append(dwg.text(slot("percentage") + "%", insert=(430, y), fill=theme_cfg["text"], text_anchor="end", font_size="13px", font_family=theme_cfg["font"], opacity=0.8))
     
-    y = 75
+    # Progress Bar BG
+    elements.append(dwg.rect(insert=(25, y+8), size=("420px", "6px"), rx=3, ry=3, fill=theme_cfg["text"], fill_opacity=0.1))
+    
+    # Progress Bar Fill
+    # Real language colors when we have them, accent otherwise
+    fill_col = slot("color") if colored else theme_cfg["accent"]
+    elements.append(dwg.rect(insert=(25, y+8), size=(slot("width") + "px", "6px"), rx=3, ry=3, fill=fill_col))
+    return _markup(elements)
+
+def generate_language_svg(languages, theme="default", colors=None):
+    """
+    languages maps name -> weight (repo count or bytes). colors optionally maps
+    name -> GitHub's language color for the bars.
+    """
+    theme = _template_theme(theme)
+    parts = [get_template(("languages", theme), lambda: _build_language_head(theme)).render()]
     total_usage = sum(languages.values())
     
     for i, (lang, count) in enumerate(list(languages.items())[:6]):
         percentage = (count / total_usage) * 100
-        
-        # Text
-        dwg.add(dwg.text(lang, insert=(25, y), fill=theme_cfg["text"], font_size="13px", font_family=theme_cfg["font"]))
-        dwg.add(dwg.text(f"{percentage:.1f}%", insert=(430, y), fill=theme_cfg["text"], text_anchor="end", font_size="13px", font_family=theme_cfg["font"], opacity=0.8))
-        
-        # Progress Bar BG
-        dwg.add(dwg.rect(insert=(25, y+8), size=("420px", "6px"), rx=3, ry=3, fill=theme_cfg["text"], fill_opacity=0.1))
-        
-        # Progress Bar Fill
         bar_width = (percentage / 100) * 420
-        # Varied colors could be added here, using accent for now
-        fill_col = theme_cfg["accent"]
-        dwg.add(dwg.rect(insert=(25, y+8), size=(f"{bar_width}px", "6px"), rx=3, ry=3, fill=fill_col))
-        
-        y += 40
+        values = {"lang": lang, "percentage": f"{percentage:.1f}", "width": bar_width}
+        color = (colors or {}).get(lang)
+        if color:
+            row = get_template(("languages", theme, i, "colored"), lambda: _build_language_row(theme, i, colored=True))
+            values["color"] = color
+        else:
+            row = get_template(("languages", theme, i), lambda: _build_language_row(theme, i))
+        parts.append(row.render(values))
         
-    return dwg.tostring()
+    parts.append("</svg>")
+    return "".join(parts)
 
-def generate_streak_svg(stats, theme="default"):
-    dwg = svgwrite.Drawing(size=("495px", "195px"))
+# --- Streak card ---
+
+def _build_streak(theme):
+    dwg = _drawing(("495px", "195px"))
     theme_cfg = get_theme_config(theme)
     
     # Background
@@ -247,9 +183,9 @@ def generate_streak_svg(stats, theme="default"):
     dwg.add(dwg.line(start=(330, 30), end=(330, 165), stroke=theme_cfg["border"], stroke_width=1))
     
     # --- Left: Total Contributions ---
-    dwg.add(dwg.text(f"{stats['total_contributions']}", insert=(82.5, 70), text_anchor="middle", fill=text_color, font_size="28px", font_weight="bold", font_family=font_family))
+    dwg.add(dwg.text(slot("total"), insert=(82.5, 70), text_anchor="middle", fill=text_color, font_size="28px", font_weight="bold", font_family=font_family))
     dwg.add(dwg.text("Total Contributions", insert=(82.5, 105), text_anchor="middle", fill=text_color, font_size="14px", font_family=font_family))
-    dwg.add(dwg.text(f"{stats['start_date']} - Present", insert=(82.5, 130), text_anchor="middle", fill=muted_color, font_size="12px", font_family=font_family))
+    dwg.add(dwg.text(f"{slot('start')} - Present", insert=(82.5, 130), text_anchor="middle", fill=muted_color, font_size="12px", font_family=font_family))
     
     # --- Center: Current Streak ---
     cx, cy = 247.5, 80
@@ -259,33 +195,73 @@ def generate_streak_svg(stats, theme="default"):
     
     dwg.add(dwg.text("🔥", insert=(cx, cy-40), text_anchor="middle", font_size="24px")) 
     
-    dwg.add(dwg.text(f"{stats['current_streak']}", insert=(cx, cy+10), text_anchor="middle", fill=text_color, font_size="28px", font_weight="bold", font_family=font_family))
+    dwg.add(dwg.text(slot("current"), insert=(cx, cy+10), text_anchor="middle", fill=text_color, font_size="28px", font_weight="bold", font_family=font_family))
     
-    dwg.add(dwg.text("Current Streak", insert=(cx, 130), text_anchor="middle", fill=accent_color, font_size="14px", font_weight="bold", font_family=font_family))
-    dwg.add(dwg.text(f"{stats['end_date']}", insert=(cx, 155), text_anchor="middle", fill=muted_color, font_size="12px", font_family=font_family))
+    dwg.add(dwg.text(slot("current_label"), insert=(cx, 130), text_anchor="middle", fill=accent_color, font_size="14px", font_weight="bold", font_family=font_family))
+    dwg.add(dwg.text(slot("end"), insert=(cx, 155), text_anchor="middle", fill=muted_color, font_size="12px", font_family=font_family))
 
     # --- Right: Longest Streak ---
-    dwg.add(dwg.text(f"{stats['longest_streak']}", insert=(412.5, 70), text_anchor="middle", fill=text_color, font_size="28px", font_weight="bold", font_family=font_family))
-    dwg.add(dwg.text("Longest Streak", insert=(412.5, 105), text_anchor="middle", fill=text_color, font_size="14px", font_family=font_family))
-    dwg.add(dwg.text(f"{stats['start_date']} - {stats['end_date']}", insert=(412.5, 130), text_anchor="middle", fill=muted_color, font_size="12px", font_family=font_family))
+    dwg.add(dwg.text(slot("longest"), insert=(412.5, 70), text_anchor="middle", fill=text_color, font_size="28px", font_weight="bold", font_family=font_family))
+    dwg.add(dwg.text(slot("longest_label"), insert=(412.5, 105), text_anchor="middle", fill=text_color, font_size="14px", font_family=font_family))
+    dwg.add(dwg.text(f"{slot('longest_start')} - {slot('longest_end')}", insert=(412.5, 130), text_anchor="middle", fill=muted_color, font_size="12px", font_family=font_family))
 
     return dwg.tostring()
 
-def generate_trophies_svg(stats, theme="default"):
-    # High-fidelity layout: 6 columns x 2 rows
-    # Width: ~800px
-    # Height: ~300px
-    cols = 6
-    rows = 2
-    item_w = 110
-    item_h = 110
-    gap_x = 10
-    gap_y = 10
-    
-    width = (cols * item_w) + ((cols - 1) * gap_x) + 40 # 40px padding
-    height = (rows * item_h) + ((rows - 1) * gap_y) + 40
-    
-    dwg = svgwrite.Drawing(size=(f"{width}px", f"{height}px"))
+STREAK_LABELS = {
+    "daily": ("Current Streak", "Longest Streak"),
+    "weekly": ("Weekly Streak", "Longest Weekly")
+}
+
+def generate_streak_svg(stats, theme="default"):
+    theme = _template_theme(theme)
+    template = get_template(("streak", theme), lambda: _build_streak(theme))
+    current_label, longest_label = STREAK_LABELS.get(stats.get('mode'), STREAK_LABELS["daily"])
+    return template.render({
+        "total": stats['total_contributions'],
+        "current": stats['current_streak'],
+        "longest": stats['longest_streak'],
+        "start": stats['start_date'],
+        "end": stats['end_date'],
+        "current_label": current_label,
+        "longest_label": longest_label,
+        # Stats without streak dates (e.g. on errors) show the calendar's range as before
+        "longest_start": stats.get('longest_streak_start') or stats['start_date'],
+        "longest_end": stats.get('longest_streak_end') or stats['end_date']
+    })
+
+# --- Trophies card ---
+
+# High-fidelity layout: 6 columns x 2 rows
+# Width: ~800px
+# Height: ~300px
+TROPHY_COLS = 6
+TROPHY_ROWS = 2
+TROPHY_ITEM_W = 110
+TROPHY_ITEM_H = 110
+TROPHY_GAP_X = 10
+TROPHY_GAP_Y = 10
+TROPHY_WIDTH = (TROPHY_COLS * TROPHY_ITEM_W) + ((TROPHY_COLS - 1) * TROPHY_GAP_X) + 40 # 40px padding
+TROPHY_HEIGHT = (TROPHY_ROWS * TROPHY_ITEM_H) + ((TROPHY_ROWS - 1) * TROPHY_GAP_Y) + 40
+
+TROPHY_CATEGORIES = [
+    # Row 1 (6 items)
+    ("AchieveSSSRank", "SSS Rank Hacker"),
+    ("MultiLanguage", "Rainbow Lang User"),
+    ("LongTimeUser", "Village Elder"),
+    ("NewUser", "Everything started..."),
+    ("Repositories", "God Repo Creator"),
+    ("Commits", "Super Committer"),
+    # Row 2 (6 items)
+    ("Stars", "High Star"),
+    ("Followers", "Many Friends"),
+    ("Issues", "First Issue"),
+    ("PullRequest", "First Pull"),
+    ("AncientUser", "Unknown"),
+    ("Organizations", "Unknown"),
+]
+
+def _build_trophies_head(theme):
+    dwg = _drawing((f"{TROPHY_WIDTH}px", f"{TROPHY_HEIGHT}px"))
     theme_cfg = get_theme_config(theme)
     
     # --- Definitions (Gradients) ---
@@ -312,6 +288,14 @@ def generate_trophies_svg(stats, theme="default"):
 
     # Background (Use the helper valid for the theme)
     dwg.add(bg_rect(dwg, "100%", "100%", theme_cfg))
+    return _open_markup(dwg)
+
+def _build_trophy_item(theme, i, with_bar):
+    dwg = _drawing((f"{TROPHY_WIDTH}px", f"{TROPHY_HEIGHT}px"))
+    theme_cfg = get_theme_config(theme)
+    name, subtitle = TROPHY_CATEGORIES[i]
+    grad_id = slot("grad")
+    elements = []
 
     # --- Helper: Draw Vector Trophy Cup ---
     def draw_trophy(insert_x, insert_y, scale=1.0, grad_id="gradS"):
@@ -337,6 +321,66 @@ def generate_trophies_svg(stats, theme="default"):
 
         return g
 
+    pad_x = 20
+    pad_y = 20
+    row = i // TROPHY_COLS
+    col = i % TROPHY_COLS
+    x = pad_x + col * (TROPHY_ITEM_W + TROPHY_GAP_X)
+    y = pad_y + row * (TROPHY_ITEM_H + TROPHY_GAP_Y)
+    item_w = TROPHY_ITEM_W
+    item_h = TROPHY_ITEM_H
+    
+    cx = x + item_w / 2
+    
+    # 1. Card Container (Rounded with Border)
+    border_color = theme_cfg["border"]
+    
+    # Card Background - Optional: Use slight fill based on theme style
+    bg_opacity = 0.3 if theme_cfg.get("style") == "glass" else 0
+    elements.append(dwg.rect(insert=(x, y), size=(item_w, item_h), rx=8, ry=8,
+                             fill=theme_cfg["bg_gradient"][0], fill_opacity=bg_opacity, 
+                             stroke=border_color, stroke_width=1.5))
+    
+    # 2. Header Text
+    elements.append(dwg.text(name, insert=(cx, y + 16), text_anchor="middle",
+                             fill="url(#gradPrimary)", font_size="10px", font_weight="bold", font_family=theme_cfg["font"]))
+    
+    # 3. Trophy (Centered)
+    # Shift down a bit to clear header
+    t_scale = 0.38
+    t_y_pos = y + 22
+    elements.append(draw_trophy(cx - (50*t_scale), t_y_pos, scale=t_scale, grad_id=grad_id))
+    
+    # 4. Rank Letter
+    rank_y = t_y_pos + (35 * t_scale) + 8
+    elements.append(dwg.text(slot("rank"), insert=(cx, rank_y), text_anchor="middle",
+                             fill=theme_cfg["bg_gradient"][0] if theme == "light" else "#FFFFFF",
+                             font_size="12px", font_weight="bold", font_family="Arial",
+                             style="text-shadow: 0px 0px 2px rgba(0,0,0,0.5);" if theme != "light" else ""))
+    
+    # 5. Subtitle
+    elements.append(dwg.text(subtitle, insert=(cx, y + 82), text_anchor="middle",
+                             fill="url(#gradSecondary)", font_size="8.5px", font_weight="bold", font_family=theme_cfg["font"]))
+    
+    # 6. Description
+    # Use theme border color for description if it is visible enough, or text
+    elements.append(dwg.text(slot("desc"), insert=(cx, y + 94), text_anchor="middle",
+                             fill=theme_cfg["border"], font_size="8px", font_family=theme_cfg["font"]))
+
+    # 7. Progress Bar
+    if with_bar:
+        bar_w = 60
+        bar_h = 3
+        bar_x = cx - bar_w/2
+        bar_y = y + 102
+        elements.append(dwg.rect(insert=(bar_x, bar_y), size=(bar_w, bar_h), rx=1.5, ry=1.5, fill=theme_cfg["border"], fill_opacity=0.5))
+        elements.append(dwg.rect(insert=(bar_x, bar_y), size=(bar_w * 0.6, bar_h), rx=1.5, ry=1.5, fill=theme_cfg["accent"]))
+
+    return _markup(elements)
+
+def generate_trophies_svg(stats, theme="default"):
+    theme = _template_theme(theme)
+
     # --- Logic ---
     from datetime import datetime
     
@@ -424,8 +468,7 @@ def generate_trophies_svg(stats, theme="default"):
          "value": stats.get('total_orgs', 0), "thresh": [1, 2, 5, 10, 20, 50], "force_rank": "?" if stats.get('total_orgs', 0) == 0 else None}
     ]
     
-    pad_x = 20
-    pad_y = 20
+    parts = [get_template(("trophies", theme), lambda: _build_trophies_head(theme)).render()]
 
     for i, cat in enumerate(categories):
         if 'force_rank' in cat and cat['force_rank']:
@@ -435,62 +478,62 @@ def generate_trophies_svg(stats, theme="default"):
              
         grad_id = get_grad_for_rank(rank)
         
-        row = i // cols
-        col = i % cols
-        x = pad_x + col * (item_w + gap_x)
-        y = pad_y + row * (item_h + gap_y)
-        
-        cx = x + item_w / 2
-        
-        # 1. Card Container (Rounded with Border)
-        # Border color matches rank or alternating neon
-        # Let's use alternating neon pink/cyan for the border aesthetic
-        border_color = theme_cfg["border"]
-        
         # Dim styling for "Unknown" or not achieved ranks
         if rank in ["?", "-"]:
-             border_color = theme_cfg["border"]
              grad_id = "gradUnknown"
-        
-        # Card Background - Optional: Use slight fill based on theme style
-        bg_opacity = 0.3 if theme_cfg.get("style") == "glass" else 0
-        dwg.add(dwg.rect(insert=(x, y), size=(item_w, item_h), rx=8, ry=8,
-                         fill=theme_cfg["bg_gradient"][0], fill_opacity=bg_opacity, 
-                         stroke=border_color, stroke_width=1.5))
-        
-        # 2. Header Text
-        dwg.add(dwg.text(cat['name'], insert=(cx, y + 16), text_anchor="middle",
-                         fill="url(#gradPrimary)", font_size="10px", font_weight="bold", font_family=theme_cfg["font"]))
-        
-        # 3. Trophy (Centered)
-        # Shift down a bit to clear header
-        t_scale = 0.38
-        t_y_pos = y + 22
-        dwg.add(draw_trophy(cx - (50*t_scale), t_y_pos, scale=t_scale, grad_id=grad_id))
-        
-        # 4. Rank Letter
-        rank_y = t_y_pos + (35 * t_scale) + 8
-        dwg.add(dwg.text(rank, insert=(cx, rank_y), text_anchor="middle",
-                         fill=theme_cfg["bg_gradient"][0] if theme == "light" else "#FFFFFF",
-                         font_size="12px", font_weight="bold", font_family="Arial",
-                         style="text-shadow: 0px 0px 2px rgba(0,0,0,0.5);" if theme != "light" else ""))
-        
-        # 5. Subtitle
-        dwg.add(dwg.text(cat['subtitle'], insert=(cx, y + 82), text_anchor="middle",
-                         fill="url(#gradSecondary)", font_size="8.5px", font_weight="bold", font_family=theme_cfg["font"]))
-        
-        # 6. Description
-        # Use theme border color for description if it is visible enough, or text
-        dwg.add(dwg.text(cat['desc'], insert=(cx, y + 94), text_anchor="middle",
-                         fill=theme_cfg["border"], font_size="8px", font_family=theme_cfg["font"]))
-
-        # 7. Progress Bar
-        if rank not in ["?", "-"]:
-            bar_w = 60
-            bar_h = 3
-            bar_x = cx - bar_w/2
-            bar_y = y + 102
-            dwg.add(dwg.rect(insert=(bar_x, bar_y), size=(bar_w, bar_h), rx=1.5, ry=1.5, fill=theme_cfg["border"], fill_opacity=0.5))
-            dwg.add(dwg.rect(insert=(bar_x, bar_y), size=(bar_w * 0.6, bar_h), rx=1.5, ry=1.5, fill=theme_cfg["accent"]))
 
-    return dwg.tostring()
+        with_bar = rank not in ["?", "-"]
+        item = get_template(("trophies", theme, i, with_bar), lambda: _build_trophy_item(theme, i, with_bar))
+        parts.append(item.render({"grad": grad_id, "rank": rank, "desc": cat['desc']}))
+
+    parts.append("</svg>")
+    return "".join(parts)
+
+# --- Stacked cards ---
+
+SVG_OPEN_RE = re.compile(r"<svg\b([^>]*)>")
+SIZE_RE = re.compile(r'\b(width|height)="([\d.]+)(?:px)?"')
+ID_RE = re.compile(r'\bid="([^"]+)"|url\(#([^)]+)\)')
+
+def stack_svgs(svgs, gap=10):
+    """
+    Stacks rendered cards vertically into one SVG. Each card becomes a nested
+    <svg> with its ids prefixed, so cards sharing gradient ids (e.g. bgGrad
+    in different themes) don't pick up each other's definitions.
+    """
+    parts = []
+    y = 0
+    width = 0
+    for i, svg in enumerate(svgs):
+        match = SVG_OPEN_RE.search(svg)
+        if not match:
+            continue
+        sizes = dict(SIZE_RE.findall(match.group(1)))
+        card_width = float(sizes.get("width", 400))
+        card_height = float(sizes.get("height", 100))
+        prefix = f"c{i}-"
+        svg = ID_RE.sub(lambda m: f'id="{prefix}{m.group(1)}"' if m.group(1) else f"url(#{prefix}{m.group(2)})", svg)
+        parts.append(svg[:match.start()] + f'<svg x="0" y="{y:g}"' + svg[match.start() + 4:])
+        y += card_height + gap
+        width = max(width, card_width)
+    height = max(0, y - gap)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:g}" height="{height:g}" viewBox="0 0 {width:g} {height:g}">'
+            + "".join(parts) + "</svg>")
+
+def warm_templates(themes=None):
+    """
+    Compiles every card layout for the given themes (all by default) so the
+    first request for a theme doesn't pay for svgwrite.
+    """
+    for theme in themes or list(THEMES) + ["__fallback__"]:
+        theme = _template_theme(theme)
+        get_template(("stats", theme), lambda: _build_stats(theme))
+        get_template(("streak", theme), lambda: _build_streak(theme))
+        get_template(("languages", theme), lambda: _build_language_head(theme))
+        for i in range(6):
+            get_template(("languages", theme, i), lambda: _build_language_row(theme, i))
+            get_template(("languages", theme, i, "colored"), lambda: _build_language_row(theme, i, colored=True))
+        get_template(("trophies", theme), lambda: _build_trophies_head(theme))
+        for i in range(len(TROPHY_CATEGORIES)):
+            for with_bar in (True, False):
+                get_template(("trophies", theme, i, with_bar), lambda: _build_trophy_item(theme, i, with_bar))
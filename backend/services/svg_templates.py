@@ -0,0 +1,89 @@
+import re
+import threading
+
+# svgwrite serializes through ElementTree; filling slots with the same escaping
+# keeps template output byte-identical to a fresh svgwrite render.
+from xml.etree.ElementTree import _escape_attrib, _escape_cdata
+
+SLOT_RE = re.compile(r"\{\{(\w+)\}\}")
+CLOSING_TAG_RE = re.compile(r"</[\w:-]+>")
+
+
+def slot(name):
+    """
+    Placeholder passed to svgwrite in place of a per-request value.
+    """
+    return "{{%s}}" % name
+
+
+class SVGTemplate:
+    """
+    Markup split into static chunks and named value slots. Each slot knows
+    whether it sits in an attribute or in text so it is escaped like svgwrite would,
+    and a slot holding an element's whole text closes the element as <tag ... />
+    when it is empty, as ElementTree does.
+    """
+    __slots__ = ("parts", "slots")
+
+    def __init__(self, markup):
+        self.parts = []
+        self.slots = []
+        pos = 0
+        for match in SLOT_RE.finditer(markup):
+            self.parts.append(markup[pos:match.start()])
+            in_tag = markup.rfind('<', 0, match.start()) > markup.rfind('>', 0, match.start())
+            # Length of the closing tag right after a slot that is all of its element's text
+            closing = CLOSING_TAG_RE.match(markup, match.end())
+            whole_text = not in_tag and closing is not None and markup.endswith('>', 0, match.start())
+            self.slots.append((match.group(1), _escape_attrib if in_tag else _escape_cdata,
+                               closing.end() - match.end() if whole_text else 0))
+            pos = match.end()
+        self.parts.append(markup[pos:])
+
+    def render(self, values=None):
+        if not self.slots:
+            return self.parts[0]
+        out = [self.parts[0]]
+        for (name, escape, closing), part in zip(self.slots, self.parts[1:]):
+            value = escape(str(values[name]))
+            if closing and not value:
+                out[-1] = out[-1][:-1] + " />"
+                part = part[closing:]
+            out.append(value)
+            out.append(part)
+        return "".join(out)
+
+
+_templates = {}
+_lock = threading.Lock()
+
+
+def get_template(key, build):
+    """
+    Returns the compiled template for key, calling build() for the markup the first time.
+    """
+    template = _templates.get(key)
+    if template is None:
+        with _lock:
+            template = _templates.get(key)
+            if template is None:
+                template = SVGTemplate(build())
+                _templates[key] = template
+    return template
+
+
+def clear_templates(theme=None):
+    """
+    Drops compiled templates, only those of one theme when given.
+    Keys are tuples of (card, theme, ...).
+    """
+    with _lock:
+        if theme is None:
+            _templates.clear()
+        else:
+            for key in [k for k in _templates if k[1] == theme]:
+                del _templates[key]
+
+
+def template_count():
+    return len(_templates)
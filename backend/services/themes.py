@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+
+# Built-in themes. Extra themes can be loaded from a JSON file (THEMES_FILE)
+# of the form {"name": {"bg_gradient": [...], "text": ..., ...}}; missing keys
+# fall back to the default theme.
+THEMES = {
+    "default": {
+        "bg_gradient": ["#0d1117", "#161b22"],
+        "text": "#c9d1d9",
+        "accent": "#58a6ff",
+        "border": "#30363d",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "light": {
+        "bg_gradient": ["#ffffff", "#f6f8fa"],
+        "text": "#24292f",
+        "accent": "#0969da",
+        "border": "#d0d7de",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "neon": {
+        "bg_gradient": ["#000000", "#1a1a1a"],
+        "text": "#fff",
+        "accent": "#00ffff",
+        "border": "#00ffff",
+        "font": "Courier, monospace",
+        "style": "neon"
+    },
+    "glass": {
+        "bg_gradient": ["#ffffff", "#ffffff"],
+        "text": "#fff",
+        "accent": "#ffffff",
+        "border": "rgba(255, 255, 255, 0.2)",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "glass"
+    },
+    "cyberpunk": { 
+         "bg_gradient": ["#2b213a", "#2b213a"],
+         "text": "#fcee0a",
+         "accent": "#ff003c",
+         "border": "#05d9e8",
+         "font": "'Orbitron', sans-serif",
+         "style": "tech"
+    },
+    "dracula": {
+        "bg_gradient": ["#282a36", "#282a36"],
+        "text": "#f8f8f2",
+        "accent": "#ff79c6",
+        "border": "#bd93f9",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "monokai": {
+        "bg_gradient": ["#272822", "#272822"],
+        "text": "#f8f8f2",
+        "accent": "#a6e22e",
+        "border": "#75715e",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "nord": {
+        "bg_gradient": ["#2e3440", "#2e3440"],
+        "text": "#d8dee9",
+        "accent": "#88c0d0",
+        "border": "#4c566a",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "solarized_light": {
+        "bg_gradient": ["#fdf6e3", "#fdf6e3"],
+        "text": "#657b83",
+        "accent": "#268bd2",
+        "border": "#93a1a1",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "solarized_dark": {
+        "bg_gradient": ["#002b36", "#002b36"],
+        "text": "#839496",
+        "accent": "#b58900",
+        "border": "#586e75",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "cobalt": {
+        "bg_gradient": ["#002240", "#002240"],
+        "text": "#ffffff",
+        "accent": "#ffc600",
+        "border": "#193549",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "synthwave": {
+        "bg_gradient": ["#2b213a", "#241b2f"],
+        "text": "#b3f7f7",
+        "accent": "#ff71ce",
+        "border": "#362c4c",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "neon"
+    },
+    "high_contrast": {
+        "bg_gradient": ["#000000", "#000000"],
+        "text": "#ffffff",
+        "accent": "#ffffff",
+        "border": "#ffffff",
+        "font": "'Segoe UI', Ubuntu, Sans-Serif",
+        "style": "clean"
+    },
+    "gruvbox": {
+         "bg_gradient": ["#282828", "#282828"],
+         "text": "#ebdbb2",
+         "accent": "#fe8019",
+         "border": "#504945",
+         "font": "'Segoe UI', Ubuntu, Sans-Serif",
+         "style": "clean"
+    },
+    "tokyonight": {
+         "bg_gradient": ["#1a1b26", "#1a1b26"],
+         "text": "#a9b1d6",
+         "accent": "#7aa2f7",
+         "border": "#414868",
+         "font": "'Segoe UI', Ubuntu, Sans-Serif",
+         "style": "clean"
+    }
+}
+
+THEME_KEYS = ("bg_gradient", "text", "accent", "border", "font", "style")
+
+_lock = threading.Lock()
+_listeners = []
+
+
+def resolve_theme(cfg):
+    """
+    Fills missing keys from the default theme and validates the result.
+    """
+    resolved = dict(THEMES["default"])
+    resolved.update({k: v for k, v in cfg.items() if k in THEME_KEYS})
+    grad = resolved["bg_gradient"]
+    if not isinstance(grad, (list, tuple)) or len(grad) != 2:
+        raise ValueError("bg_gradient must be a list of two colors")
+    resolved["bg_gradient"] = list(grad)
+    return resolved
+
+
+def get_theme_config(theme):
+    return THEMES.get(theme, THEMES["default"])
+
+
+def list_themes():
+    return list(THEMES)
+
+
+def on_theme_change(callback):
+    """
+    Registers callback(name), called after a theme is added or replaced
+    (used to drop compiled templates for that theme).
+    """
+    _listeners.append(callback)
+
+
+def register_theme(name, cfg):
+    resolved = resolve_theme(cfg)
+    with _lock:
+        THEMES[name] = resolved
+    for callback in _listeners:
+        callback(name)
+    return resolved
+
+
+def load_themes_file(path):
+    """
+    Registers every theme in a JSON file. Returns the names loaded.
+    Invalid entries are skipped with a warning so one typo doesn't take the service down.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    loaded = []
+    for name, cfg in data.items():
+        try:
+            register_theme(name, cfg)
+            loaded.append(name)
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Warning: skipping theme '{name}' from {path}: {e}")
+    return loaded
+
+
+if os.environ.get("THEMES_FILE"):
+    try:
+        load_themes_file(os.environ["THEMES_FILE"])
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not load THEMES_FILE: {e}")
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+
+from services import metrics
+
+# Several GitHub tokens, each with its own 5000 points/hour GraphQL budget.
+# Every request goes to the token with the most points left; budgets are
+# corrected from the X-RateLimit-* headers of each response. When all tokens are spent, callers wait briefly for the
+# earliest reset or the request is shed.
+
+# Points a fresh token is assumed to have until GitHub tells us otherwise
+DEFAULT_LIMIT = 5000
+# Points held back on each token, e.g. for manual debugging with the same token
+TOKEN_RESERVE = int(os.environ.get("GITHUB_TOKEN_RESERVE", 50))
+# Longest a request waits for a token to reset before it is shed
+MAX_WAIT = float(os.environ.get("GITHUB_TOKEN_MAX_WAIT", 2))
+
+
+class TokensExhausted(Exception):
+    """
+    Every token is out of points until reset_in seconds from now.
+    """
+
+    def __init__(self, reset_in):
+        super().__init__(f"All GitHub tokens are rate limited for another {int(reset_in)}s")
+        self.reset_in = reset_in
+
+
+class TokenState:
+    __slots__ = ("token", "remaining", "limit", "reset_at", "requests")
+
+    def __init__(self, token):
+        self.token = token
+        self.remaining = DEFAULT_LIMIT
+        self.limit = DEFAULT_LIMIT
+        self.reset_at = 0.0
+        self.requests = 0
+
+    def headroom(self, now):
+        if self.reset_at <= now:
+            # The window has rolled over since we last heard from GitHub
+            return self.limit - TOKEN_RESERVE
+        return self.remaining - TOKEN_RESERVE
+
+
+class TokenPool:
+    def __init__(self, tokens):
+        self.tokens = {token: TokenState(token) for token in tokens}
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.shed = 0
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def acquire(self, max_wait=None):
+        """
+        Returns the token with the most headroom, waiting up to max_wait
+        seconds for a reset when all of them are spent. Raises TokensExhausted otherwise.
+        """
+        max_wait = MAX_WAIT if max_wait is None else max_wait
+        deadline = time.time() + max_wait
+        while True:
+            with self.lock:
+                now = time.time()
+                best = max(self.tokens.values(), key=lambda state: state.headroom(now))
+                if best.headroom(now) > 0:
+                    # Count the request against the budget now; the response corrects it
+                    best.remaining = best.headroom(now) + TOKEN_RESERVE - 1
+                    if best.reset_at <= now:
+                        # Unknown or expired window; assume a fresh hour until a response says otherwise
+                        best.reset_at = now + 3600
+                    best.requests += 1
+                    self.acquired += 1
+                    return best.token
+                reset_at = min(state.reset_at for state in self.tokens.values())
+                if reset_at > deadline:
+                    self.shed += 1
+                    raise TokensExhausted(reset_at - now)
+                self.waited += 1
+            time.sleep(max(0.0, reset_at - time.time()) + 0.05)
+
+    def record(self, token, status_code, headers):
+        """
+        Updates a token's budget from a response's rate limit headers.
+        """
+        state = self.tokens.get(token)
+        if state is None:
+            return
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        limit = headers.get("X-RateLimit-Limit")
+        retry_after = headers.get("Retry-After")
+        with self.lock:
+            if remaining is not None and reset is not None:
+                state.remaining = int(remaining)
+                state.reset_at = float(reset)
+            if limit is not None:
+                state.limit = int(limit)
+            if status_code in (403, 429) and retry_after and retry_after.isdigit():
+                # Secondary rate limit: rest this token for a while
+                state.remaining = 0
+                state.reset_at = max(state.reset_at, time.time() + int(retry_after))
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return {
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "shed": self.shed,
+                "tokens": [
+                    {
+                        # Never expose a token, only enough to tell them apart
+                        "token": f"...{state.token[-4:]}",
+                        "remaining": max(0, state.headroom(now) + TOKEN_RESERVE),
+                        "limit": state.limit,
+                        "reset_in": max(0, int(state.reset_at - now)),
+                        "requests": state.requests
+                    }
+                    for state in self.tokens.values()
+                ]
+            }
+
+
+_pool = None
+_pool_source = None
+_pool_lock = threading.Lock()
+
+
+def configured_tokens():
+    """
+    GITHUB_TOKENS (comma-separated) plus GITHUB_TOKEN, without duplicates.
+    """
+    tokens = [t.strip() for t in os.environ.get("GITHUB_TOKENS", "").split(",")]
+    tokens.append(os.environ.get("GITHUB_TOKEN", "").strip())
+    return list(dict.fromkeys(t for t in tokens if t))
+
+
+def get_pool():
+    """
+    The process-wide pool, rebuilt when the configured tokens change.
+    Returns None when no token is configured.
+    """
+    global _pool, _pool_source
+    tokens = configured_tokens()
+    if tokens != _pool_source:
+        with _pool_lock:
+            if tokens != _pool_source:
+                _pool = TokenPool(tokens) if tokens else None
+                _pool_source = tokens
+    return _pool
+
+
+def token_from_headers(headers):
+    authorization = headers.get("Authorization") or ""
+    return authorization[len("Bearer "):] if authorization.startswith("Bearer ") else None
+
+
+def record(request_headers, status_code, response_headers):
+    """
+    Feeds a GitHub response back into the pool, for the token it was sent with.
+    """
+    pool = _pool
+    if pool is not None:
+        token = token_from_headers(request_headers)
+        if token:
+            pool.record(token, status_code, response_headers)
+
+
+def record_response(response, *args, **kwargs):
+    """
+    requests response hook for http_client's sessions.
+    """
+    record(response.request.headers, response.status_code, response.headers)
+    return response
+
+
+def stats():
+    pool = get_pool()
+    return pool.stats() if pool is not None else {"acquired": 0, "waited": 0, "shed": 0, "tokens": []}
+
+
+def collect_metrics():
+    """
+    Remaining rate limit per token (masked as in stats) for /metrics.
+    """
+    pool_stats = stats()
+    return [
+        ("github_rate_limit_remaining", "gauge", "GraphQL points left per token", [
+            ({"token": token["token"]}, token["remaining"]) for token in pool_stats["tokens"]
+        ]),
+        ("github_rate_limit_reset_seconds", "gauge", "Seconds until each token's budget resets", [
+            ({"token": token["token"]}, token["reset_in"]) for token in pool_stats["tokens"]
+        ]),
+        ("github_token_requests_total", "counter", "Token requests by outcome", [
+            ({"result": "acquired"}, pool_stats["acquired"]),
+            ({"result": "shed"}, pool_stats["shed"])
+        ]),
+        ("github_token_waits_total", "counter", "Token requests that waited for a reset", [({}, pool_stats["waited"])])
+    ]
+
+
+metrics.register_collector(collect_metrics)
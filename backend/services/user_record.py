@@ -0,0 +1,96 @@
+import datetime
+import os
+import threading
+
+from services.cache import TTLCache
+from services.github_service import bundle_calendar, bundle_digest, calculate_streak_stats, PAYLOAD_FRESH_TTL
+
+# One normalized record per user and bundle version, shared by every card,
+# theme and include_private variant rendered from it. The payload cache keeps
+# bundles JSON-shaped so sqlite/redis can share them; this is the in-process
+# form the renderers read, with the derived values (stats per privacy
+# variant, streaks per mode, lifetime history) computed once per record.
+
+STAT_FIELDS = (
+    "username", "name", "followers", "following", "public_repos", "total_stars", "total_forks",
+    "total_commits", "total_issues", "total_prs", "created_at", "total_orgs"
+)
+
+# Records are keyed by bundle digest, so a changed bundle simply gets a new one
+record_cache = TTLCache(ttl=PAYLOAD_FRESH_TTL, max_entries=int(os.environ.get("RECORD_CACHE_SIZE", 10000)))
+
+
+class UserRecord:
+    __slots__ = STAT_FIELDS + ("restricted_contributions", "languages", "calendar", "digest", "_memo", "_lock")
+
+    def __init__(self, bundle):
+        stats = bundle['stats']
+        for field in STAT_FIELDS:
+            setattr(self, field, stats.get(field))
+        # Kept raw so both include_private variants come from one fetch
+        self.restricted_contributions = bundle.get('restricted_contributions', 0)
+        self.languages = bundle.get('languages', {})
+        self.calendar = bundle_calendar(bundle) if 'calendar' in bundle or 'contribution_days' in bundle else None
+        self.digest = bundle.get('digest') or bundle_digest(bundle)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def memo(self, key, compute, keep=None):
+        """
+        compute() once per key. keep(value) can refuse to store a result (e.g. a partial fetch).
+        """
+        value = self._memo.get(key)
+        if value is None:
+            value = compute()
+            if keep is None or keep(value):
+                with self._lock:
+                    value = self._memo.setdefault(key, value)
+        return value
+
+    def stats(self, include_private):
+        """
+        The stats dict the card generators read. Shared between calls; don't mutate it.
+        """
+        return self.memo(("stats", bool(include_private)), lambda: self._build_stats(include_private))
+
+    def _build_stats(self, include_private):
+        stats = {field: getattr(self, field) for field in STAT_FIELDS if getattr(self, field) is not None}
+        if not include_private and 'total_commits' in stats:
+            # totalCommitContributions includes restricted (private) contributions when the token can see them
+            stats['total_commits'] = max(0, stats['total_commits'] - self.restricted_contributions)
+        return stats
+
+    def history(self, load):
+        """
+        The lifetime ContributionCalendar from load(), kept once it reaches back
+        to the account's creation with no year missing.
+        """
+        created = datetime.date.fromisoformat(self.created_at[:10]).toordinal() if self.created_at else 0
+        return self.memo("history", load,
+                         keep=lambda calendar: len(calendar) and not calendar.partial and calendar.start <= created)
+
+    def streak(self, mode, history=None):
+        """
+        Streak stats for a mode, over history or the bundle's calendar. The
+        current streak depends on the date, so results are kept per day, and
+        only for the history this record kept (see history()).
+        """
+        today = datetime.datetime.utcnow().date().isoformat()
+        calendar = history if history is not None else self.calendar
+        compute = lambda: calculate_streak_stats(calendar if calendar is not None else [], mode=mode)
+        if history is not None and history is not self._memo.get("history"):
+            # A partial history would otherwise stand in for the full one all day
+            return compute()
+        return self.memo(("streak", mode, today, history is not None), compute)
+
+
+def user_record(bundle):
+    """
+    The shared UserRecord of a bundle, built on first use.
+    """
+    key = (bundle['stats']['username'].lower(), bundle.get('digest') or bundle_digest(bundle))
+    record = record_cache.get(key)
+    if record is None:
+        record = UserRecord(bundle)
+        record_cache.set(key, record)
+    return record
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# The services read their settings at import time: keep the tests on the
+# in-process cache and off the network.
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["PRECOMPILE_TEMPLATES"] = "false"
+os.environ.pop("GITHUB_TOKEN", None)
+os.environ.pop("GITHUB_TOKENS", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def github_stub(monkeypatch):
+    """
+    The benchmark stub standing in for GitHub, with every cache emptied. Returns the stub server.
+    """
+    from benchmarks.stub_github import start_stub_server
+    from services import admission, cards, github_service, negative_cache, user_record
+
+    server = start_stub_server()
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    monkeypatch.setattr(github_service, "GITHUB_GRAPHQL_URL", f"http://127.0.0.1:{server.server_address[1]}/graphql")
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", False)
+    for cache in (github_service.payload_cache._cache, cards.render_cache, negative_cache.entries, user_record.record_cache):
+        cache.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
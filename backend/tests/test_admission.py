@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from services import admission, cards, github_service
+from services.admission import FetchSlots, Shed, TokenBucket
+
+
+def test_token_bucket_spends_its_burst_then_refills():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    wait = bucket.take()
+    assert 0 < wait <= 0.1
+    time.sleep(wait + 0.01)
+    assert bucket.take() == 0
+
+
+def test_token_bucket_lets_an_oversized_batch_through_when_full():
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.take(5) == 0
+    assert bucket.take(1) > 0
+
+
+def test_token_bucket_without_rate_never_refills():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert bucket.take() == 0
+    assert bucket.take() == 3600
+
+
+def test_fetch_slots_keep_a_reserve_for_the_priority_lane():
+    slots = FetchSlots(3, 1)
+    assert slots.acquire() and slots.acquire()
+    assert not slots.acquire()
+    assert slots.acquire(priority=True)
+    assert not slots.acquire(priority=True)
+    assert slots.peak == 3
+
+
+def test_priority_waits_for_a_released_slot():
+    slots = FetchSlots(1, 0)
+    assert slots.acquire()
+    threading.Timer(0.05, slots.release).start()
+    started = time.monotonic()
+    assert slots.acquire(priority=True, wait=1)
+    assert time.monotonic() - started < 0.5
+    assert not slots.acquire(priority=True, wait=0.01)
+
+
+@pytest.fixture
+def fresh_admission(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "slots", FetchSlots(2, 1))
+    monkeypatch.setattr(admission, "miss_bucket", TokenBucket(100, 100))
+    monkeypatch.setattr(admission, "client_buckets", type(admission.client_buckets)(ttl=60))
+    monkeypatch.setattr(admission, "counts", dict.fromkeys(admission.counts, 0))
+    monkeypatch.setattr(admission, "CLIENT_BURST", 2)
+    monkeypatch.setattr(admission, "roster", frozenset(["vip"]))
+
+
+def test_admit_sheds_a_client_over_its_budget(fresh_admission):
+    token = admission.set_client("10.0.0.1")
+    try:
+        for name in ("a", "b"):
+            with admission.admit([name]):
+                pass
+        with pytest.raises(Shed) as shed:
+            admission.admit(["c"])
+        assert shed.value.reason == "client"
+        # The priority lane and roster users skip the buckets
+        with admission.admit(["c"], priority=True):
+            pass
+        with admission.admit(["vip"]):
+            pass
+    finally:
+        admission.reset_client(token)
+    assert admission.counts["shed_client"] == 1
+
+
+def test_admit_sheds_when_no_slot_is_free(fresh_admission):
+    held = admission.admit(["a"])
+    with pytest.raises(Shed) as shed:
+        admission.admit(["b"])
+    assert shed.value.reason == "busy"
+    with admission.admit(["b"], priority=True, wait=0):
+        assert admission.slots.in_flight == 2
+    held.__exit__(None, None, None)
+    assert admission.slots.in_flight == 0
+
+
+def test_no_client_budget_without_a_client_header(monkeypatch):
+    monkeypatch.setattr(admission, "CLIENT_HEADER", "")
+    assert admission.client_address("127.0.0.1", {"X-Forwarded-For": "1.2.3.4"}) is None
+    monkeypatch.setattr(admission, "CLIENT_HEADER", "X-Forwarded-For")
+    assert admission.client_address("127.0.0.1", {"x-forwarded-for": "1.2.3.4"}) == "1.2.3.4"
+    assert admission.client_address("127.0.0.1", {}) == "127.0.0.1"
+
+
+def test_client_address_ignores_entries_the_client_wrote(monkeypatch):
+    monkeypatch.setattr(admission, "CLIENT_HEADER", "X-Forwarded-For")
+    # The client prepends whatever it likes; our proxy appends the real peer
+    assert admission.client_address("10.0.0.9", {"X-Forwarded-For": "6.6.6.6, 1.2.3.4"}) == "1.2.3.4"
+    monkeypatch.setattr(admission, "TRUSTED_HOPS", 2)
+    assert admission.client_address("10.0.0.9", {"X-Forwarded-For": "6.6.6.6, 1.2.3.4, 10.0.0.1"}) == "1.2.3.4"
+    assert admission.client_address("10.0.0.9", {"X-Forwarded-For": "1.2.3.4"}) == "10.0.0.9"
+
+
+def test_shed_cards_are_200_placeholders(github_stub, fresh_admission):
+    token = admission.set_client("10.0.0.1")
+    try:
+        statuses = []
+        for i in range(3):
+            body, status, headers = cards.card_response("stats", f"crawled{i}")
+            statuses.append((status, "Retry-After" in headers))
+    finally:
+        admission.reset_client(token)
+    assert statuses == [(200, False), (200, False), (200, True)]
+    assert body == cards.placeholder_svg()
+    assert headers["Cache-Control"] == cards.NO_CACHE_HEADERS["Cache-Control"]
+    assert github_service.read_cached_bundle("crawled2") == (None, False)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import asgi
+
+
+def call(method, path, query="", body=b"", headers=None):
+    """
+    Runs one request through the ASGI app. Returns (status, headers, body).
+    """
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]}
+    messages = []
+    incoming = [{"type": "http.request", "body": body[:5], "more_body": True},
+                {"type": "http.request", "body": body[5:], "more_body": False}]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        try:
+            await asgi.app(scope, receive, send)
+        finally:
+            await asgi.close_client()
+
+    asyncio.run(run())
+    start = messages[0]
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_head_sends_headers_only(github_stub):
+    status, headers, body = call("GET", "/api/stats/octocat/svg")
+    assert status == 200 and body.startswith(b"<svg")
+    status, head_headers, head_body = call("HEAD", "/api/stats/octocat/svg")
+    assert status == 200
+    assert head_body == b""
+    assert head_headers["content-length"] == str(len(body))
+    assert head_headers["etag"] == headers["etag"]
+
+
+def test_batch_route(github_stub):
+    status, _, body = call("GET", "/api/batch", "users=octocat,torvalds")
+    assert status == 200
+    data = json.loads(body)
+    assert set(data) == {"octocat", "torvalds"}
+    assert "streak" in data["octocat"]
+    status, _, body = call("GET", "/api/batch", "users=")
+    assert status == 400 and json.loads(body) == {"error": "No users given"}
+
+
+def test_post_cards(github_stub):
+    payload = {"cards": [{"card": "stats", "username": "octocat", "id": "a"},
+                         {"card": "streak", "username": "octocat", "theme": "dark", "id": "b"}]}
+    status, _, body = call("POST", "/api/cards", body=json.dumps(payload).encode())
+    assert status == 200
+    cards = json.loads(body)["cards"]
+    assert set(cards) == {"a", "b"}
+    assert cards["b"]["theme"] == "dark" and cards["b"]["svg"].startswith("<svg")
+
+    status, headers, body = call("POST", "/api/cards", body=json.dumps(dict(payload, format="svg")).encode())
+    assert status == 200 and headers["content-type"] == "image/svg+xml"
+
+    status, _, body = call("POST", "/api/cards", body=b"{not json")
+    assert status == 400
+
+
+def test_post_only_on_cards(github_stub):
+    status, _, _ = call("POST", "/api/stats/octocat/svg")
+    assert status == 405
+
+
+def test_batch_fetches_are_charged_to_the_client(github_stub, monkeypatch):
+    from services import admission
+
+    clients = []
+    real_admit = admission.admit
+
+    def admit(usernames, priority=False, wait=None):
+        clients.append(admission._client.get())
+        return real_admit(usernames, priority, wait)
+
+    monkeypatch.setattr(admission, "CLIENT_HEADER", "X-Forwarded-For")
+    monkeypatch.setattr(admission, "admit", admit)
+    headers = {"X-Forwarded-For": "1.2.3.4"}
+    call("GET", "/api/cards", "cards=stats:octocat,streak:torvalds", headers=headers)
+    call("GET", "/api/batch", "users=linus", headers=headers)
+    call("POST", "/api/cards", body=json.dumps({"cards": [{"card": "stats", "username": "gvanrossum"}]}).encode(), headers=headers)
+    assert clients and set(clients) == {"1.2.3.4"}
+
+
+def test_cors_preflight():
+    status, headers, body = call("OPTIONS", "/api/cards", headers={
+        "Origin": "https://example.com", "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "content-type"})
+    assert status == 200 and body == b""
+    assert headers["access-control-allow-origin"] == "*"
+    assert "POST" in headers["access-control-allow-methods"]
+    assert headers["access-control-allow-headers"] == "content-type"
+
+
+def test_card_route_never_fetches_on_the_event_loop(github_stub, monkeypatch):
+    from services import cards
+
+    def get_user_bundle(*args, **kwargs):
+        raise AssertionError("blocking fetch on the event loop")
+
+    monkeypatch.setattr(cards, "get_user_bundle", get_user_bundle)
+    for card in cards.CARD_TYPES:
+        status, headers, body = call("GET", f"/api/{card}/octocat/svg")
+        assert status == 200 and body.startswith(b"<svg")
+        # Expired from the render cache between requests: still fetched asynchronously
+        cards.render_cache.clear()
+        status, headers, body = call("GET", f"/api/{card}/octocat/svg")
+        assert status == 200 and headers["x-cache"] == "MISS"
+    monkeypatch.delenv("GITHUB_TOKEN")
+    cards.render_cache.clear()
+    # No token: the error card is rendered without trying the sync fetch
+    status, _, body = call("GET", "/api/stats/nobody/svg")
+    assert body.startswith(b"<svg")
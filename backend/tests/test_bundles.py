@@ -0,0 +1,230 @@
+import threading
+import time
+
+import pytest
+
+from services import github_service
+from services.cache_backends import MemoryBackend
+
+
+class SlowBackend(MemoryBackend):
+    """
+    Widens the window between store_bundle's read and write.
+    """
+
+    def get(self, key):
+        value = super().get(key)
+        time.sleep(0.05)
+        return value
+
+
+def section_bundle(section, value):
+    return {"stats": {"username": "octocat", section: value}, "sections": [section], section: value}
+
+
+@pytest.fixture
+def payload_cache(monkeypatch):
+    cache = MemoryBackend()
+    monkeypatch.setattr(github_service, "payload_cache", cache)
+    return cache
+
+
+def test_store_bundle_merges_sections_of_a_fresh_entry(payload_cache):
+    github_service.store_bundle("octocat", section_bundle("repo_stats", 1))
+    stored = github_service.store_bundle("Octocat", section_bundle("calendar", 2))
+    assert stored["sections"] == ["repo_stats", "calendar"]
+    assert stored["repo_stats"] == 1 and stored["calendar"] == 2
+    assert github_service.read_cached_bundle("octocat")[0]["digest"] == stored["digest"]
+
+
+def test_concurrent_stores_keep_every_section(monkeypatch):
+    monkeypatch.setattr(github_service, "payload_cache", SlowBackend())
+    github_service.store_bundle("octocat", section_bundle("repo_stats", 1))
+    threads = [
+        threading.Thread(target=github_service.store_bundle, args=("octocat", section_bundle(section, 2)))
+        for section in ("calendar", "repo_languages", "activity")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bundle, _ = github_service.read_cached_bundle("octocat")
+    assert bundle["sections"] == ["repo_stats", "repo_languages", "activity", "calendar"]
+
+
+def test_stores_from_another_worker_are_merged_not_dropped(payload_cache, monkeypatch):
+    github_service.store_bundle("octocat", section_bundle("repo_stats", 1))
+    real_set = payload_cache.set
+    raced = []
+
+    def set_then_race(key, value, ttl=None):
+        real_set(key, value, ttl)
+        if not raced:
+            # Another process overwrites the entry with only its own section
+            raced.append(True)
+            other = dict(section_bundle("calendar", 3), digest="other", modified_at=0)
+            real_set(key, {"fetched_at": time.time(), "bundle": other}, ttl)
+
+    monkeypatch.setattr(payload_cache, "set", set_then_race)
+    github_service.store_bundle("octocat", section_bundle("repo_languages", 2))
+    bundle, _ = github_service.read_cached_bundle("octocat")
+    assert set(bundle["sections"]) == {"repo_stats", "repo_languages", "calendar"}
+
+
+def test_unchanged_refresh_keeps_last_modified(payload_cache):
+    first = github_service.store_bundle("octocat", section_bundle("repo_stats", 1))
+    first_modified = first["modified_at"]
+    time.sleep(0.01)
+    again = github_service.store_bundle("octocat", section_bundle("repo_stats", 1))
+    assert again["digest"] == first["digest"]
+    assert again["modified_at"] == first_modified
+
+
+def test_refresh_counters_are_exact_under_threads(monkeypatch):
+    monkeypatch.setattr(github_service, "refresh_stats", dict(github_service.refresh_stats, refreshes=0))
+    threads = [threading.Thread(target=lambda: [github_service.count_refresh("refreshes") for _ in range(2000)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert github_service.refresh_stats["refreshes"] == 16000
+
+
+def test_stale_bundle_is_refreshed_in_the_background(github_stub, monkeypatch):
+    monkeypatch.setattr(github_service, "refresh_stats", {"stale_served": 0, "refreshes": 0, "refresh_failures": 0})
+    github_service.store_bundle("octocat", section_bundle("repo_stats", 1))
+    entry = github_service.payload_cache.get("user:octocat")
+    github_service.payload_cache.set("user:octocat", dict(entry, fetched_at=0))
+    stale, fresh = github_service.read_cached_bundle("octocat")
+    assert not fresh
+    github_service._refresh("octocat")
+    bundle, fresh = github_service.read_cached_bundle("octocat")
+    assert fresh and bundle["digest"] != stale["digest"]
+    # _refresh reads the stale entry too
+    assert github_service.refresh_stats == {"stale_served": 2, "refreshes": 1, "refresh_failures": 0}
+
+
+@pytest.fixture
+def slow_github(github_stub, monkeypatch):
+    """
+    The stub answering after 0.2 s, so concurrent cards overlap; counts the user bundle queries.
+    """
+    from benchmarks import stub_github
+
+    real_post = stub_github.StubGitHubHandler.do_POST
+    github_stub.bundle_queries = 0
+
+    def do_post(handler):
+        time.sleep(0.2)
+        return real_post(handler)
+
+    real_cost = github_service.record_query_cost
+
+    def record_query_cost(label, data):
+        # Bundle queries are labelled with their sections
+        if all(section in github_service.SECTIONS for section in label.split("+")):
+            github_stub.bundle_queries += 1
+        real_cost(label, data)
+
+    monkeypatch.setattr(stub_github.StubGitHubHandler, "do_POST", do_post)
+    monkeypatch.setattr(github_service, "record_query_cost", record_query_cost)
+    monkeypatch.setattr(github_service, "inflight", type(github_service.inflight)())
+    return github_stub
+
+
+def test_cold_cards_of_one_user_share_one_fetch(slow_github):
+    from services.cards import CARD_SECTIONS, CARD_TYPES
+
+    results = {}
+
+    def fetch(card):
+        results[card] = github_service.get_user_bundle("burstuser", CARD_SECTIONS[card])
+
+    threads = [threading.Thread(target=fetch, args=(card,)) for card in CARD_TYPES]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert slow_github.bundle_queries == 1
+    assert github_service.inflight.stats()["shared"] == len(CARD_TYPES) - 1
+    assert all(bundle["sections"] == list(github_service.SECTIONS) for bundle in results.values())
+
+
+def test_joining_a_fetch_of_other_sections_fetches_the_rest(slow_github):
+    github_service.get_user_bundle("octocat", ("repo_stats",))
+    bundle, _ = github_service.read_cached_bundle("octocat")
+    # Keep only one section cached, as a bundle from before a card needed more
+    narrowed = {key: value for key, value in bundle.items() if key not in ("calendar", "contribution_days", "languages")}
+    narrowed["sections"] = ["repo_stats"]
+    github_service.payload_cache.set("user:octocat", {"fetched_at": time.time(), "bundle": narrowed})
+    queries = slow_github.bundle_queries
+
+    results = {}
+
+    def fetch(sections):
+        results[sections] = github_service.get_user_bundle("octocat", sections)
+
+    threads = [threading.Thread(target=fetch, args=(sections,)) for sections in (("calendar",), ("repo_languages",))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+    assert "repo_languages" in results[("repo_languages",)]["sections"]
+    assert "calendar" in results[("calendar",)]["sections"]
+    # One narrow refill each: the second caller joined the first, then fetched its own section
+    assert slow_github.bundle_queries - queries == 2
+
+
+def fail_cursor_pages(variables):
+    # Follow-up repository pages only; 404 isn't retried
+    return 404 if variables.get("cursor") else None
+
+
+def test_failed_repository_page_fails_the_fetch(github_stub):
+    github_stub.fail = fail_cursor_pages
+    bundle = github_service.get_user_bundle("manyrepos")
+    assert bundle["kind"] == "transient"
+    assert github_service.read_cached_bundle("manyrepos") == (None, False)
+
+
+def test_failed_repository_page_keeps_serving_the_stale_bundle(github_stub):
+    bundle = github_service.get_user_bundle("manyrepos")
+    entry = github_service.payload_cache.get("user:manyrepos")
+    github_service.payload_cache.set("user:manyrepos", dict(entry, fetched_at=0))
+    github_stub.fail = fail_cursor_pages
+    github_service._refresh("manyrepos")
+    stale, fresh = github_service.read_cached_bundle("manyrepos")
+    assert not fresh and stale["digest"] == bundle["digest"]
+
+
+def test_failed_repository_page_fails_the_async_fetch(github_stub):
+    import asyncio
+    from services import github_async
+
+    github_stub.fail = fail_cursor_pages
+
+    async def fetch():
+        try:
+            return await github_async.fetch_user_bundles_async(["manyrepos"])
+        finally:
+            await github_async.close_client()
+
+    assert asyncio.run(fetch())["manyrepos"]["kind"] == "transient"
+
+
+def test_async_pagination_logs_the_page_limit(github_stub, monkeypatch, capsys):
+    import asyncio
+    from services import github_async
+
+    monkeypatch.setattr(github_async, "REPO_MAX_PAGES", 2)
+
+    async def fetch():
+        try:
+            return await github_async.fetch_user_bundles_async(["manyrepos"])
+        finally:
+            await github_async.close_client()
+
+    assert "error" not in asyncio.run(fetch())["manyrepos"]
+    assert "stopped at 2 pages" in capsys.readouterr().out
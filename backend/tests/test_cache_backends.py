@@ -0,0 +1,150 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+from services.cache_backends import MemoryBackend, PrefixedBackend, RedisBackend, SQLiteBackend
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough of the Redis protocol for RedisBackend: AUTH, SELECT, GET, SET [EX], DEL, PING.
+    """
+
+    def handle(self):
+        server = self.server
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            server.commands.append(args)
+            command = args[0].upper()
+            if command == b"AUTH":
+                self.wfile.write(b"+OK\r\n" if args[1] == b"secret" else b"-ERR invalid password\r\n")
+            elif command == b"SELECT":
+                server.db = int(args[1])
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"GET":
+                value = server.store.get(args[1])
+                self.wfile.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"SET":
+                server.store[args[1]] = args[2]
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"DEL":
+                self.wfile.write(b":%d\r\n" % (server.store.pop(args[1], None) is not None))
+            elif command == b"PING":
+                self.wfile.write(b"+PONG\r\n")
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def fake_redis():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRedisHandler)
+    server.daemon_threads = True
+    server.store = {}
+    server.commands = []
+    server.db = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_memory_backend_ttl_zero_never_expires():
+    backend = MemoryBackend(ttl=1)
+    backend.set("a", {"x": 1}, ttl=0)
+    backend.set("b", {"x": 2}, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("a") == {"x": 1}
+    assert backend.get("b") is None
+
+
+def test_sqlite_round_trip_and_expiry(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    backend.set("user:a", {"stats": [1, 2]})
+    backend.set("user:b", {"stats": []}, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("user:a") == {"stats": [1, 2]}
+    assert backend.get("user:b") is None
+    backend.delete("user:a")
+    assert backend.get("user:a") is None
+
+
+def test_sqlite_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteBackend(path).set("k", [1])
+    assert SQLiteBackend(path).get("k") == [1]
+
+
+def test_sqlite_purges_expired_rows_every_n_writes(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), purge_every=3)
+    backend.set("old", 1, ttl=0.01)
+    backend.set("kept", 2, ttl=0)
+    time.sleep(0.02)
+    backend.set("new", 3)
+    rows = [row[0] for row in backend._conn().execute("SELECT key FROM cache ORDER BY key")]
+    assert rows == ["kept", "new"]
+    assert backend.stats()["purged"] == 1
+
+
+def test_sqlite_corrupt_row_is_a_miss(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    backend._conn().execute("INSERT INTO cache (key, value, expires_at) VALUES ('bad', '{not json', NULL)")
+    assert backend.get("bad") is None
+    assert backend.stats()["misses"] == 1
+
+
+def test_redis_round_trip(fake_redis):
+    backend = RedisBackend(f"redis://127.0.0.1:{fake_redis.server_address[1]}/0")
+    assert backend.ping()
+    backend.set("k", {"a": [1, "x"]}, ttl=60)
+    assert backend.get("k") == {"a": [1, "x"]}
+    assert fake_redis.commands[-2][3:] == [b"EX", b"60"]
+    backend.set("forever", 1, ttl=0)
+    assert fake_redis.commands[-1] == [b"SET", b"forever", b"1"]
+    backend.delete("k")
+    assert backend.get("k") is None
+    assert backend.stats()["hits"] == 1
+
+
+def test_redis_auth_and_db_selection(fake_redis):
+    backend = RedisBackend(f"redis://:secret@127.0.0.1:{fake_redis.server_address[1]}/3")
+    backend.set("k", 1)
+    assert fake_redis.commands[0] == [b"AUTH", b"secret"]
+    assert fake_redis.db == 3
+
+
+def test_redis_never_raises(fake_redis):
+    backend = RedisBackend(f"redis://127.0.0.1:{fake_redis.server_address[1]}/0")
+    fake_redis.store[b"bad"] = b"{not json"
+    assert backend.get("bad") is None
+    assert backend._safe("BOGUS") is None
+
+
+def test_redis_reconnects_after_a_dropped_connection(fake_redis):
+    backend = RedisBackend(f"redis://127.0.0.1:{fake_redis.server_address[1]}/0")
+    backend.set("k", 1)
+    # The connection breaks under us: one miss, then a fresh connection
+    backend._local.sock.shutdown(2)
+    assert backend.get("k") is None
+    assert backend.get("k") == 1
+
+
+def test_redis_unreachable_is_a_miss():
+    backend = RedisBackend("redis://127.0.0.1:1/0", timeout=0.2)
+    assert backend.get("k") is None
+    backend.set("k", 1)
+
+
+def test_prefixed_backend_namespaces_keys():
+    inner = MemoryBackend()
+    backend = PrefixedBackend(inner, "app:")
+    backend.set("k", 1)
+    assert inner.get("app:k") == 1
+    assert backend.get("k") == 1
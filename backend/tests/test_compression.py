@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+from services import compression
+from services.compression import compress_all, compress_for_storage, negotiate
+
+CARD = "<svg>" + "<text x='1' y='2'>row</text>" * 200 + "</svg>"
+
+
+def test_small_bodies_are_not_compressed():
+    assert compress_all("<svg/>") == {}
+    assert compress_for_storage("<svg/>") == {}
+
+
+def test_gzip_is_stable_across_calls():
+    first = compress_all(CARD)["gzip"]
+    assert first == compress_all(CARD)["gzip"]
+    assert gzip.decompress(first).decode() == CARD
+
+
+def test_negotiate():
+    encoded = {"gzip": b"g", "br": b"b"}
+    assert negotiate(None, encoded) is None
+    assert negotiate("gzip, deflate", encoded) == "gzip"
+    assert negotiate("identity", encoded) is None
+    assert negotiate("gzip;q=0", encoded) is None
+    assert negotiate("*", {"gzip": b"g"}) == "gzip"
+    assert negotiate("*;q=0, gzip", {"gzip": b"g"}) == "gzip"
+    assert negotiate("gzip", {}) is None
+
+
+def test_negotiate_prefers_br_unless_weighted_lower(monkeypatch):
+    pytest.importorskip("brotli")
+    encoded = {"gzip": b"g", "br": b"b"}
+    assert negotiate("gzip, br", encoded) == "br"
+    assert negotiate("gzip;q=1, br;q=0.5", encoded) == "gzip"
+
+
+def test_no_encodings_when_disabled(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSION_ENABLED", False)
+    assert compress_all(CARD) == {}
+    assert negotiate("gzip", {"gzip": b"g"}) is None
+
+
+def test_stored_cards_get_the_static_brotli_quality(monkeypatch):
+    brotli = pytest.importorskip("brotli")
+    inline = compress_all(CARD)
+    assert brotli.decompress(inline["br"]).decode() == CARD
+
+    calls = []
+    real_brotli = compression._brotli
+
+    def record(data, quality):
+        calls.append(quality)
+        return real_brotli(data, quality)
+
+    monkeypatch.setattr(compression, "_brotli", record)
+    stored = compress_for_storage(CARD, inline)
+    assert calls == [compression.STATIC_BROTLI_QUALITY]
+    assert stored["gzip"] is inline["gzip"]
+    assert brotli.decompress(stored["br"]).decode() == CARD
+    assert compression.BROTLI_QUALITY < compression.STATIC_BROTLI_QUALITY
+
+
+def test_without_brotli_only_gzip_is_offered(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert set(compress_all(CARD)) == {"gzip"}
+    assert negotiate("br, gzip", compress_all(CARD)) == "gzip"
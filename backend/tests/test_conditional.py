@@ -0,0 +1,88 @@
+import email.utils
+
+import pytest
+
+from services import cards
+from services.cards import card_response, not_modified
+
+
+def test_if_none_match_uses_weak_comparison():
+    assert not_modified('"abc"', None, '"abc"')
+    assert not_modified('"abc"', None, 'W/"abc"')
+    assert not_modified('"abc"', None, '"xyz", W/"abc"')
+    assert not_modified('"abc"', None, '*')
+    assert not not_modified('"abc"', None, '"xyz"')
+
+
+def test_if_modified_since():
+    stamp = 1700000000
+    assert not_modified('"abc"', stamp, if_modified_since=email.utils.formatdate(stamp, usegmt=True))
+    assert not not_modified('"abc"', stamp, if_modified_since=email.utils.formatdate(stamp - 1, usegmt=True))
+    assert not not_modified('"abc"', stamp, if_modified_since="not a date")
+    assert not not_modified('"abc"', None, if_modified_since=email.utils.formatdate(stamp, usegmt=True))
+    # If-None-Match wins when both are sent
+    assert not not_modified('"abc"', stamp, '"xyz"', email.utils.formatdate(stamp, usegmt=True))
+
+
+@pytest.mark.parametrize("card", cards.CARD_TYPES)
+def test_revalidation_of_a_cached_card(github_stub, card):
+    body, status, headers = card_response(card, "octocat")
+    assert status == 200 and headers["X-Cache"] == "MISS"
+    etag, last_modified = headers["ETag"], headers["Last-Modified"]
+
+    body, status, headers = card_response(card, "octocat", if_none_match=etag)
+    assert (body, status) == ("", 304)
+    assert headers["ETag"] == etag and headers["X-Cache"] == "HIT"
+    body, status, _ = card_response(card, "octocat", if_modified_since=last_modified)
+    assert status == 304
+    body, status, _ = card_response(card, "octocat", if_none_match='"stale"')
+    assert status == 200 and body.startswith("<svg")
+
+
+def test_revalidation_skips_rendering_after_eviction(github_stub, monkeypatch):
+    _, _, headers = card_response("stats", "octocat", theme="dark")
+    cards.render_cache.clear()
+
+    def render_bundle(*args, **kwargs):
+        raise AssertionError("rendered a card that was not modified")
+
+    monkeypatch.setattr(cards, "render_bundle", render_bundle)
+    body, status, again = card_response("stats", "octocat", theme="dark", if_none_match=headers["ETag"])
+    assert status == 304 and again["ETag"] == headers["ETag"]
+
+
+def test_validators_differ_per_variant(github_stub):
+    etags = {card_response("stats", "octocat", theme=theme, include_private=private)[2]["ETag"]
+             for theme in ("default", "dark") for private in (False, True)}
+    assert len(etags) == 4
+
+
+def test_compressed_cards_carry_a_weak_etag(github_stub):
+    _, _, plain = card_response("stats", "octocat")
+    body, status, headers = card_response("stats", "octocat", accept_encoding="gzip")
+    assert headers["Content-Encoding"] == "gzip" and isinstance(body, bytes)
+    assert headers["ETag"] == "W/" + plain["ETag"]
+    body, status, headers = card_response("stats", "octocat", accept_encoding="gzip", if_none_match=headers["ETag"])
+    assert status == 304 and "Content-Encoding" not in headers
+
+
+def test_error_cards_revalidate_by_content(github_stub, monkeypatch):
+    monkeypatch.delenv("GITHUB_TOKEN")
+    body, status, headers = card_response("stats", "octocat")
+    assert headers["Cache-Control"] == "no-cache"
+    body, status, _ = card_response("stats", "octocat", if_none_match=headers["ETag"])
+    assert status == 304
+
+
+def test_bytes_cards_revalidate_only_by_etag(github_stub):
+    bundle = cards.get_user_bundle("octocat", cards.CARD_SECTIONS["languages"])
+    since = email.utils.formatdate(bundle["modified_at"], usegmt=True)
+    totals = {"languages": {"Python": 100}, "colors": {}}
+    _, status, headers = card_response("languages", "octocat", mode="bytes", bundle=bundle, language_stats=totals)
+    assert status == 200 and "Last-Modified" not in headers
+    cards.render_cache.clear()
+    # The bytes changed but the bundle didn't: If-Modified-Since alone must not get a 304
+    changed = {"languages": {"Python": 100, "Go": 50}, "colors": {}}
+    _, status, headers = card_response("languages", "octocat", mode="bytes", bundle=bundle, language_stats=changed,
+                                       if_modified_since=since)
+    assert status == 200
@@ -0,0 +1,90 @@
+import datetime
+import random
+from array import array
+
+from services import contribution_calendar
+from services.contribution_calendar import ContributionCalendar, _weekly, load_calendar, streak_stats
+
+
+def calendar_from(first_day, counts):
+    return ContributionCalendar(datetime.date.fromisoformat(first_day).toordinal(), array('H', counts))
+
+
+def test_dict_round_trip():
+    calendar = calendar_from("2024-02-27", [0, 3, 65535, 1])
+    again = load_calendar(calendar.to_dict())
+    assert (again.start, again.counts) == (calendar.start, calendar.counts)
+
+
+def test_from_days_fills_gaps_and_merge_prefers_later_calendars():
+    calendar = ContributionCalendar.from_days([{"date": "2024-01-03", "contributionCount": 2},
+                                               {"date": "2024-01-01", "contributionCount": 1}])
+    assert list(calendar.counts) == [1, 0, 2]
+    merged = ContributionCalendar.merge([calendar, calendar_from("2024-01-03", [5, 6])])
+    assert merged.date(0).isoformat() == "2024-01-01"
+    assert list(merged.counts) == [1, 0, 5, 6]
+
+
+def test_daily_streaks():
+    # 2024-01-01 is a Monday
+    calendar = calendar_from("2024-01-01", [1, 1, 0, 2, 2, 2, 0, 1, 1])
+    stats = streak_stats(calendar, today=datetime.date(2024, 1, 9))
+    assert stats["total_contributions"] == 10
+    assert (stats["longest_streak"], stats["longest_streak_start"], stats["longest_streak_end"]) == (3, "2024-01-04", "2024-01-06")
+    assert (stats["current_streak"], stats["current_streak_start"], stats["current_streak_end"]) == (2, "2024-01-08", "2024-01-09")
+
+
+def test_current_streak_survives_an_empty_today_only():
+    calendar = calendar_from("2024-01-01", [1, 1, 1, 0])
+    assert streak_stats(calendar, today=datetime.date(2024, 1, 4))["current_streak"] == 3
+    assert streak_stats(calendar, today=datetime.date(2024, 1, 5))["current_streak"] == 0
+
+
+def test_weekly_streaks():
+    # Weeks start on Sunday: Jan 1-6 (1), Jan 7-13 (0), Jan 14-20 (4), Jan 21 (1)
+    calendar = calendar_from("2024-01-01", [1] + [0] * 5 + [0] * 7 + [0] * 6 + [4] + [1])
+    stats = streak_stats(calendar, mode="weekly", today=datetime.date(2024, 1, 22))
+    assert stats["longest_streak"] == 2
+    assert (stats["longest_streak_start"], stats["longest_streak_end"]) == ("2024-01-14", "2024-01-21")
+    assert stats["current_streak"] == 2
+
+
+def test_weekly_totals_match_a_day_by_day_sum():
+    rng = random.Random(7)
+    for length in (1, 6, 7, 8, 365, 3000):
+        for offset in range(7):
+            calendar = ContributionCalendar(738000 + offset, array('H', [rng.choice([0, 0, 1, 9, 65535]) for _ in range(length)]))
+            expected = {}
+            for i, count in enumerate(calendar.counts):
+                week = (calendar.start + i) // 7
+                expected[week] = expected.get(week, 0) + count
+            totals, origin = _weekly(calendar)
+            assert origin == calendar.start // 7 * 7
+            assert list(totals) == [expected[week] for week in sorted(expected)]
+
+
+def test_empty_calendar():
+    stats = streak_stats(ContributionCalendar(738000), mode="bogus")
+    assert stats["current_streak"] == 0 and stats["mode"] == "daily"
+
+
+def test_today_defaults_to_utc(monkeypatch):
+    class LateEvening(datetime.datetime):
+        @classmethod
+        def utcnow(cls):
+            return cls(2024, 1, 4, 1, 0)
+
+        @classmethod
+        def now(cls, tz=None):
+            # Still the 3rd west of UTC
+            return cls(2024, 1, 3, 20, 0)
+
+    class Yesterday(datetime.date):
+        @classmethod
+        def today(cls):
+            return cls(2024, 1, 3)
+
+    monkeypatch.setattr(contribution_calendar.datetime, "datetime", LateEvening)
+    monkeypatch.setattr(contribution_calendar.datetime, "date", Yesterday)
+    calendar = calendar_from("2024-01-01", [1, 1, 0, 1])
+    assert streak_stats(calendar)["current_streak"] == 1
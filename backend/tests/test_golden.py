@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from services import svg_generator
+from services.themes import THEMES
+
+# Cards rendered by the svgwrite renderer the templates replaced (one file per
+# card, input and theme). The templates must reproduce them byte for byte.
+# light trophies and every glass card crashed in svgwrite's validator, so they
+# have no golden file.
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+STATS = {
+    "username": "octo", "name": "Octo <Cat> & \"co\"", "followers": 12, "following": 3, "public_repos": 42,
+    "total_stars": 1234, "total_forks": 5, "total_commits": 2345, "total_issues": 77, "total_prs": 88,
+    "created_at": "2009-05-01T00:00:00Z", "total_orgs": 2
+}
+EMPTY_STATS = dict(STATS, name="", followers=0, public_repos=0, total_stars=0, total_forks=0,
+                   total_commits=0, total_issues=0, total_prs=0, total_orgs=0)
+
+INPUTS = {
+    "stats": {"full": STATS, "empty": EMPTY_STATS},
+    "languages": {
+        "full": {"Python": 10, "JavaScript": 5, "Go": 3, "C": 2, "Rust": 1, "Shell": 1, "HTML": 1, "Jupyter Notebook": 1},
+        "empty": {}
+    },
+    "streak": {
+        "full": {"total_contributions": 1234, "current_streak": 3, "longest_streak": 210,
+                 "start_date": "2024-01-01", "end_date": "2025-12-31"},
+        "empty": {"total_contributions": 0, "current_streak": 0, "longest_streak": 0, "start_date": "", "end_date": ""}
+    },
+    "trophies": {"full": STATS, "empty": EMPTY_STATS}
+}
+
+RENDERERS = {
+    "stats": svg_generator.generate_stats_svg,
+    "languages": svg_generator.generate_language_svg,
+    "streak": svg_generator.generate_streak_svg,
+    "trophies": svg_generator.generate_trophies_svg
+}
+
+# Every theme, plus a name that falls back to the default theme
+GOLDEN_THEMES = list(THEMES) + ["unknown"]
+
+
+def render(name):
+    card, variant, theme = name.split("-", 2)
+    return RENDERERS[card](INPUTS[card][variant], theme=theme)
+
+
+def golden_names():
+    return sorted(name[:-len(".svg")] for name in os.listdir(GOLDEN_DIR) if name.endswith(".svg"))
+
+
+def test_golden_files_cover_the_cards_that_rendered():
+    names = golden_names()
+    assert len(names) == len(RENDERERS) * 2 * len(GOLDEN_THEMES) - 2 * 5
+    assert not [name for name in names if name.endswith("-glass")]
+
+
+@pytest.mark.parametrize("name", golden_names())
+def test_render_matches_golden_file(name):
+    with open(os.path.join(GOLDEN_DIR, name + ".svg"), encoding="utf-8", newline="") as f:
+        expected = f.read()
+    assert render(name) == expected
@@ -0,0 +1,57 @@
+from services import cards, contribution_history, github_service
+from services.user_record import user_record
+
+
+def fail_year(monkeypatch, failed):
+    real_fetch = contribution_history.fetch_contribution_year
+
+    def fetch(username, year, headers):
+        return None if year == failed else real_fetch(username, year, headers)
+
+    monkeypatch.setattr(contribution_history, "fetch_contribution_year", fetch)
+
+
+def test_history_with_a_failed_year_is_partial(github_stub, monkeypatch):
+    bundle = github_service.get_user_bundle("octocat", ("calendar",))
+    with monkeypatch.context() as m:
+        fail_year(m, 2016)
+        history = contribution_history.get_contribution_history("octocat", bundle)
+        assert history.partial
+    # The years that did load are cached; the next call only retries the failed one
+    fetched = contribution_history.stats["years_fetched"]
+    history = contribution_history.get_contribution_history("octocat", bundle)
+    assert not history.partial
+    assert history.date(0).isoformat() == "2015-01-01"
+    assert contribution_history.stats["years_fetched"] == fetched + 1
+
+
+def test_partial_history_card_is_not_cached(github_stub, monkeypatch):
+    with monkeypatch.context() as m:
+        fail_year(m, 2016)
+        body, status, headers = cards.card_response("streak", "octocat")
+    assert status == 200 and body.startswith("<svg")
+    assert headers["Cache-Control"] == "no-store"
+    assert "ETag" not in headers and "Last-Modified" not in headers
+    assert not cards.is_card_cached("streak", "octocat", "default", False)
+    bundle, _ = github_service.read_cached_bundle("octocat")
+    assert "history" not in user_record(bundle)._memo
+
+    body, status, headers = cards.card_response("streak", "octocat")
+    assert headers["Cache-Control"] == cards.CACHE_HEADERS["Cache-Control"]
+    assert "ETag" in headers
+    assert cards.is_card_cached("streak", "octocat", "default", False)
+
+
+def test_streak_of_a_partial_history_is_not_kept(github_stub, monkeypatch):
+    bundle = github_service.get_user_bundle("octocat", ("calendar",))
+    record = user_record(bundle)
+    with monkeypatch.context() as m:
+        fail_year(m, 2016)
+        partial = contribution_history.get_contribution_history("octocat", bundle)
+    partial_streak = record.streak("daily", partial)
+
+    history = cards.bundle_history("octocat", bundle)
+    assert not history.partial
+    streak = record.streak("daily", history)
+    assert streak["total_contributions"] > partial_streak["total_contributions"]
+    assert record.streak("daily", history) is streak
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from services import github_service, http_client
+
+
+def fail_first(*failures):
+    """
+    A stub failure hook answering the first requests with failures, then normally.
+    """
+    failures = list(failures)
+
+    def fail(variables):
+        return failures.pop(0) if failures else None
+    return fail
+
+
+def post(**kwargs):
+    return http_client.post(github_service.GITHUB_GRAPHQL_URL, json={"query": "", "variables": {"login": "octocat"}}, **kwargs)
+
+
+def test_5xx_and_429_are_retried(github_stub):
+    github_stub.fail = fail_first(502)
+    assert post().status_code == 200
+    assert github_stub.requests == 2
+    github_stub.fail = fail_first(429)
+    assert post().status_code == 200
+    assert github_stub.requests == 4
+
+
+def test_403_is_retried_only_with_retry_after(github_stub):
+    github_stub.fail = fail_first((403, {"Retry-After": "0"}))
+    assert post().status_code == 200
+    assert github_stub.requests == 2
+    github_stub.fail = fail_first(403)
+    assert post().status_code == 403
+    assert github_stub.requests == 3
+
+
+def test_retry_sleeps_stop_at_the_budget(github_stub, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRY_SLEEP", 0.2)
+    github_stub.fail = lambda variables: (429, {"Retry-After": "10"})
+    started = time.monotonic()
+    assert post().status_code == 429
+    assert time.monotonic() - started < 2
+    # One retry spent the whole budget, the second response was returned
+    assert github_stub.requests == 2
+
+
+def test_requests_get_the_default_timeout(github_stub, monkeypatch):
+    timeouts = []
+    real_send = http_client._adapter.send
+
+    def send(request, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+        return real_send(request, **kwargs)
+
+    monkeypatch.setattr(http_client._adapter, "send", send)
+    post()
+    post(timeout=3)
+    assert timeouts == [http_client.DEFAULT_TIMEOUT, 3]
+
+
+def test_threads_share_one_pooled_adapter(github_stub):
+    adapters = []
+
+    def fetch():
+        session = http_client.get_session()
+        adapters.append(session.get_adapter(github_service.GITHUB_GRAPHQL_URL))
+        for _ in range(3):
+            post()
+
+    threads = [threading.Thread(target=fetch) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert adapters[0] is adapters[1] is http_client._adapter
+    pool = http_client._adapter.poolmanager.connection_from_url(github_service.GITHUB_GRAPHQL_URL)
+    # Keep-alive connections are reused rather than opened per request
+    assert pool.num_connections <= 2
+
+
+def test_async_retry_sleeps_stop_at_the_budget(github_stub, monkeypatch):
+    import asyncio
+    from services import github_async
+
+    monkeypatch.setattr(http_client, "MAX_RETRY_SLEEP", 0.2)
+    github_stub.fail = lambda variables: (429, {"Retry-After": "10"})
+
+    async def fetch():
+        try:
+            return await github_async.post_graphql({"query": "", "variables": {"login": "octocat"}}, {})
+        finally:
+            await github_async.close_client()
+
+    started = time.monotonic()
+    assert asyncio.run(fetch()).status_code == 429
+    assert time.monotonic() - started < 2
+    assert github_stub.requests == 2
@@ -0,0 +1,68 @@
+import pytest
+
+from services import cards, github_service, language_stats
+
+
+@pytest.fixture
+def cache_sets(monkeypatch):
+    """
+    Records the (key, ttl) of every payload cache write.
+    """
+    calls = []
+    real_set = github_service.payload_cache.set
+
+    def set(key, value, ttl=None):
+        calls.append((key, ttl))
+        real_set(key, value, ttl)
+
+    monkeypatch.setattr(github_service.payload_cache, "set", set)
+    return calls
+
+
+def test_repository_entries_expire(github_stub, cache_sets):
+    result = language_stats.get_language_bytes("octocat")
+    assert result["languages"] and "partial" not in result
+    repo_ttls = {ttl for key, ttl in cache_sets if key.startswith("repo_languages:")}
+    assert repo_ttls == {language_stats.REPO_LANGUAGES_TTL}
+    assert ("language_bytes:octocat", None) in cache_sets
+    # Not counted against the languages card's own bundle query
+    assert "repo_language_batch" in github_service.query_costs
+
+
+def test_failed_batch_is_not_cached_as_complete(github_stub, cache_sets, monkeypatch):
+    real_fetch = language_stats.fetch_repo_languages
+
+    def drop_first(owner, repo_names, headers):
+        results = real_fetch(owner, repo_names, headers)
+        results.pop(repo_names[0])
+        return results
+
+    monkeypatch.setattr(language_stats, "fetch_repo_languages", drop_first)
+    result = language_stats.get_language_bytes("octocat")
+    assert result["partial"] is True
+    assert ("language_bytes:octocat", language_stats.LANGUAGE_PARTIAL_TTL) in cache_sets
+
+    body, status, headers = cards.card_response("languages", "octocat", mode="bytes")
+    assert status == 200
+    assert headers["Cache-Control"] == cards.NO_CACHE_HEADERS["Cache-Control"]
+    assert not cards.is_card_cached("languages", "octocat", "default", False, "bytes")
+
+
+def test_card_response_does_not_refetch_failed_language_bytes(github_stub, monkeypatch):
+    bundle = github_service.get_user_bundle("octocat")
+
+    def fail(username):
+        raise AssertionError("language bytes fetched again")
+
+    monkeypatch.setattr(cards, "get_language_bytes", fail)
+    body, status, headers = cards.card_response("languages", "octocat", mode="bytes", bundle=bundle, language_stats=None)
+    assert status == 200 and body.startswith("<svg")
+    # Fell back to repository counts, so it isn't kept
+    assert headers["Cache-Control"] == cards.NO_CACHE_HEADERS["Cache-Control"]
+
+
+def test_failed_repository_list_page_is_partial(github_stub, cache_sets):
+    github_stub.fail = lambda variables: 404 if variables.get("cursor") == "100" else None
+    result = language_stats.get_language_bytes("manyrepos")
+    assert result["partial"]
+    assert ("language_bytes:manyrepos", language_stats.LANGUAGE_PARTIAL_TTL) in cache_sets
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from services import negative_cache
+from services.cache import TTLCache
+from services.negative_cache import RotatingBloomFilter
+
+NOT_FOUND = {"error": "User not found", "kind": "not_found"}
+TRANSIENT = {"error": "GitHub returned 502", "kind": "transient"}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = RotatingBloomFilter(1 << 16, 4, window=60)
+    names = [f"user{i}" for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+    false_positives = sum(f"other{i}" in bloom for i in range(1000))
+    assert false_positives < 20
+
+
+def test_bloom_filter_forgets_after_two_windows():
+    bloom = RotatingBloomFilter(1 << 10, 4, window=0.05)
+    bloom.add("octocat")
+    time.sleep(0.06)
+    # Rotated once: still remembered in the previous generation
+    assert "octocat" in bloom
+    time.sleep(0.06)
+    assert "octocat" not in bloom
+
+
+def test_ttl_cache_purge_expired():
+    cache = TTLCache(ttl=60)
+    cache.set("gone", 1, ttl=0.01)
+    cache.set("kept", 2)
+    time.sleep(0.02)
+    assert len(cache) == 2
+    assert cache.purge_expired() == 1
+    assert len(cache) == 1 and cache.get("kept") == 2
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(negative_cache, "CACHE_SIZE", 2)
+    monkeypatch.setattr(negative_cache, "entries", TTLCache(ttl=60, max_entries=2))
+    monkeypatch.setattr(negative_cache, "doorkeeper", RotatingBloomFilter(1 << 16, 4, window=60))
+    monkeypatch.setattr(negative_cache, "counts", dict.fromkeys(negative_cache.counts, 0))
+
+
+def test_only_classified_errors_are_remembered(small_cache):
+    negative_cache.remember("Octocat", NOT_FOUND)
+    negative_cache.remember("limited", {"error": "GitHub rate limit reached, try again later"})
+    negative_cache.remember("shed", {"error": "Too many requests", "shed": "busy"})
+    assert negative_cache.lookup(["octocat", "limited", "shed"]) == {"octocat": NOT_FOUND}
+
+
+def test_a_full_cache_only_admits_names_seen_failing_before(small_cache):
+    negative_cache.remember_all({"a": NOT_FOUND, "b": NOT_FOUND, "ok": {"stats": {}}})
+    negative_cache.remember("c", NOT_FOUND)
+    assert negative_cache.get("c") is None
+    assert negative_cache.counts["filtered"] == 1
+    # The second failure gets in, evicting the least recently used name
+    negative_cache.remember("c", NOT_FOUND)
+    assert negative_cache.get("c") == NOT_FOUND
+    assert negative_cache.get("a") is None
+
+
+def test_expired_entries_do_not_keep_new_names_out(small_cache, monkeypatch):
+    monkeypatch.setitem(negative_cache.TTLS, "transient", 0.01)
+    negative_cache.remember("a", TRANSIENT)
+    negative_cache.remember("b", TRANSIENT)
+    time.sleep(0.02)
+    negative_cache.remember("c", NOT_FOUND)
+    assert negative_cache.get("c") == NOT_FOUND
+    assert negative_cache.counts["filtered"] == 0
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from services import cards, static_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_store, "STATIC_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(static_store, "stats", dict.fromkeys(static_store.stats, 0))
+    return tmp_path
+
+
+def index_link(store, card="stats", username="octocat", theme="default"):
+    return os.path.join(str(store), "index", static_store.index_name(card, username, theme))
+
+
+def test_publish_is_content_addressed(store):
+    # Big enough to be compressed
+    svg = "<svg>%s</svg>" % ("<rect/>" * 200)
+    digest = static_store.publish("stats", "octocat", "default", svg)
+    assert digest == hashlib.sha1(svg.encode()).hexdigest()
+    path = static_store.object_path(digest)
+    assert open(path).read() == svg
+    assert os.path.exists(path + ".gz")
+    # Same content for another card: one object, two links
+    assert static_store.publish("stats", "torvalds", "dark", svg) == digest
+    assert static_store.stats["published"] == 1 and static_store.stats["unchanged"] == 1
+    assert static_store.lookup("stats", "Torvalds", "dark")[0] == path
+
+
+def test_republish_swaps_the_index_link(store, monkeypatch):
+    old = static_store.publish("stats", "octocat", "default", "<svg>old</svg>")
+    new = static_store.publish("stats", "octocat", "default", "<svg>new</svg>")
+    link = index_link(store)
+    assert os.path.islink(link) and not os.path.isabs(os.readlink(link))
+    path, digest, _ = static_store.lookup("stats", "octocat", "default")
+    assert digest == new and open(path).read() == "<svg>new</svg>"
+    # No temporary links left behind
+    assert os.listdir(os.path.dirname(link)) == ["default.svg"]
+    monkeypatch.setattr(static_store, "STATIC_STORE_GC_GRACE", -1)
+    static_store.collect_garbage()
+    assert not os.path.exists(static_store.object_path(old))
+    assert os.path.exists(static_store.object_path(new))
+
+
+def test_unsafe_names_are_never_stored(store):
+    assert static_store.publish("stats", "../etc", "default", "<svg/>") is None
+    assert static_store.lookup("stats", "octocat", "a/b") is None
+
+
+def test_expired_cards_are_rendered_again(github_stub, store):
+    key = cards.cache_key("stats", "octocat", "default", False)
+    fresh = static_store.render_and_publish("stats", "octocat", "default")
+    # A render cache entry from long ago, published back then
+    svg, etag, last_modified, encoded = cards.render_cache.get(key)
+    cards.render_cache.set(key, ("<svg>old render</svg>", etag, last_modified, {}))
+    static_store.publish("stats", "octocat", "default", "<svg>old render</svg>")
+    link = index_link(store)
+    published_at = time.time() - 7200
+    os.utime(link, (published_at, published_at), follow_symlinks=False)
+
+    static_store.refresh_stale(max_age=3600)
+    assert static_store.stats["refreshed"] == 1
+    assert static_store.lookup("stats", "octocat", "default")[1] == fresh
+    assert os.lstat(link).st_mtime > published_at + 3600
+    assert cards.render_cache.get(key)[0] == svg
+
+
+def test_cards_younger_than_max_age_are_left_alone(github_stub, store):
+    static_store.render_and_publish("stats", "octocat", "default")
+    published_at = os.lstat(index_link(store)).st_mtime
+    static_store.refresh_stale(max_age=3600)
+    assert static_store.stats["refreshed"] == 0
+    assert os.lstat(index_link(store)).st_mtime == published_at
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from services import github_service, http_client, token_pool
+from services.token_pool import TokenPool, TokensExhausted
+
+
+def rate_headers(remaining, reset_in, limit=5000):
+    return {"X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+            "X-RateLimit-Limit": str(limit)}
+
+
+def test_acquire_picks_the_token_with_most_headroom():
+    pool = TokenPool(["a", "b", "c"])
+    pool.record("a", 200, rate_headers(100, 600))
+    pool.record("b", 200, rate_headers(3000, 600))
+    pool.record("c", 200, rate_headers(2000, 600))
+    assert pool.acquire() == "b"
+    assert pool.tokens["b"].remaining == 2999
+    # Tokens the pool doesn't know are ignored
+    pool.record("z", 200, rate_headers(0, 600))
+    assert "z" not in pool.tokens
+
+
+def test_reserve_is_held_back(monkeypatch):
+    monkeypatch.setattr(token_pool, "TOKEN_RESERVE", 50)
+    pool = TokenPool(["a"])
+    pool.record("a", 200, rate_headers(50, 600))
+    with pytest.raises(TokensExhausted):
+        pool.acquire(max_wait=0)
+
+
+def test_exhausted_tokens_are_shed_when_reset_is_too_far():
+    pool = TokenPool(["a", "b"])
+    pool.record("a", 200, rate_headers(0, 600))
+    pool.record("b", 403, {"Retry-After": "300"})
+    with pytest.raises(TokensExhausted) as exhausted:
+        pool.acquire(max_wait=1)
+    assert 250 < exhausted.value.reset_in <= 300
+    assert pool.stats()["shed"] == 1
+
+
+def test_exhausted_tokens_wait_for_a_close_reset():
+    pool = TokenPool(["a"])
+    pool.tokens["a"].remaining = 0
+    pool.tokens["a"].reset_at = time.time() + 0.2
+    assert pool.acquire(max_wait=2) == "a"
+    assert pool.stats()["waited"] == 1
+
+
+def test_budget_recovers_after_reset():
+    pool = TokenPool(["a"])
+    pool.record("a", 200, rate_headers(0, -1))
+    # The window rolled over: the full limit is assumed again until GitHub says otherwise
+    assert pool.acquire(max_wait=0) == "a"
+    assert pool.tokens["a"].remaining == 5000 - 1
+    assert pool.tokens["a"].reset_at > time.time()
+
+
+def test_responses_update_the_pool_through_the_session_hook(github_stub, monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKENS", "first-token,second-token")
+    monkeypatch.setattr(token_pool, "TOKEN_RESERVE", 0)
+    pool = token_pool.get_pool()
+    assert len(pool) == 3
+    github_stub.rate_limit = 2
+
+    def query():
+        headers = github_service.get_headers(max_wait=0)
+        http_client.post(github_service.GITHUB_GRAPHQL_URL, json={"query": "", "variables": {"login": "octocat"}}, headers=headers)
+        return token_pool.token_from_headers(headers)
+
+    used = [query() for _ in range(6)]
+    # Spread over the tokens while they have points, each stopped at the stub's limit
+    assert sorted(used) == sorted(["first-token", "second-token", "test-token"] * 2)
+    assert all(state.remaining == 0 for state in pool.tokens.values())
+    with pytest.raises(TokensExhausted):
+        query()
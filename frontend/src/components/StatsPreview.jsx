@@ -6,24 +6,39 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000/api'
 export default function StatsPreview({ username, theme, showPrivate, showTrophies }) {
     const [copied, setCopied] = useState(false);
     const [loading, setLoading] = useState(true);
-    const [loadedImages, setLoadedImages] = useState(0);
+    const [cards, setCards] = useState({});
 
-    // Reset loading when inputs change
+    // Load every preview card with one batch request
     useEffect(() => {
+        if (!username) return;
+        const controller = new AbortController();
+        const cardTypes = showTrophies ? ['stats', 'languages', 'streak', 'trophies'] : ['stats', 'languages', 'streak'];
         setLoading(true);
-        setLoadedImages(0);
+        fetch(`${API_BASE_URL}/cards`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                cards: cardTypes.map(card => ({ id: card, card, username, theme, include_private: showPrivate }))
+            }),
+            signal: controller.signal
+        })
+            .then(response => response.json())
+            .then(data => {
+                setCards(data.cards || {});
+                setLoading(false);
+            })
+            .catch(error => {
+                if (error.name === 'AbortError') return;
+                // Show empty cards rather than a stuck spinner
+                setCards({});
+                setLoading(false);
+            });
+        return () => controller.abort();
     }, [username, theme, showPrivate, showTrophies]);
 
-    // Check if all images are loaded
-    useEffect(() => {
-        const expectedImages = showTrophies ? 4 : 3;
-        if (loadedImages >= expectedImages) {
-            setLoading(false);
-        }
-    }, [loadedImages, showTrophies]);
-
-    const handleImageLoad = () => {
-        setLoadedImages(prev => prev + 1);
+    const cardSrc = (card) => {
+        const svg = cards[card] && cards[card].svg;
+        return svg ? `data:image/svg+xml;charset=utf-8,${encodeURIComponent(svg)}` : undefined;
     };
 
     if (!username) return null;
@@ -72,38 +87,30 @@ export default function StatsPreview({ username, theme, showPrivate, showTrophie
                 <div className="flex flex-col gap-6 w-full items-center">
                     <div className="transform hover:scale-[1.02] transition-transform duration-300">
                         <img
-                            src={statsUrl}
+                            src={cardSrc('stats')}
                             alt="GitHub Stats"
-                            onLoad={handleImageLoad}
-                            onError={handleImageLoad} // Count errors as loaded to avoid stuck spinner
                             className="rounded-lg shadow-lg max-w-full"
                         />
                     </div>
                     <div className="transform hover:scale-[1.02] transition-transform duration-300">
                         <img
-                            src={langUrl}
+                            src={cardSrc('languages')}
                             alt="Top Languages"
-                            onLoad={handleImageLoad}
-                            onError={handleImageLoad}
                             className="rounded-lg shadow-lg max-w-full"
                         />
                     </div>
                     <div className="transform hover:scale-[1.02] transition-transform duration-300">
                         <img
-                            src={streakUrl}
+                            src={cardSrc('streak')}
                             alt="GitHub Streak"
-                            onLoad={handleImageLoad}
-                            onError={handleImageLoad}
                             className="rounded-lg shadow-lg max-w-full"
                         />
                     </div>
                     {showTrophies && (
                         <div className="transform hover:scale-[1.02] transition-transform duration-300">
                             <img
-                                src={trophiesUrl}
+                                src={cardSrc('trophies')}
                                 alt="GitHub Trophies"
-                                onLoad={handleImageLoad}
-                                onError={handleImageLoad}
                                 className="rounded-lg shadow-lg max-w-full"
                             />
                         </div>